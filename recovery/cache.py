@@ -0,0 +1,134 @@
+# cache.py
+import os
+import sqlite3
+import logging
+from urllib.request import pathname2url
+
+logger = logging.getLogger("ImageRecovery.Cache")
+
+VERIFY_CACHE_NAME = "verification_cache.db"
+
+# Read-only connections for lookups by content, one per process and cache file
+_readers = {}
+
+class VerificationCache:
+    """Module for persisting verification results keyed by file identity and content"""
+
+    # Commit every this many stored results so an interrupted run keeps its progress
+    COMMIT_INTERVAL = 500
+
+    def __init__(self, cache_path):
+        """
+        Args:
+            cache_path: SQLite database file, created if missing
+        """
+        self.cache_path = cache_path
+        self._pending = 0
+        self._conn = sqlite3.connect(cache_path)
+        # Workers read while this connection writes
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS verification (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                inode INTEGER NOT NULL,
+                level TEXT NOT NULL,
+                hash TEXT NOT NULL,
+                valid INTEGER NOT NULL,
+                score REAL,
+                reason TEXT,
+                width INTEGER,
+                height INTEGER
+            )""")
+        # Caches written before dimensions were kept gain the columns, empty for old rows
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(verification)")}
+        for column in ('width', 'height'):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE verification ADD COLUMN {column} INTEGER")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS verification_hash ON verification (hash, level)")
+        self._conn.commit()
+
+    def lookup(self, path, st, level):
+        """
+        Look up the result for a file
+
+        Args:
+            path: Path of the file
+            st: os.stat_result of the file
+            level: Verifier settings (validation level and limits) the result
+                must have been computed under
+
+        Returns:
+            Tuple of (hash, is_valid, size, score, reason, dimensions), or None
+            if the file is not cached or has changed since
+        """
+        row = self._conn.execute(
+            "SELECT hash, valid, score, reason, width, height FROM verification "
+            "WHERE path = ? AND size = ? AND mtime_ns = ? AND inode = ? AND level = ?",
+            (path, st.st_size, st.st_mtime_ns, st.st_ino, level)).fetchone()
+        if row is None:
+            return None
+        return row[0], bool(row[1]), st.st_size, row[2], row[3], _dimensions(row[4], row[5])
+
+    def store(self, path, st, level, result):
+        """Store the (hash, is_valid, size, score, reason, dimensions, ...) result for a file"""
+        file_hash, is_valid, _, score, reason, dimensions = result[:6]
+        width, height = dimensions or (None, None)
+        self._conn.execute(
+            "INSERT OR REPLACE INTO verification "
+            "(path, size, mtime_ns, inode, level, hash, valid, score, reason, width, height) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (path, st.st_size, st.st_mtime_ns, st.st_ino, level, file_hash, int(is_valid), score, reason,
+             width, height))
+        self._pending += 1
+        if self._pending >= self.COMMIT_INTERVAL:
+            self._conn.commit()
+            self._pending = 0
+
+    def close(self):
+        """Commit outstanding results and close the database"""
+        try:
+            self._conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Error saving verification cache {self.cache_path}: {str(e)}")
+        finally:
+            self._conn.close()
+
+
+def lookup_content(cache_path, file_hash, level):
+    """
+    Look up the result for any file with the same content
+
+    Carves are rewritten on every run, so their path, mtime and inode
+    change while their content does not. Verification workers call this
+    once they have hashed a file, each through its own read-only
+    connection.
+
+    Args:
+        cache_path: SQLite database file of a VerificationCache
+        file_hash: SHA-256 of the file contents
+        level: Verifier settings the result must have been computed under
+
+    Returns:
+        Tuple of (is_valid, score, reason, dimensions), or None if no file
+        with this content was verified under these settings
+    """
+    key = (os.getpid(), cache_path)
+    try:
+        conn = _readers.get(key)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{pathname2url(os.path.abspath(cache_path))}?mode=ro", uri=True)
+            _readers[key] = conn
+        row = conn.execute("SELECT valid, score, reason, width, height FROM verification "
+                           "WHERE hash = ? AND level = ? LIMIT 1", (file_hash, level)).fetchone()
+    except sqlite3.Error as e:
+        logger.debug(f"Content lookup in {cache_path} failed: {str(e)}")
+        return None
+    if row is None:
+        return None
+    return bool(row[0]), row[1], row[2], _dimensions(row[3], row[4])
+
+
+def _dimensions(width, height):
+    return (width, height) if width is not None else None
@@ -0,0 +1,188 @@
+# catalog.py
+import sqlite3
+import logging
+
+logger = logging.getLogger("ImageRecovery.Catalog")
+
+CATALOG_NAME = "catalog.db"
+
+# File information keys stored as columns, in table order after the ID
+_COLUMNS = ('path', 'original_path', 'offset', 'type', 'size', 'hash', 'status', 'reason', 'width', 'height',
+            'score', 'duplicate_group', 'duplicate_of', 'source_mtime', 'phash')
+
+class RecoveryCatalog:
+    """Module for keeping recovered file information in an indexed SQLite database"""
+
+    # Rows fetched from SQLite at a time while iterating
+    FETCH_SIZE = 1000
+
+    def __init__(self, catalog_path):
+        """
+        Args:
+            catalog_path: SQLite database file, created if missing
+        """
+        self.catalog_path = catalog_path
+        self._conn = sqlite3.connect(catalog_path)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS files (
+                id TEXT PRIMARY KEY,
+                path TEXT NOT NULL,
+                original_path TEXT,
+                offset INTEGER,
+                type TEXT,
+                size INTEGER,
+                hash TEXT,
+                status TEXT NOT NULL,
+                reason TEXT,
+                width INTEGER,
+                height INTEGER,
+                score REAL,
+                duplicate_group INTEGER,
+                duplicate_of TEXT,
+                source_mtime INTEGER,
+                phash TEXT
+            )""")
+        # Catalogs written before perceptual hashes were kept gain the column
+        if 'phash' not in {row[1] for row in self._conn.execute("PRAGMA table_info(files)")}:
+            self._conn.execute("ALTER TABLE files ADD COLUMN phash TEXT")
+        for column in ('hash', 'status', 'size'):
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS files_{column} ON files ({column})")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def add(self, file_list, replace=False):
+        """
+        Store file information, replacing rows with the same ID
+
+        Dimensions are stored as the verifier read them from the header;
+        files are never opened here.
+
+        Args:
+            file_list: Iterable of file information dictionaries with an 'id' key
+            replace: Remove all earlier rows first, so the catalog lists
+                exactly the files of this run
+        """
+        with self._conn:
+            if replace:
+                self._conn.execute("DELETE FROM files")
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO files VALUES (?{', ?' * len(_COLUMNS)})",
+                (self._row(file_info) for file_info in file_list if 'id' in file_info))
+
+    def iter_unhashed(self, status='OK', batch_size=FETCH_SIZE):
+        """
+        Iterate over files without a perceptual hash, a batch at a time
+
+        Each batch is fetched whole, so the caller may store hashes
+        between batches; files that get none are not listed again.
+
+        Args:
+            status: Only files with this status
+            batch_size: Files per batch
+
+        Yields:
+            Lists of (row, path) tuples, row being the file's SQLite rowid
+        """
+        row = 0
+        while True:
+            batch = self._conn.execute(
+                "SELECT rowid, path FROM files WHERE status = ? AND phash IS NULL AND rowid > ? "
+                "ORDER BY rowid LIMIT ?", (status, row, batch_size)).fetchall()
+            if not batch:
+                return
+            yield batch
+            row = batch[-1][0]
+
+    def iter_phashes(self, status='OK'):
+        """
+        Iterate over the perceptual hashes of files, fetched in batches
+
+        Args:
+            status: Only files with this status
+
+        Yields:
+            (row, phash) tuples, phash being a 16-digit hex string
+        """
+        cursor = self._conn.execute("SELECT rowid, phash FROM files WHERE status = ? AND phash IS NOT NULL "
+                                    "ORDER BY rowid", (status,))
+        while True:
+            rows = cursor.fetchmany(self.FETCH_SIZE)
+            if not rows:
+                return
+            yield from rows
+
+    def set_phashes(self, hashes):
+        """
+        Store perceptual hashes
+
+        Args:
+            hashes: Iterable of (row, phash) tuples
+        """
+        with self._conn:
+            self._conn.executemany("UPDATE files SET phash = ? WHERE rowid = ?",
+                                   ((phash, row) for row, phash in hashes))
+
+    def set_duplicate_groups(self, groups):
+        """
+        Replace all near-duplicate group numbers
+
+        Args:
+            groups: Iterable of (row, group number) tuples; files not listed
+                belong to no group
+        """
+        with self._conn:
+            self._conn.execute("UPDATE files SET duplicate_group = NULL WHERE duplicate_group IS NOT NULL")
+            self._conn.executemany("UPDATE files SET duplicate_group = ? WHERE rowid = ?",
+                                   ((group, row) for row, group in groups))
+
+    def iter_files(self, status=None, file_hash=None, min_size=None):
+        """
+        Iterate over catalogued files in the order they were added
+
+        Rows are fetched in batches, so the whole catalog never has to be
+        in memory. Each condition given narrows the query, using its index.
+
+        Args:
+            status: Only files with this status
+            file_hash: Only files with this SHA-256 hex digest
+            min_size: Only files of at least this many bytes
+
+        Yields:
+            File information dictionaries, without keys whose value is unset
+        """
+        conditions = []
+        params = []
+        for column, operator, value in (('status', '=', status), ('hash', '=', file_hash),
+                                        ('size', '>=', min_size)):
+            if value is not None:
+                conditions.append(f"{column} {operator} ?")
+                params.append(value)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        cursor = self._conn.execute(f"SELECT * FROM files{where} ORDER BY rowid", params)
+        names = [description[0] for description in cursor.description]
+        while True:
+            rows = cursor.fetchmany(self.FETCH_SIZE)
+            if not rows:
+                return
+            for row in rows:
+                yield {name: value for name, value in zip(names, row) if value is not None}
+
+    def status_counts(self):
+        """Number of files per status"""
+        return dict(self._conn.execute("SELECT status, COUNT(*) FROM files GROUP BY status"))
+
+    def close(self):
+        """Close the database"""
+        try:
+            self._conn.close()
+        except sqlite3.Error as e:
+            logger.error(f"Error closing catalog {self.catalog_path}: {str(e)}")
+
+    def _row(self, file_info):
+        """Column values for one file"""
+        return (file_info['id'],) + tuple(file_info.get(column) for column in _COLUMNS)
@@ -0,0 +1,161 @@
+# containers.py
+import os
+import mmap
+import stat
+import logging
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from contextlib import nullcontext
+from .signatures import iter_headers, FOOTERS
+from .layout import OutputLayout
+
+logger = logging.getLogger("ImageRecovery.Containers")
+
+
+def carve_container(source_path, layout, prefix, max_carve_size, write_slots=None):
+    """
+    Carve every embedded JPG/PNG out of a single file
+
+    Args:
+        source_path: File to carve (memory dump, pagefile, database, document...)
+        layout: OutputLayout to place carved images with
+        prefix: Unique file name prefix for carves from this source
+        max_carve_size: Largest image to carve; headers without a footer
+            within this distance are skipped
+        write_slots: Semaphore (shareable with worker processes) held
+            around each carve written, or None for no cap
+
+    Returns:
+        List of carved file information
+    """
+    carved = []
+
+    try:
+        with open(source_path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size < 8:
+                return carved
+
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                carve_end = 0
+                # Per type: (end of the region searched, first footer found in it or -1),
+                # so each byte is searched once however many headers lack a footer
+                footers = {}
+                for offset, file_type in iter_headers(data):
+                    # Headers inside the previous carve (e.g. EXIF thumbnails) belong to it
+                    if offset < carve_end:
+                        continue
+
+                    end_signature, footer_length = FOOTERS[file_type]
+                    limit = min(len(data), offset + max_carve_size)
+                    searched, footer = footers.get(file_type, (0, -1))
+                    if footer < offset:
+                        # Resume where a fruitless search stopped, overlapping a footer cut by its end
+                        start = offset if footer >= 0 else max(offset, searched - len(end_signature) + 1)
+                        footer = data.find(end_signature, start, limit)
+                        footers[file_type] = (max(searched, limit), footer)
+                    if footer < 0 or footer + len(end_signature) > limit:
+                        continue
+                    carve_end = footer + footer_length
+
+                    file_id = f"{prefix}_{len(carved)}"
+                    output_path = layout.path_for(file_id, file_type)
+                    with write_slots or nullcontext(), open(output_path, 'wb') as out:
+                        out.write(data[offset:carve_end])
+
+                    carved.append({
+                        'id': file_id,
+                        'path': output_path,
+                        'original_path': source_path,
+                        'offset': offset,
+                        'size': carve_end - offset,
+                        'type': file_type,
+                        'status': 'Recovered'
+                    })
+
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not carve {source_path}: {str(e)}")
+
+    return carved
+
+
+class ContainerImageCarver:
+    """Module for carving images embedded in arbitrary files under a directory"""
+
+    def __init__(self, max_workers=None, max_carve_size=64 * 1024 * 1024, pool=None, write_slots=None):
+        # Standalone images are handled by the existing image extractor
+        self.skipped_extensions = ['.jpg', '.jpeg', '.png']
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_carve_size = max_carve_size
+        # ProcessPoolExecutor shared across a run; one is started per carve_directory() if None
+        self.pool = pool
+        # Manager semaphore capping carves written to an output disk shared with other scans
+        self.write_slots = write_slots
+        self.file_count = 0
+        self.bytes_scanned = 0
+
+    def carve_directory(self, source_path, output_path, layout=None):
+        """
+        Carve embedded images from every file under the source path
+
+        Args:
+            source_path: Directory to scan
+            output_path: Directory to write carved images to
+            layout: OutputLayout to place files with (flat by default)
+
+        Returns:
+            List of carved file information, each attributed to its source
+            file ('original_path') and byte offset ('offset')
+        """
+        logger.info(f"Starting container carving under {source_path}")
+        self.file_count = 0
+        self.bytes_scanned = 0
+        carved_files = []
+
+        try:
+            os.makedirs(output_path, exist_ok=True)
+            layout = layout or OutputLayout(output_path)
+
+            with nullcontext(self.pool) if self.pool else ProcessPoolExecutor(max_workers=self.max_workers) as pool:
+                pending = set()
+
+                output_root = os.path.abspath(output_path)
+                for root, dirs, files in os.walk(source_path):
+                    # Never re-carve our own output
+                    dirs[:] = [d for d in dirs if os.path.abspath(os.path.join(root, d)) != output_root]
+
+                    for file in files:
+                        if os.path.splitext(file)[1].lower() in self.skipped_extensions:
+                            continue
+
+                        # FIFOs, sockets and device nodes would block or never end
+                        try:
+                            file_stat = os.stat(os.path.join(root, file))
+                        except OSError:
+                            continue
+                        if not stat.S_ISREG(file_stat.st_mode):
+                            continue
+
+                        self.file_count += 1
+                        self.bytes_scanned += file_stat.st_size
+                        pending.add(pool.submit(carve_container, os.path.join(root, file), layout,
+                                                f"carved_{self.file_count}", self.max_carve_size,
+                                                self.write_slots))
+
+                        # Bound the number of queued files so huge trees don't pile up futures
+                        if len(pending) >= self.max_workers * 4:
+                            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                            for future in done:
+                                carved_files.extend(future.result())
+                                layout.record(future.result())
+
+                for future in pending:
+                    carved_files.extend(future.result())
+                    layout.record(future.result())
+
+            carved_files.sort(key=lambda f: (f['original_path'], f['offset']))
+            logger.info(f"Container carving complete. Carved {len(carved_files)} images "
+                        f"from {self.file_count} files.")
+            return carved_files
+
+        except Exception as e:
+            logger.error(f"Error carving container files: {str(e)}", exc_info=True)
+            return carved_files
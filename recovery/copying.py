@@ -0,0 +1,122 @@
+# copying.py
+import os
+import sys
+import errno
+import shutil
+import logging
+import tempfile
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger("ImageRecovery.Copying")
+
+# ioctl request sharing a file's extents with another (btrfs, XFS, bcachefs...)
+_FICLONE = 0x40049409
+
+# Errors meaning "this mechanism does not apply here", as opposed to real I/O failures
+_UNSUPPORTED = {errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP, errno.ENOTTY, errno.EBADF,
+                errno.EPERM, errno.ENOTSUP}
+
+
+def copy_file(source_path, output_path, hardlink=False):
+    """
+    Copy a file as cheaply as the platform allows
+
+    Tries, in order: a hard link (only if requested), a reflink clone,
+    os.copy_file_range (in-kernel, server-side on NFS/SMB), os.sendfile and
+    finally a buffered copy. Metadata is copied as with shutil.copy2.
+
+    The copy is made under a temporary name and renamed over the output,
+    so an existing output is replaced rather than written through. An
+    output hard-linked to the source by an earlier run therefore never
+    truncates the source.
+
+    Args:
+        source_path: File to copy
+        output_path: Destination path (replaced if it exists)
+        hardlink: Link instead of copying when both are on one volume. The
+            output then shares its data with the source, so writing to one
+            changes the other.
+
+    Returns:
+        Name of the method used: 'hardlink', 'reflink', 'copy_file_range',
+        'sendfile' or 'copy'
+    """
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(output_path)),
+                                     prefix=f".{os.path.basename(output_path)}.", suffix=".tmp")
+    try:
+        if hardlink:
+            os.close(fd)
+            fd = None
+            os.unlink(temp_path)
+            try:
+                os.link(source_path, temp_path)
+                method = 'hardlink'
+            except OSError as e:
+                logger.debug(f"Hard link not possible for {source_path}, copying: {str(e)}")
+                fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0))
+
+        if fd is not None:
+            with open(source_path, 'rb') as src, open(fd, 'wb') as dst:
+                fd = None
+                size = os.fstat(src.fileno()).st_size
+                for method, copier in (('reflink', _reflink), ('copy_file_range', _copy_file_range),
+                                       ('sendfile', _sendfile)):
+                    try:
+                        if copier(src.fileno(), dst.fileno(), size):
+                            break
+                    except OSError as e:
+                        if e.errno not in _UNSUPPORTED:
+                            raise
+                    # Undo any partial transfer before trying the next mechanism
+                    src.seek(0)
+                    dst.seek(0)
+                    dst.truncate()
+                else:
+                    method = 'copy'
+                    shutil.copyfileobj(src, dst, 1024 * 1024)
+            shutil.copystat(source_path, temp_path)
+
+        os.replace(temp_path, output_path)
+    finally:
+        if fd is not None:
+            os.close(fd)
+        # Also covers renaming a link over another link to the same file, which leaves both in place
+        if os.path.lexists(temp_path):
+            os.unlink(temp_path)
+    return method
+
+
+def _reflink(src_fd, dst_fd, size):
+    if fcntl is None:
+        return False
+    fcntl.ioctl(dst_fd, _FICLONE, src_fd)
+    return True
+
+
+def _copy_file_range(src_fd, dst_fd, size):
+    if not hasattr(os, 'copy_file_range'):
+        return False
+    copied = 0
+    while copied < size:
+        sent = os.copy_file_range(src_fd, dst_fd, size - copied)
+        if sent == 0:
+            break
+        copied += sent
+    return copied == size
+
+
+def _sendfile(src_fd, dst_fd, size):
+    # Only Linux can sendfile into a regular file
+    if not hasattr(os, 'sendfile') or not sys.platform.startswith('linux'):
+        return False
+    copied = 0
+    while copied < size:
+        sent = os.sendfile(dst_fd, src_fd, copied, size - copied)
+        if sent == 0:
+            break
+        copied += sent
+    return copied == size
@@ -0,0 +1,217 @@
+# duplicates.py
+import os
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger("ImageRecovery.Duplicates")
+
+_HASH_SIZE = 8
+_SAMPLE_SIZE = 32
+
+# Orthogonal DCT-II basis; only its first rows are needed for the low frequencies
+_DCT = np.cos(np.pi * np.outer(np.arange(_SAMPLE_SIZE), 2 * np.arange(_SAMPLE_SIZE) + 1) / (2 * _SAMPLE_SIZE))
+_DCT_LOW = _DCT[:_HASH_SIZE].astype(np.float32)
+
+
+def _popcount(values):
+    """Count set bits of every element of a uint64 array"""
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(values)
+    return np.unpackbits(values.view(np.uint8).reshape(values.shape + (8,)), axis=-1).sum(axis=-1)
+
+
+def _hash_chunk(paths):
+    """
+    Compute 64-bit DCT perceptual hashes for a chunk of images
+
+    Args:
+        paths: Image file paths
+
+    Returns:
+        Tuple of (uint64 hash array, bool array marking images that decoded)
+    """
+    samples = np.zeros((len(paths), _SAMPLE_SIZE, _SAMPLE_SIZE), dtype=np.float32)
+    decoded = np.zeros(len(paths), dtype=bool)
+
+    for i, path in enumerate(paths):
+        try:
+            with Image.open(path) as img:
+                # JPEG DCT scaling decodes near the sample size instead of full resolution
+                img.draft('L', (_SAMPLE_SIZE * 2, _SAMPLE_SIZE * 2))
+                samples[i] = np.asarray(img.convert('L').resize((_SAMPLE_SIZE, _SAMPLE_SIZE), Image.BILINEAR,
+                                                                reducing_gap=2.0), dtype=np.float32)
+            decoded[i] = True
+        except Exception:
+            continue
+
+    # Low-frequency 8x8 DCT block of every sample at once
+    low = (_DCT_LOW @ samples @ _DCT_LOW.T).reshape(len(paths), -1)
+    median = np.median(low[:, 1:], axis=1, keepdims=True)  # DC term excluded
+    bits = np.packbits(low > median, axis=1)
+    return bits.view('>u8').ravel().astype(np.uint64), decoded
+
+
+class NearDuplicateFinder:
+    """Module for grouping near-identical images (re-saves, resizes, thumbnails) by perceptual hash"""
+
+    def __init__(self, threshold=6, max_workers=None, chunk_size=256, pool=None):
+        """
+        Args:
+            threshold: Largest Hamming distance between 64-bit hashes that
+                counts as a near duplicate
+            max_workers: Worker processes decoding images (defaults to the CPU count)
+            chunk_size: Images hashed per worker task
+            pool: ProcessPoolExecutor shared across a run; one is started per
+                group() if None
+        """
+        self.threshold = threshold
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.pool = pool
+
+    def group(self, file_list):
+        """
+        Group near-duplicate images among files verified OK
+
+        Sets 'phash' on every hashed file and 'duplicate_group' on files that
+        have at least one near duplicate. Files that already carry a 'phash'
+        (e.g. from a per-job pass before a batch-wide one) are not decoded again.
+
+        Args:
+            file_list: List of file information dictionaries
+
+        Returns:
+            List of groups, each a list of file information dictionaries
+        """
+        for file_info in file_list:
+            file_info.pop('duplicate_group', None)
+
+        candidates = [f for f in file_list if f.get('status') == 'OK']
+        if len(candidates) < 2:
+            return []
+
+        unhashed = [f for f in candidates if 'phash' not in f]
+        if unhashed:
+            logger.info(f"Hashing {len(unhashed)} images for near-duplicate detection")
+            hashes, decoded = self._hash_files([f['path'] for f in unhashed])
+            for file_info, value, ok in zip(unhashed, hashes, decoded):
+                if ok:
+                    file_info['phash'] = f"{int(value):016x}"
+
+        candidates = [f for f in candidates if 'phash' in f]
+        labels = self._label(np.array([int(f['phash'], 16) for f in candidates], dtype=np.uint64))
+
+        groups = [[] for _ in range(labels.max(initial=0))]
+        for file_info, n in zip(candidates, labels.tolist()):
+            if n:
+                file_info['duplicate_group'] = n
+                groups[n - 1].append(file_info)
+
+        logger.info(f"Found {len(groups)} near-duplicate groups covering "
+                    f"{sum(len(group) for group in groups)} images")
+        return groups
+
+    def group_catalog(self, catalog, status='OK'):
+        """
+        Group near-duplicate images in a recovery catalog, in place
+
+        Only row numbers and hashes are held in memory. Files without a stored
+        'phash' are hashed a batch at a time and their hashes written back, so
+        later passes (e.g. batch-wide after per-job) do not decode them again.
+
+        Args:
+            catalog: RecoveryCatalog to read hashes from and store groups in
+            status: Only files with this status are grouped
+
+        Returns:
+            Number of groups found
+        """
+        hashed = 0
+        for batch in catalog.iter_unhashed(status, self.chunk_size * self.max_workers):
+            hashes, decoded = self._hash_files([path for _, path in batch])
+            catalog.set_phashes((row, f"{value:016x}")
+                                for (row, _), value, ok in zip(batch, hashes.tolist(), decoded.tolist()) if ok)
+            hashed += len(batch)
+        if hashed:
+            logger.info(f"Hashed {hashed} images for near-duplicate detection")
+
+        rows = np.fromiter(((row, int(phash, 16)) for row, phash in catalog.iter_phashes(status)),
+                           dtype=[('row', np.int64), ('phash', np.uint64)])
+        labels = self._label(rows['phash'])
+        grouped = np.flatnonzero(labels)
+        catalog.set_duplicate_groups(zip(rows['row'][grouped].tolist(), labels[grouped].tolist()))
+
+        count = int(labels.max(initial=0))
+        logger.info(f"Found {count} near-duplicate groups covering {len(grouped)} images")
+        return count
+
+    def _label(self, hashes):
+        """
+        Number the near-duplicate groups of a hash array
+
+        Groups are numbered from 1 in order of their first member.
+
+        Returns:
+            Array with each hash's group number, 0 for hashes without a near duplicate
+        """
+        parent = list(range(len(hashes)))
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        for i, j in self._near_pairs(hashes):
+            root_i, root_j = find(i), find(j)
+            if root_i != root_j:
+                parent[max(root_i, root_j)] = min(root_i, root_j)
+
+        # Every root is its group's first member, so numbering roots in order numbers groups in order
+        roots = np.fromiter((find(i) for i in range(len(hashes))), dtype=np.int64, count=len(hashes))
+        shared = np.bincount(roots, minlength=len(hashes)) > 1
+        numbers = np.zeros(len(hashes), dtype=np.int64)
+        numbers[shared] = np.arange(1, np.count_nonzero(shared) + 1)
+        return numbers[roots]
+
+    def _hash_files(self, paths):
+        """Hash all paths, in order, across the worker pool"""
+        chunks = [paths[i:i + self.chunk_size] for i in range(0, len(paths), self.chunk_size)]
+        if self.max_workers <= 1 or len(chunks) == 1:
+            results = [_hash_chunk(chunk) for chunk in chunks]
+        else:
+            with nullcontext(self.pool) if self.pool else ProcessPoolExecutor(max_workers=self.max_workers) as pool:
+                results = list(pool.map(_hash_chunk, chunks))
+        return np.concatenate([r[0] for r in results]), np.concatenate([r[1] for r in results])
+
+    def _near_pairs(self, hashes):
+        """
+        Yield index pairs within the Hamming threshold
+
+        Multi-index hashing: split the 64 bits into threshold + 1 blocks. Two
+        hashes within the threshold agree exactly on at least one block, so
+        only hashes sharing a block value are ever compared.
+        """
+        blocks = self.threshold + 1
+        bounds = np.linspace(0, 64, blocks + 1).astype(int)
+
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            keys = (hashes >> np.uint64(start)) & np.uint64((1 << (stop - start)) - 1)
+            order = np.argsort(keys, kind='stable')
+            edges = np.flatnonzero(np.diff(keys[order])) + 1
+
+            for bucket in np.split(order, edges):
+                if len(bucket) < 2:
+                    continue
+                bucket_hashes = hashes[bucket]
+                # Rows in slices keep the pairwise matrix small for crowded buckets
+                columns = np.arange(len(bucket))
+                for row in range(0, len(bucket), 256):
+                    distances = _popcount(bucket_hashes[row:row + 256, None] ^ bucket_hashes[None, :])
+                    # Upper triangle only: each pair once, no self-pairs
+                    near = (distances <= self.threshold) & (columns[row:row + 256, None] < columns[None, :])
+                    rows, cols = np.nonzero(near)
+                    yield from zip(bucket[rows + row].tolist(), bucket[cols].tolist())
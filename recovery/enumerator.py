@@ -1,15 +1,30 @@
 # enumerator.py
 import os
+import re
+import sys
+import stat
 import string
 import ctypes
 import logging
 import platform
-import win32api
-import win32file
-import wmi
+
+if sys.platform == 'win32':
+    import win32api
+    import win32file
+    import wmi
+else:
+    win32api = win32file = wmi = None
 
 logger = logging.getLogger("ImageRecovery.Enumerator")
 
+_SYS_BLOCK = "/sys/block"
+_PROC_PARTITIONS = "/proc/partitions"
+_MOUNTINFO = "/proc/self/mountinfo"
+_BY_LABEL = "/dev/disk/by-label"
+
+# RAM disks, compressed swap, optical and floppy drives are never recovery targets
+_SKIPPED_DEVICES = ('ram', 'zram', 'sr', 'fd')
+
 def get_size_formatted(size_bytes):
     """Convert bytes to a human-readable format"""
     if size_bytes == 0:
@@ -25,6 +40,12 @@ def get_size_formatted(size_bytes):
 
 def list_drives():
     """List all available drives, partitions, and mount points"""
+    if sys.platform.startswith('linux'):
+        return _list_linux_drives()
+    return _list_windows_drives()
+
+def _list_windows_drives():
+    """Logical drives and physical disks through WMI and the Win32 API"""
     drives = []
     
     try:
@@ -158,6 +179,176 @@ def list_drives():
         
     return drives
 
+def _list_linux_drives():
+    """
+    Partitions, mount points and whole disks from sysfs and procfs
+
+    Only small kernel-generated files are read, so this takes milliseconds
+    where a WMI query takes seconds. Mounted partitions are listed by mount
+    point, unmounted ones by device node (e.g. a reformatted memory card),
+    followed by every disk as a physical drive.
+    """
+    drives = []
+    physical_drives = []
+
+    try:
+        sizes = _linux_partition_sizes()
+        mounts = _linux_mounts()
+        labels = _linux_labels()
+
+        for disk in sorted(os.listdir(_SYS_BLOCK)):
+            if disk.startswith(_SKIPPED_DEVICES) or sizes.get(disk, 0) == 0:
+                continue
+            disk_dir = os.path.join(_SYS_BLOCK, disk)
+            device_id = f"/dev/{disk}"
+
+            # USB card readers and sticks often report removable=0; their sysfs path gives them away
+            removable = (_read_sysfs(os.path.join(disk_dir, "removable")) == "1"
+                         or "/usb" in os.path.realpath(disk_dir))
+
+            partitions = sorted(entry for entry in os.listdir(disk_dir)
+                                if os.path.exists(os.path.join(disk_dir, entry, "partition")))
+            # A disk formatted without a partition table is its own only volume
+            for name in partitions or [disk]:
+                drive_info = {
+                    'path': f"/dev/{name}",
+                    'device_id': device_id,
+                    'label': labels.get(name) or 'No Label',
+                    'filesystem': 'Unmounted',
+                    'size_bytes': sizes.get(name, 0),
+                    'size_formatted': get_size_formatted(sizes.get(name, 0)),
+                    'free_space_bytes': 0,
+                    'free_space_formatted': 'N/A',
+                    'type': 'Removable' if removable else 'Fixed'
+                }
+
+                dev = _read_sysfs(os.path.join(disk_dir, name, "dev") if name != disk else
+                                  os.path.join(disk_dir, "dev"))
+                mount = mounts.get(dev) or mounts.get(f"/dev/{name}")
+                if mount:
+                    mount_point, filesystem = mount
+                    drive_info.update(path=mount_point, filesystem=filesystem)
+                    try:
+                        usage = os.statvfs(mount_point)
+                        drive_info['size_bytes'] = usage.f_blocks * usage.f_frsize
+                        drive_info['size_formatted'] = get_size_formatted(drive_info['size_bytes'])
+                        drive_info['free_space_bytes'] = usage.f_bavail * usage.f_frsize
+                        drive_info['free_space_formatted'] = get_size_formatted(drive_info['free_space_bytes'])
+                    except OSError as e:
+                        logger.warning(f"Error getting disk space for {mount_point}: {str(e)}")
+                elif partitions:
+                    drive_info['type'] = 'Partition'
+
+                if mount or partitions:
+                    drives.append(drive_info)
+
+            model = " ".join(part for part in (_read_sysfs(os.path.join(disk_dir, "device", "vendor")),
+                                               _read_sysfs(os.path.join(disk_dir, "device", "model"))) if part)
+            physical_drives.append({
+                'path': device_id,
+                'device_id': device_id,
+                'label': f"Physical Disk {disk}",
+                'filesystem': 'Raw Disk',
+                'size_bytes': sizes[disk],
+                'size_formatted': get_size_formatted(sizes[disk]),
+                'free_space_bytes': 0,
+                'free_space_formatted': 'N/A',
+                'type': 'Physical Drive',
+                'model': model or 'Unknown Model'
+            })
+
+    except Exception as e:
+        logger.error(f"Error listing drives: {str(e)}")
+
+    return drives + physical_drives
+
+def _read_sysfs(path):
+    """Contents of a sysfs attribute, or '' if it is missing"""
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return ''
+
+def _linux_partition_sizes():
+    """Map each block device name in /proc/partitions to its size in bytes"""
+    sizes = {}
+    with open(_PROC_PARTITIONS) as f:
+        for line in f:
+            fields = line.split()
+            # major minor #blocks name, sizes in 1 KB blocks
+            if len(fields) == 4 and fields[2].isdigit():
+                sizes[fields[3]] = int(fields[2]) * 1024
+    return sizes
+
+def _linux_mounts():
+    """
+    Map mounted block devices to (mount point, filesystem)
+
+    Devices are keyed both by 'major:minor' and by their /dev path, since
+    some filesystems (btrfs) report an anonymous device number. Bind
+    mounts of subdirectories are ignored and the first mount of a device
+    wins.
+    """
+    mounts = {}
+    with open(_MOUNTINFO) as f:
+        for line in f:
+            fields, _, super_fields = line.partition(' - ')
+            fields, super_fields = fields.split(), super_fields.split()
+            if len(fields) < 5 or len(super_fields) < 2 or fields[3] != '/':
+                continue
+            mount = (_unescape_mount(fields[4]), super_fields[0])
+            mounts.setdefault(fields[2], mount)
+            source = _unescape_mount(super_fields[1])
+            if source.startswith('/dev/'):
+                mounts.setdefault(os.path.realpath(source), mount)
+    return mounts
+
+def _linux_labels():
+    """Map device names to filesystem labels from udev's by-label links"""
+    labels = {}
+    try:
+        for link in os.listdir(_BY_LABEL):
+            target = os.path.basename(os.path.realpath(os.path.join(_BY_LABEL, link)))
+            # udev escapes unsafe characters as \xNN
+            labels[target] = re.sub(r'\\x([0-9a-fA-F]{2})', lambda m: chr(int(m.group(1), 16)), link)
+    except OSError:
+        pass
+    return labels
+
+def _unescape_mount(field):
+    """Undo the octal escaping of spaces and backslashes in mountinfo"""
+    return re.sub(r'\\([0-7]{3})', lambda m: chr(int(m.group(1), 8)), field)
+
+def block_device_for(path):
+    """
+    Find the block device to read raw sectors from for a scan target (Linux)
+
+    Args:
+        path: Device node or mount point
+
+    Returns:
+        The device node path, or None if the path is neither
+    """
+    try:
+        mode = os.stat(path).st_mode
+        if stat.S_ISBLK(mode):
+            return path
+        with open(_MOUNTINFO) as f:
+            for line in f:
+                fields, _, super_fields = line.partition(' - ')
+                fields = fields.split()
+                if len(fields) >= 5 and _unescape_mount(fields[4]) == os.path.abspath(path):
+                    # /sys/dev/block/<major:minor> links to the device's sysfs directory
+                    name = os.path.basename(os.path.realpath(f"/sys/dev/block/{fields[2]}"))
+                    if os.path.exists(f"/dev/{name}"):
+                        return f"/dev/{name}"
+                    source = _unescape_mount(super_fields.split()[1])
+                    return source if source.startswith('/dev/') else None
+    except (OSError, IndexError) as e:
+        logger.warning(f"Error finding block device for {path}: {str(e)}")
+    return None
+
 def get_drive_by_path(path):
     """Get drive information for a specific path"""
     drives = list_drives()
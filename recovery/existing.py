@@ -1,78 +1,436 @@
 # existing.py
 import os
-import shutil
+import time
+import queue
+import hashlib
 import logging
+import threading
+from collections import deque
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from .layout import OutputLayout, MANIFEST_BATCH
+from .walker import scan_tree
+from .copying import copy_file
+from .signatures import sniff_type
+from .filters import MetadataFilter
 
 logger = logging.getLogger("ImageRecovery.Existing")
 
+# Copy threads per kind of output drive: parallel copies keep an SSD's queues
+# full, while on a spinning disk each extra stream mostly adds seeks
+COPY_WORKERS = {'ssd': 8, 'hdd': 2}
+
+# Queue markers: end of a stage's input, and a source the filter rejected
+_DONE = object()
+_FILTERED = object()
+
+def _stage(inbox, outbox, workers, work):
+    """
+    Create threads applying work to each item of inbox until _DONE arrives
+
+    The marker is put back for the other threads, and the last thread to
+    stop passes it on to outbox.
+    """
+    lock = threading.Lock()
+    running = [workers]
+
+    def run():
+        while True:
+            item = inbox.get()
+            if item is _DONE:
+                inbox.put(_DONE)
+                break
+            try:
+                work(item)
+            except Exception as e:
+                logger.error(f"Error processing {item[0]}: {str(e)}")
+        with lock:
+            running[0] -= 1
+            last = running[0] == 0
+        if last:
+            outbox.put(_DONE)
+
+    return [threading.Thread(target=run, daemon=True) for _ in range(workers)]
+
+def _sniff_batch(batch):
+    """Read the first bytes of each (path, stat) and keep images as (path, stat, type)"""
+    images = []
+    for file_path, file_stat in batch:
+        if file_stat.st_size < 8:
+            continue
+        try:
+            with open(file_path, 'rb', buffering=0) as f:
+                file_type = sniff_type(f.read(8))
+        except OSError as e:
+            logger.warning(f"Could not read {file_path}: {str(e)}")
+            continue
+        if file_type:
+            images.append((file_path, file_stat, file_type))
+    return images
+
 class ExistingImageExtractor:
     """Module for extracting existing image files"""
     
-    def __init__(self):
+    # Seconds between throughput reports
+    STATUS_INTERVAL = 1.0
+
+    def __init__(self, walk_workers=16, dedup=True, hardlink=False, sniff=False, sniff_workers=16, sniff_batch=64,
+                 metadata_filter=None, storage='ssd', copy_workers=None, filter_workers=8, queue_size=256,
+                 write_slots=None):
+        """
+        Args:
+            walk_workers: Directories listed concurrently
+            dedup: Store each distinct content once; identical sources are
+                recorded as duplicates of the stored copy (only sources whose
+                size matches stored content are hashed)
+            hardlink: Hard-link sources into the output instead of copying
+                when both are on one volume (the copies then share data with
+                the originals)
+            sniff: Identify images by their first bytes instead of their
+                extension, finding misnamed images and skipping misnamed
+                non-images
+            sniff_workers: Threads reading file headers in sniff mode
+            sniff_batch: Files whose headers one thread reads per task
+            metadata_filter: MetadataFilter selecting images by size, capture
+                date or camera from their headers (everything if None)
+            storage: Kind of output drive, 'ssd' or 'hdd', choosing the
+                default copy concurrency
+            copy_workers: Files copied at once (overrides storage)
+            filter_workers: Threads reading headers for the metadata filter
+            queue_size: Items buffered between pipeline stages
+            write_slots: Semaphore held around each copy, capping writes to
+                an output disk shared with other scans (no cap if None)
+        """
         self.supported_extensions = ['.jpg', '.jpeg', '.png']
+        self.walk_workers = walk_workers
+        self.sniff = sniff
+        self.sniff_workers = sniff_workers
+        self.sniff_batch = sniff_batch
+        self.dedup = dedup
+        self.hardlink = hardlink
+        self.metadata_filter = metadata_filter or MetadataFilter()
+        self.copy_workers = copy_workers or COPY_WORKERS[storage]
+        self.filter_workers = filter_workers
+        self.queue_size = queue_size
+        self.write_slots = write_slots
         self.file_count = 0
+        self.filtered_count = 0
+        self.copy_methods = {}
+        self.deduplicated_bytes = 0
+        self.stats = {}
+        self._lock = threading.Lock()
         
-    def extract_images(self, source_path, output_path):
+    def extract_images(self, source_path, output_path, layout=None, progress=None, status=None):
         """
         Extract existing image files from the source path to the output path
+
+        Extraction is incremental: sources already listed in the output
+        directory's manifest with the same size and mtime (or, if only the
+        mtime moved, the same content) are not copied again.
+
+        The walk, the header filter and the copies run as pipelined stages
+        joined by bounded queues, so copying starts with the first match and
+        a slow stage holds the others back instead of buffering the tree.
         
         Args:
             source_path: Path to scan for existing images
             output_path: Directory to copy the found images
+            layout: OutputLayout to place files with (flat by default)
+            progress: Optional function taking a percentage; the total is
+                only known once the walk has finished
+            status: Optional function taking a status message, called about
+                once a second with the copy throughput
             
         Returns:
-            List of extracted file information
+            List of extracted file information; sources skipped as unchanged
+            are included with status 'Unchanged'
         """
         logger.info(f"Starting existing image extraction from {source_path}")
         self.file_count = 0
+        self.filtered_count = 0
+        self.copy_methods = {}
+        self.deduplicated_bytes = 0
+        self.stats = {}
         extracted_files = []
+        unrecorded = []  # Changed entries not yet written to the manifest
         
         try:
             # Create output directory if it doesn't exist
             os.makedirs(output_path, exist_ok=True)
+            layout = layout or OutputLayout(output_path)
+
+            # Sources extracted by earlier runs into this output directory
+            previous = {}
+            # Size -> entries of the files storing content of that size, and IDs duplicates point at
+            stored = {}
+            referenced = set()
+            for entry in OutputLayout.load_manifest(layout.output_dir).values():
+                if entry['id'].startswith('image_') and 'original_path' in entry:
+                    previous[entry['original_path']] = entry
+                    suffix = entry['id'][len('image_'):]
+                    if suffix.isdigit():
+                        self.file_count = max(self.file_count, int(suffix))
+                    # Copies recorded as unchanged after a touch still hold their content
+                    if 'duplicate_of' not in entry and 'size' in entry and os.path.exists(entry['path']):
+                        stored.setdefault(entry['size'], []).append(entry)
+                    if 'duplicate_of' in entry:
+                        referenced.add(entry['duplicate_of'])
+
+            found = queue.Queue(maxsize=self.queue_size)
+            selected = queue.Queue(maxsize=self.queue_size)
+            finished = queue.Queue()
+            walked = [0, False]  # Images found so far, walk complete
+
+            def walk():
+                # Walk the source path concurrently; matches stream in as directories are listed
+                try:
+                    for file_path, file_stat, file_type in self._find_images(source_path, output_path):
+                        found.put((os.path.abspath(file_path), file_stat, file_type))
+                        walked[0] += 1
+                except Exception as e:
+                    logger.error(f"Error walking {source_path}: {str(e)}")
+                finally:
+                    walked[1] = True
+                    found.put(_DONE)
+
+            def select(item):
+                # Header-only check, so unwanted images cost a few KB of reads and no copy
+                if self.metadata_filter.matches(item[0], item[2]):
+                    selected.put(item)
+                else:
+                    finished.put(_FILTERED)
+
+            def extract(item):
+                finished.put(self._extract_one(*item, layout, previous, stored, referenced))
+
+            threads = [threading.Thread(target=walk, daemon=True)]
+            threads += _stage(found, selected, self.filter_workers if self.metadata_filter.is_active() else 1,
+                              select)
+            threads += _stage(selected, finished, self.copy_workers, extract)
+            for thread in threads:
+                thread.start()
+
+            started = time.perf_counter()
+            processed = copied_bytes = 0
+            reported_at = started
+            reported_percent = 0
+            while True:
+                try:
+                    file_info = finished.get(timeout=self.STATUS_INTERVAL)
+                except queue.Empty:
+                    pass
+                else:
+                    if file_info is _DONE:
+                        break
+                    processed += 1
+                    if file_info is _FILTERED:
+                        self.filtered_count += 1
+                    elif file_info is not None:
+                        file_info, changed = file_info
+                        extracted_files.append(file_info)
+                        # Manifest writes stay on this thread, in completion order, a batch at a time
+                        if changed:
+                            unrecorded.append(file_info)
+                            if len(unrecorded) >= MANIFEST_BATCH:
+                                layout.record(unrecorded)
+                                unrecorded = []
+                        if file_info['status'] == 'Copied':
+                            copied_bytes += file_info['size']
+
+                now = time.perf_counter()
+                if progress and walked[1]:
+                    percent = min(90, processed * 90 // max(walked[0], 1))
+                    if percent > reported_percent:
+                        reported_percent = percent
+                        progress(percent)
+                if status and now - reported_at >= self.STATUS_INTERVAL:
+                    reported_at = now
+                    elapsed = max(now - started, 1e-9)
+                    total = walked[0] if walked[1] else f"{walked[0]}+"
+                    status(f"Extracted {processed} of {total} images: {processed / elapsed:.1f} files/s, "
+                           f"{copied_bytes / elapsed / (1024 * 1024):.1f} MB/s")
+
+            elapsed = max(time.perf_counter() - started, 1e-9)
+            self.stats = {
+                'files': processed,
+                'bytes': copied_bytes,
+                'seconds': elapsed,
+                'files_per_second': processed / elapsed,
+                'mb_per_second': copied_bytes / elapsed / (1024 * 1024),
+                'workers': self.copy_workers
+            }
             
-            # Walk through the source path
-            for root, dirs, files in os.walk(source_path):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    file_extension = os.path.splitext(file)[1].lower()
-                    
-                    # Check if it's a supported image file
-                    if file_extension in self.supported_extensions:
-                        try:
-                            # Get file information
-                            file_size = os.path.getsize(file_path)
-                            
-                            # Generate output filename
-                            self.file_count += 1
-                            output_filename = f"image_{self.file_count}{file_extension}"
-                            output_file_path = os.path.join(output_path, output_filename)
-                            
-                            # Copy the file
-                            shutil.copy2(file_path, output_file_path)
-                            
-                            # Add to extracted files list
-                            extracted_files.append({
-                                'path': output_file_path,
-                                'original_path': file_path,
-                                'size': file_size,
-                                'type': file_extension[1:],  # Remove the dot
-                                'status': 'Copied'
-                            })
-                            
-                            logger.info(f"Copied existing file: {file_path} to {output_file_path}")
-                            
-                        except Exception as e:
-                            logger.error(f"Error copying file {file_path}: {str(e)}")
-            
-            logger.info(f"Extraction complete. Extracted {len(extracted_files)} existing image files.")
+            copied = len([f for f in extracted_files if f['status'] == 'Copied'])
+            duplicates = len([f for f in extracted_files if f['status'] == 'Duplicate'])
+            logger.info(f"Extraction complete. Extracted {copied} existing image files, {duplicates} duplicates "
+                        f"({self.deduplicated_bytes} bytes not stored), "
+                        f"{len(extracted_files) - copied - duplicates} unchanged, {self.filtered_count} filtered out "
+                        f"in {elapsed:.1f}s ({self.stats['mb_per_second']:.1f} MB/s). "
+                        f"Copy methods: {self.copy_methods}")
             return extracted_files
             
         except Exception as e:
             logger.error(f"Error extracting existing images: {str(e)}", exc_info=True)
             return extracted_files
+
+        finally:
+            # Entries of files copied before an error are still recorded
+            if unrecorded:
+                layout.record(unrecorded)
+
+    def _extract_one(self, file_path, file_stat, file_type, layout, previous, stored, referenced):
+        """
+        Copy or skip one selected source; runs on a copy thread
+
+        Returns:
+            Tuple of (file information, whether its manifest entry changed),
+            or None if the source could not be extracted
+        """
+        known = previous.get(file_path)
+        try:
+            if known and known.get('size') == file_stat.st_size and os.path.exists(known['path']):
+                if known.get('source_mtime') == file_stat.st_mtime_ns:
+                    return dict(known, status='Unchanged'), False
+
+            file_info = {
+                'original_path': file_path,
+                'size': file_stat.st_size,
+                'source_mtime': file_stat.st_mtime_ns,
+                'type': file_type
+            }
+            file_hash = None
+
+            while True:
+                with self._lock:
+                    # Only content of a size already stored can be a duplicate, so only then is it hashed
+                    candidates = stored.get(file_stat.st_size, []) if self.dedup else []
+                    unhashed = [entry for entry in candidates if not entry.get('hash')]
+                    if not candidates or (file_hash and not unhashed):
+                        original = next((entry for entry in candidates if entry['hash'] == file_hash), None)
+                        if original is not None:
+                            if not (known and original['id'] == known['id']):
+                                referenced.add(original['id'])
+                                self.deduplicated_bytes += file_stat.st_size
+                                # Duplicates are recorded under their own ID, pointing at the stored copy
+                                file_info['id'] = self._claim_id(known, stored, referenced)
+                            break
+                        file_info['id'] = self._claim_id(known, stored, referenced)
+                        file_info['path'] = layout.path_for(file_info['id'], file_type)
+                        if file_hash:
+                            file_info['hash'] = file_hash
+                        if self.dedup:
+                            # Claimed before copying, so an identical source on another thread becomes its duplicate
+                            stored.setdefault(file_stat.st_size, []).append(file_info)
+                        break
+
+                # Hash outside the lock, then check again for entries added meanwhile
+                file_hash = file_hash or self._hash_file(file_path)
+                for entry in unhashed:
+                    self._hash_stored(entry, stored)
+
+            if original is not None:
+                if known and original['id'] == known['id']:
+                    # Touched but identical to its own earlier copy: one read of the source instead of a copy
+                    return dict(known, hash=file_hash, source_mtime=file_stat.st_mtime_ns, status='Unchanged'), True
+                # Identical content is stored once; the duplicate points at that copy
+                file_info.update(path=original['path'], hash=file_hash, duplicate_of=original['id'],
+                                 status='Duplicate')
+                if known and known['id'] == file_info['id'] and 'duplicate_of' not in known:
+                    # The source's own earlier copy is no longer referenced by anything
+                    try:
+                        os.remove(known['path'])
+                    except OSError as e:
+                        logger.warning(f"Could not remove stale copy {known['path']}: {str(e)}")
+                logger.info(f"Skipped duplicate of {original['original_path']}: {file_path}")
+                return file_info, True
+
+            output_file_path = file_info['path']
+            try:
+                with self.write_slots or nullcontext():
+                    method = copy_file(file_path, output_file_path, self.hardlink)
+            except Exception:
+                with self._lock:
+                    same_size = stored.get(file_stat.st_size, [])
+                    same_size[:] = [entry for entry in same_size if entry is not file_info]
+                raise
+            with self._lock:
+                self.copy_methods[method] = self.copy_methods.get(method, 0) + 1
+            file_info['status'] = 'Copied'
+            logger.info(f"Copied existing file ({method}): {file_path} to {output_file_path}")
+            return file_info, True
+
+        except Exception as e:
+            logger.error(f"Error copying file {file_path}: {str(e)}")
+            return None
     
+    def _claim_id(self, known, stored, referenced):
+        """
+        Pick the logical ID for a source; called with the lock held
+
+        A source extracted before keeps its ID unless duplicates point at
+        its stored copy. Its old content then no longer counts as stored.
+        """
+        if known and known['id'] not in referenced:
+            old = stored.get(known.get('size'), [])
+            old[:] = [entry for entry in old if entry['id'] != known['id']]
+            return known['id']
+        self.file_count += 1
+        return f"image_{self.file_count}"
+
+    def _hash_stored(self, entry, stored):
+        """Fill in the hash of a stored entry, dropping it from stored if its content cannot be read"""
+        # Copies still in flight are hashed from their source, finished ones from the output
+        path = entry['path'] if entry.get('status') == 'Copied' else entry['original_path']
+        try:
+            entry_hash = self._hash_file(path)
+        except OSError as e:
+            logger.warning(f"Could not hash {path}: {str(e)}")
+            with self._lock:
+                same_size = stored.get(entry['size'], [])
+                same_size[:] = [other for other in same_size if other is not entry]
+            return
+        with self._lock:
+            entry.setdefault('hash', entry_hash)
+
+    def _find_images(self, source_path, output_path):
+        """Yield (path, stat, type) for every image under the source path"""
+        if not self.sniff:
+            for file_path, file_stat in scan_tree(source_path, self._is_supported, self.walk_workers,
+                                                  skip_dirs=[output_path]):
+                yield file_path, file_stat, os.path.splitext(file_path)[1].lower()[1:]  # Remove the dot
+            return
+
+        # Every file is a candidate; header reads run in batches on a thread pool
+        files = scan_tree(source_path, lambda name: True, self.walk_workers, skip_dirs=[output_path])
+        with ThreadPoolExecutor(max_workers=self.sniff_workers) as pool:
+            pending = deque()
+            batch = []
+            for candidate in files:
+                batch.append(candidate)
+                if len(batch) >= self.sniff_batch:
+                    pending.append(pool.submit(_sniff_batch, batch))
+                    batch = []
+                    # Hand results on in order while keeping every reader busy
+                    while len(pending) > self.sniff_workers * 2 or (pending and pending[0].done()):
+                        yield from pending.popleft().result()
+            if batch:
+                pending.append(pool.submit(_sniff_batch, batch))
+            while pending:
+                yield from pending.popleft().result()
+
+    def _hash_file(self, file_path):
+        """Calculate SHA-256 hash of a file"""
+        sha256_hash = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                sha256_hash.update(chunk)
+        return sha256_hash.hexdigest()
+
+    def _is_supported(self, file_name):
+        """Check whether a file name has a supported image extension"""
+        return os.path.splitext(file_name)[1].lower() in self.supported_extensions
+
     def is_valid_image(self, file_path):
         """
         Check if a file is a valid image by attempting to open it
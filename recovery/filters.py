@@ -0,0 +1,84 @@
+# filters.py
+import logging
+from .headers import read_metadata
+
+logger = logging.getLogger("ImageRecovery.Filters")
+
+class MetadataFilter:
+    """Module for selecting images by header metadata without decoding them"""
+
+    def __init__(self, min_width=None, min_height=None, max_width=None, max_height=None,
+                 taken_after=None, taken_before=None, camera_model=None):
+        """
+        Args:
+            min_width, min_height, max_width, max_height: Pixel size bounds
+            taken_after, taken_before: datetime bounds on the Exif
+                DateTimeOriginal (falling back to DateTime); images without a
+                capture date never match a date bound
+            camera_model: Case-insensitive substring of the Exif camera model
+        """
+        self.min_width = min_width
+        self.min_height = min_height
+        self.max_width = max_width
+        self.max_height = max_height
+        self.taken_after = taken_after
+        self.taken_before = taken_before
+        self.camera_model = camera_model.lower() if camera_model else None
+
+    def is_active(self):
+        """True if any bound is set"""
+        return any(value is not None for value in (self.min_width, self.min_height, self.max_width,
+                                                   self.max_height, self.taken_after, self.taken_before,
+                                                   self.camera_model))
+
+    def matches(self, file_path, file_type):
+        """
+        Check an image against the filter, reading only its header
+
+        Args:
+            file_path: Path to the image file
+            file_type: Type of the image (jpg, png)
+
+        Returns:
+            True if the image satisfies every bound
+        """
+        if not self.is_active():
+            return True
+        if file_type == 'jpeg':
+            file_type = 'jpg'
+
+        try:
+            with open(file_path, 'rb') as f:
+                metadata = read_metadata(f, file_type)
+        except OSError as e:
+            logger.warning(f"Could not read header of {file_path}: {str(e)}")
+            return False
+
+        if metadata is None:
+            return False
+        return self.matches_metadata(metadata)
+
+    def matches_metadata(self, metadata):
+        """Check metadata from headers.read_metadata against the filter"""
+        width, height = metadata['width'], metadata['height']
+        for value, low, high in ((width, self.min_width, self.max_width), (height, self.min_height, self.max_height)):
+            if low is None and high is None:
+                continue
+            if value is None or (low is not None and value < low) or (high is not None and value > high):
+                return False
+
+        date_taken = metadata['date_taken']
+        if self.taken_after is not None or self.taken_before is not None:
+            if date_taken is None:
+                return False
+            if self.taken_after is not None and date_taken < self.taken_after:
+                return False
+            if self.taken_before is not None and date_taken > self.taken_before:
+                return False
+
+        if self.camera_model is not None:
+            model = metadata['camera_model']
+            if model is None or self.camera_model not in model.lower():
+                return False
+
+        return True
@@ -0,0 +1,292 @@
+# fragments.py
+import re
+import time
+import bisect
+import logging
+from array import array
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import nullcontext
+from .headers import JpegScan, DecodeDeadlineExceeded
+from .layout import OutputLayout
+
+logger = logging.getLogger("ImageRecovery.Fragments")
+
+# Any marker inside entropy-coded data (0xFF00 is a stuffed data byte)
+_MARKER_RE = re.compile(rb'\xff[^\x00]')
+_EOI = 0xD9
+
+# Amount of second-fragment data decoded before a candidate is fully validated
+_PROBE_WINDOW = 64 * 1024
+
+
+def _unstuffed_bits(segment):
+    """Convert entropy-coded bytes to a '0'/'1' string with byte stuffing removed"""
+    segment = segment.replace(b'\xff\x00', b'\xff')
+    if not segment:
+        return ''
+    # The leading 0x01 keeps leading zero bits from being dropped by bin()
+    return bin(int.from_bytes(b'\x01' + segment, 'big'))[3:]
+
+
+def _stuffed_length(data, start, length):
+    """Number of source bytes starting at start that hold length unstuffed bytes"""
+    size = length
+    for _ in range(8):
+        needed = length + data.count(b'\xff\x00', start, start + size)
+        if needed == size:
+            break
+        size = needed
+    return size
+
+
+def reassemble_jpeg(data, base_offset=0, cluster_size=4096, max_gap=16 * 1024 * 1024,
+                    max_backtrack=32, deadline=None):
+    """
+    Search for the second fragment of a JPEG that was split into two fragments
+
+    The first fragment is validated from the header until Huffman decoding
+    or the restart-marker sequence breaks. Cluster boundaries just before
+    that point are tried as the end of the first fragment, and every
+    cluster boundary within max_gap after it as the start of the second.
+    Gaps are ranked smallest first; each candidate is filtered by the marker
+    that must terminate the joined segment, probed with a short Huffman
+    decode and then fully validated through to EOI.
+
+    Args:
+        data: Bytes read from the source starting at the JPEG header
+        base_offset: Source offset of data[0], used to align cluster boundaries
+        cluster_size: Allocation unit size of the carved file system
+        max_gap: Largest gap between the fragments to consider
+        max_backtrack: Number of cluster boundaries before the failure point to try
+        deadline: time.monotonic() value after which the search is abandoned,
+            checked during every decode including full-candidate validation
+
+    Returns:
+        Tuple (first_end, second_start, second_end) of offsets into data, or
+        None if the file could not be reassembled
+    """
+    scan = JpegScan.parse(data)
+    if scan is None:
+        return None
+
+    markers = [m.start() for m in _MARKER_RE.finditer(data, scan.scan_start)]
+    interval = scan.restart_interval or scan.mcu_count
+    last_segment = (scan.mcu_count - 1) // interval
+
+    def marker_after(pos):
+        i = bisect.bisect_left(markers, pos)
+        return markers[i] if i < len(markers) else None
+
+    def expected_marker(j):
+        return _EOI if j == last_segment else 0xD0 + (j % 8)
+
+    def segment_mcus(j):
+        return min(interval, scan.mcu_count - j * interval)
+
+    try:
+        # Validate the contiguous carve to find where the first fragment ends
+        seg_starts = [scan.scan_start]
+        first_bits = ''
+        first_boundaries = array('Q', [0])
+        j = 0
+        while True:
+            start = seg_starts[-1]
+            m = marker_after(start)
+            bits = _unstuffed_bits(data[start:m if m is not None else len(data)])
+            boundaries = first_boundaries if not scan.restart_interval else None
+            decoded, pos, error = scan.decode(bits, segment_mcus(j), boundaries, deadline)
+            if not scan.restart_interval:
+                first_bits = bits
+
+            if error or decoded < segment_mcus(j) or m is None or data[m + 1] != expected_marker(j):
+                fail = start + _stuffed_length(data, start, pos // 8)
+                break
+            if j == last_segment:
+                # Decodes cleanly through EOI, so it is not a two-fragment file
+                return None
+            seg_starts.append(m + 2)
+            j += 1
+
+        # Cluster boundaries where the first fragment may end, nearest the failure first
+        low = max(scan.scan_start, seg_starts[-1] - cluster_size)
+        first_split = ((base_offset + low) // cluster_size + 1) * cluster_size - base_offset
+        splits = list(range(first_split, fail + 1, cluster_size))[-max_backtrack:]
+        splits.reverse()
+
+        joins = []
+        for split in splits:
+            j = bisect.bisect_right(seg_starts, split) - 1
+            if scan.restart_interval:
+                done = 0
+                prefix_bits = _unstuffed_bits(data[seg_starts[j]:split])
+            else:
+                prefix_len = 8 * ((split - scan.scan_start) - data.count(b'\xff\x00', scan.scan_start, split))
+                done = bisect.bisect_right(first_boundaries, prefix_len) - 1
+                prefix_bits = first_bits[first_boundaries[done]:prefix_len]
+            joins.append((split, j, prefix_bits, segment_mcus(j) - done))
+
+        def validate_rest(j, m):
+            # The joined segment decoded; walk the rest of the restart sequence to EOI
+            while j < last_segment:
+                start = m + 2
+                j += 1
+                m = marker_after(start)
+                if m is None or data[m + 1] != expected_marker(j):
+                    return None
+                decoded, pos, error = scan.decode(_unstuffed_bits(data[start:m]), segment_mcus(j),
+                                                  deadline=deadline)
+                if error or decoded < segment_mcus(j):
+                    return None
+            return m + 2
+
+        # Rank candidate gaps smallest first; the first one that validates wins
+        for gap in range(cluster_size, max_gap + 1, cluster_size):
+            if min(splits, default=len(data)) + gap >= len(data):
+                break
+            if deadline is not None and time.monotonic() > deadline:
+                logger.debug(f"Time budget exhausted after trying gaps up to {gap} bytes")
+                return None
+
+            for split, j, prefix_bits, remaining in joins:
+                second = split + gap
+                if second >= len(data):
+                    continue
+
+                # Cheap check: the joined segment must end with the marker the sequence expects
+                m = marker_after(second)
+                if m is None or data[m + 1] != expected_marker(j):
+                    continue
+
+                # Probe with a short Huffman decode before decoding the whole remainder
+                probe_end = m if scan.restart_interval else min(m, second + _PROBE_WINDOW)
+                bits = prefix_bits + _unstuffed_bits(data[second:probe_end])
+                decoded, pos, error = scan.decode(bits, remaining, deadline=deadline)
+                if error or (probe_end == m and decoded < remaining):
+                    continue
+
+                if probe_end < m:
+                    bits = prefix_bits + _unstuffed_bits(data[second:m])
+                    decoded, pos, error = scan.decode(bits, remaining, deadline=deadline)
+                    if error or decoded < remaining:
+                        continue
+
+                end = validate_rest(j, m)
+                if end is not None:
+                    return split, second, end
+
+    except DecodeDeadlineExceeded:
+        logger.debug("Time budget exhausted while validating a candidate")
+        return None
+
+    return None
+
+
+def _read_region(path, offset, length, sector_size=512):
+    """Read a byte range using sector-aligned reads, as raw devices require"""
+    aligned = offset - offset % sector_size
+    padded = length + (offset - aligned)
+    padded += -padded % sector_size
+
+    with open(path, 'rb') as f:
+        f.seek(aligned)
+        data = f.read(padded)
+
+    return data[offset - aligned:offset - aligned + length]
+
+
+def _reassemble_task(drive_path, offset, file_id, layout, options):
+    """Worker process entry point: reassemble one carve and write it out"""
+    try:
+        deadline = time.monotonic() + options['time_budget']
+        data = _read_region(drive_path, offset, options['max_span'])
+        result = reassemble_jpeg(data, offset, options['cluster_size'],
+                                 options['max_gap'], deadline=deadline)
+        if result is None:
+            return None
+
+        first_end, second_start, second_end = result
+        output_path = layout.path_for(file_id, 'jpg', offset)
+        with open(output_path, 'wb') as f:
+            f.write(data[:first_end])
+            f.write(data[second_start:second_end])
+
+        return {
+            'id': file_id,
+            'path': output_path,
+            'size': first_end + (second_end - second_start),
+            'type': 'jpg',
+            'status': 'Recovered',
+            'offset': offset,
+            'fragments': [(offset, first_end), (offset + second_start, second_end - second_start)]
+        }
+
+    except Exception as e:
+        logger.error(f"Error reassembling JPEG at offset {hex(offset)}: {str(e)}")
+        return None
+
+
+class BifragmentCarver:
+    """Module for reassembling JPEG files carved across two fragments"""
+
+    def __init__(self, cluster_size=4096, max_span=32 * 1024 * 1024, max_gap=16 * 1024 * 1024,
+                 time_budget=30.0, max_workers=None, pool=None):
+        self.cluster_size = cluster_size
+        self.max_span = max_span
+        self.max_gap = max_gap
+        self.time_budget = time_budget
+        self.max_workers = max_workers
+        # ProcessPoolExecutor shared across a run; one is started per recover() if None
+        self.pool = pool
+        self.reassembled_count = 0
+
+    def recover(self, drive_path, file_list, output_dir, layout=None):
+        """
+        Attempt to reassemble JPEG carves that failed verification or only partly decode
+
+        Args:
+            drive_path: Raw device or image the files were carved from
+            file_list: List of verified file information dictionaries
+            output_dir: Directory to write reassembled files to
+            layout: OutputLayout to place files with (flat by default)
+
+        Returns:
+            List of file information for the reassembled files
+        """
+        failed = [f for f in file_list if f.get('type') == 'jpg' and 'offset' in f
+                  and (f.get('status') == 'Partial' or 'Corrupted' in f.get('status', ''))]
+        self.reassembled_count = 0
+        reassembled = []
+
+        if not failed:
+            return reassembled
+
+        logger.info(f"Searching for second fragments of {len(failed)} corrupted JPEG carves")
+        layout = layout or OutputLayout(output_dir)
+        options = {
+            'cluster_size': self.cluster_size,
+            'max_span': self.max_span,
+            'max_gap': self.max_gap,
+            'time_budget': self.time_budget
+        }
+
+        try:
+            with nullcontext(self.pool) if self.pool else ProcessPoolExecutor(max_workers=self.max_workers) as pool:
+                futures = []
+                for n, file_info in enumerate(failed, 1):
+                    futures.append(pool.submit(_reassemble_task, drive_path, file_info['offset'],
+                                               f"reassembled_{n}", layout, options))
+
+                for future in as_completed(futures):
+                    result = future.result()
+                    if result:
+                        reassembled.append(result)
+                        logger.info(f"Reassembled JPEG at {hex(result['offset'])}: {result['path']}")
+
+        except Exception as e:
+            logger.error(f"Error during fragment recovery: {str(e)}", exc_info=True)
+
+        reassembled.sort(key=lambda f: f['offset'])
+        layout.record(reassembled)
+        self.reassembled_count = len(reassembled)
+        logger.info(f"Fragment recovery complete. Reassembled {self.reassembled_count} files.")
+        return reassembled
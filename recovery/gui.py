@@ -1,27 +1,31 @@
 # recovery/gui.py (updated theme)
 import os
 import sys
+import datetime
 import webbrowser
 from PyQt5.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
                             QLabel, QPushButton, QComboBox, QFileDialog, 
                             QProgressBar, QTextEdit, QGroupBox, QRadioButton,
-                            QButtonGroup, QApplication, QMessageBox, QSplitter, QFrame)
-from PyQt5.QtCore import Qt, QThread, pyqtSignal, pyqtSlot
+                            QButtonGroup, QApplication, QMessageBox, QSplitter, QFrame,
+                            QListWidget, QCheckBox, QSpinBox, QLineEdit, QDateEdit)
+from PyQt5.QtCore import Qt, QThread, QDate, pyqtSignal, pyqtSlot
 from PyQt5.QtGui import QIcon, QFont, QTextCursor
+from .filters import MetadataFilter
 
 class RecoveryThread(QThread):
     """Thread to handle the recovery process"""
     update_progress = pyqtSignal(int)
     update_status = pyqtSignal(str)
-    recovery_complete = pyqtSignal(list, str, str)
+    recovery_complete = pyqtSignal(int, str, str)
     error_occurred = pyqtSignal(str)
 
-    def __init__(self, scan_type, target_path, output_dir, recovery_callback):
+    def __init__(self, scan_type, target_path, output_dir, recovery_callback, options=None):
         super().__init__()
         self.scan_type = scan_type
         self.target_path = target_path
         self.output_dir = output_dir
         self.recovery_callback = recovery_callback
+        self.options = options or {}
         self.running = True
 
     def run(self):
@@ -30,7 +34,8 @@ class RecoveryThread(QThread):
             self.recovery_callback(
                 self.scan_type,
                 self.target_path,
-                self.output_dir
+                self.output_dir,
+                **self.options
             )
         except Exception as e:
             self.error_occurred.emit(f"Error during recovery: {str(e)}")
@@ -39,15 +44,31 @@ class RecoveryThread(QThread):
         self.running = False
         self.terminate()
 
+class BatchRecoveryThread(RecoveryThread):
+    """Thread to handle a queue of scans that run concurrently across devices"""
+
+    def __init__(self, jobs, output_dir, batch_callback, options=None):
+        super().__init__("Batch Scan", ", ".join(job[1] for job in jobs), output_dir, batch_callback, options)
+        self.jobs = jobs
+
+    def run(self):
+        try:
+            self.update_status.emit(f"Starting {len(self.jobs)} queued scans...")
+            self.recovery_callback(self.jobs, self.output_dir, **self.options)
+        except Exception as e:
+            self.error_occurred.emit(f"Error during recovery: {str(e)}")
+
 class MainWindow(QMainWindow):
     """Main GUI window for the Image Recovery Application"""
     
-    def __init__(self, drives, recovery_callback):
+    def __init__(self, drives, recovery_callback, batch_callback=None):
         super().__init__()
         self.drives = drives
         self.recovery_callback = recovery_callback
+        self.batch_callback = batch_callback
         self.report_path = None
         self.recovery_thread = None
+        self.scan_queue = []
         self.init_ui()
         
     def init_ui(self):
@@ -104,6 +125,7 @@ class MainWindow(QMainWindow):
         self.partition_scan_radio = QRadioButton("Disk Partition Scan")
         self.full_disk_scan_radio = QRadioButton("Full Disk Scan")
         self.existing_scan_radio = QRadioButton("Existing Images (No Recovery)")
+        self.container_scan_radio = QRadioButton("Container Files (Carve Embedded Images)")
         
         # Style radio buttons
         radio_style = """
@@ -120,11 +142,13 @@ class MainWindow(QMainWindow):
         self.partition_scan_radio.setStyleSheet(radio_style)
         self.full_disk_scan_radio.setStyleSheet(radio_style)
         self.existing_scan_radio.setStyleSheet(radio_style)
+        self.container_scan_radio.setStyleSheet(radio_style)
         
         self.scan_mode_group.addButton(self.usb_scan_radio, 1)
         self.scan_mode_group.addButton(self.partition_scan_radio, 2)
         self.scan_mode_group.addButton(self.full_disk_scan_radio, 3)
         self.scan_mode_group.addButton(self.existing_scan_radio, 4)
+        self.scan_mode_group.addButton(self.container_scan_radio, 5)
         
         self.usb_scan_radio.setChecked(True)
         
@@ -132,6 +156,7 @@ class MainWindow(QMainWindow):
         scan_layout.addWidget(self.partition_scan_radio)
         scan_layout.addWidget(self.full_disk_scan_radio)
         scan_layout.addWidget(self.existing_scan_radio)
+        scan_layout.addWidget(self.container_scan_radio)
 
 
         main_layout.addWidget(scan_group)
@@ -164,6 +189,28 @@ class MainWindow(QMainWindow):
             self.drive_combo.addItem(label, drive['path'])
             
         drive_layout.addWidget(self.drive_combo, 1)
+
+        self.image_button = QPushButton("Add Image...")
+        self.image_button.setStyleSheet("""
+            QPushButton {
+                background-color: #3498db;
+                color: white;
+                font-weight: bold;
+                padding: 5px 10px;
+                border: none;
+                border-radius: 4px;
+            }
+            QPushButton:hover {
+                background-color: #2980b9;
+            }
+        """)
+        self.image_button.clicked.connect(self.browse_image)
+        drive_layout.addWidget(self.image_button)
+
+        self.folder_button = QPushButton("Add Folder...")
+        self.folder_button.setStyleSheet(self.image_button.styleSheet())
+        self.folder_button.clicked.connect(self.browse_folder)
+        drive_layout.addWidget(self.folder_button)
         target_layout.addLayout(drive_layout)
         
         # Output directory selection
@@ -202,6 +249,128 @@ class MainWindow(QMainWindow):
         self.output_button.clicked.connect(self.browse_output)
         output_layout.addWidget(self.output_button)
         target_layout.addLayout(output_layout)
+
+        # Output layout: sharded layouts keep directories small on very large recoveries
+        layout_row = QHBoxLayout()
+        layout_label = QLabel("Output Layout:")
+        layout_label.setStyleSheet("font-weight: normal;")
+        layout_row.addWidget(layout_label)
+
+        self.layout_combo = QComboBox()
+        self.layout_combo.setStyleSheet(self.drive_combo.styleSheet())
+        self.layout_combo.addItem("Flat (single folder)", "flat")
+        self.layout_combo.addItem("Sharded by hash prefix", "hash")
+        self.layout_combo.addItem("Sharded by source offset", "offset")
+        layout_row.addWidget(self.layout_combo, 1)
+        target_layout.addLayout(layout_row)
+
+        # Validation tier: cheap tiers triage large recoveries, decoding tiers catch damaged pixel data
+        validation_row = QHBoxLayout()
+        validation_label = QLabel("Validation:")
+        validation_label.setStyleSheet("font-weight: normal;")
+        validation_row.addWidget(validation_label)
+
+        self.validation_combo = QComboBox()
+        self.validation_combo.setStyleSheet(self.drive_combo.styleSheet())
+        self.validation_combo.addItem("Header and end marker only", "magic")
+        self.validation_combo.addItem("Marker/chunk structure", "structure")
+        self.validation_combo.addItem("Image verify (default)", "verify")
+        self.validation_combo.addItem("Reduced-size decode", "draft")
+        self.validation_combo.addItem("Full decode", "full")
+        self.validation_combo.setCurrentIndex(2)
+        validation_row.addWidget(self.validation_combo, 1)
+        target_layout.addLayout(validation_row)
+
+        # Existing-image extraction: hard links avoid copying when output and source share a volume
+        self.hardlink_check = QCheckBox("Hard-link existing images instead of copying (same volume only)")
+        self.hardlink_check.setStyleSheet("font-weight: normal;")
+        target_layout.addWidget(self.hardlink_check)
+
+        self.sniff_check = QCheckBox("Detect existing images by content, not file extension")
+        self.sniff_check.setStyleSheet("font-weight: normal;")
+        target_layout.addWidget(self.sniff_check)
+
+        # Copy concurrency for existing images: parallel streams help SSDs but thrash spinning disks
+        storage_row = QHBoxLayout()
+        storage_label = QLabel("Output Drive:")
+        storage_label.setStyleSheet("font-weight: normal;")
+        storage_row.addWidget(storage_label)
+
+        self.storage_combo = QComboBox()
+        self.storage_combo.setStyleSheet(self.drive_combo.styleSheet())
+        self.storage_combo.addItem("SSD (parallel copies)", "ssd")
+        self.storage_combo.addItem("Hard disk (few concurrent copies)", "hdd")
+        storage_row.addWidget(self.storage_combo, 1)
+        target_layout.addLayout(storage_row)
+
+        # Existing-image filters, evaluated from headers before anything is copied
+        filter_row = QHBoxLayout()
+        filter_label = QLabel("Only Images:")
+        filter_label.setStyleSheet("font-weight: normal;")
+        filter_row.addWidget(filter_label)
+
+        self.min_width_spin = QSpinBox()
+        self.min_width_spin.setRange(0, 65535)
+        self.min_width_spin.setPrefix("min width ")
+        self.min_width_spin.setSpecialValueText("any width")
+        filter_row.addWidget(self.min_width_spin)
+
+        self.min_height_spin = QSpinBox()
+        self.min_height_spin.setRange(0, 65535)
+        self.min_height_spin.setPrefix("min height ")
+        self.min_height_spin.setSpecialValueText("any height")
+        filter_row.addWidget(self.min_height_spin)
+
+        self.camera_edit = QLineEdit()
+        self.camera_edit.setPlaceholderText("camera model")
+        filter_row.addWidget(self.camera_edit, 1)
+
+        self.date_check = QCheckBox("taken")
+        self.date_check.setStyleSheet("font-weight: normal;")
+        filter_row.addWidget(self.date_check)
+
+        self.date_from_edit = QDateEdit(QDate.currentDate().addYears(-1))
+        self.date_from_edit.setCalendarPopup(True)
+        filter_row.addWidget(self.date_from_edit)
+
+        self.date_to_edit = QDateEdit(QDate.currentDate())
+        self.date_to_edit.setCalendarPopup(True)
+        filter_row.addWidget(self.date_to_edit)
+        target_layout.addLayout(filter_row)
+
+        # Scan queue: queued targets are scanned concurrently, one reader per device
+        queue_layout = QHBoxLayout()
+        queue_label = QLabel("Scan Queue:")
+        queue_label.setStyleSheet("font-weight: normal;")
+        queue_layout.addWidget(queue_label)
+
+        self.queue_list = QListWidget()
+        self.queue_list.setMaximumHeight(80)
+        self.queue_list.setStyleSheet("""
+            QListWidget {
+                font-weight: normal;
+                border: 1px solid #dcdcdc;
+                border-radius: 3px;
+            }
+        """)
+        queue_layout.addWidget(self.queue_list, 1)
+
+        queue_button_layout = QVBoxLayout()
+        self.queue_button = QPushButton("Add to Queue")
+        self.queue_button.setStyleSheet(self.output_button.styleSheet())
+        self.queue_button.clicked.connect(self.add_to_queue)
+        queue_button_layout.addWidget(self.queue_button)
+
+        self.clear_queue_button = QPushButton("Clear Queue")
+        self.clear_queue_button.setStyleSheet(self.output_button.styleSheet())
+        self.clear_queue_button.clicked.connect(self.clear_queue)
+        queue_button_layout.addWidget(self.clear_queue_button)
+        queue_layout.addLayout(queue_button_layout)
+
+        if self.batch_callback is None:
+            self.queue_button.setEnabled(False)
+            self.clear_queue_button.setEnabled(False)
+        target_layout.addLayout(queue_layout)
         
         main_layout.addWidget(target_group)
         
@@ -343,16 +512,77 @@ class MainWindow(QMainWindow):
         if selected_path:
             self.output_edit.setText(selected_path)
             
-    def start_scan(self):
-        """Start the scan process"""
-        # Get the scan type
-        scan_type = "USB Scan"
+    def browse_image(self):
+        """Open file dialog to add a disk image (raw, sparse or compressed) as a scan target"""
+        selected_path, _ = QFileDialog.getOpenFileName(
+            self,
+            "Select Disk Image",
+            "",
+            "Disk Images (*.img *.dd *.raw *.bin *.gz *.xz *.zst);;All Files (*)"
+        )
+        if selected_path:
+            self.drive_combo.addItem(f"{selected_path} - Disk Image", selected_path)
+            self.drive_combo.setCurrentIndex(self.drive_combo.count() - 1)
+            
+    def browse_folder(self):
+        """Open file dialog to add a directory as a scan target"""
+        selected_path = QFileDialog.getExistingDirectory(self, "Select Folder to Scan")
+        if selected_path:
+            self.drive_combo.addItem(f"{selected_path} - Folder", selected_path)
+            self.drive_combo.setCurrentIndex(self.drive_combo.count() - 1)
+            
+    def selected_scan_type(self):
+        """Return the scan type of the checked scan mode"""
         if self.partition_scan_radio.isChecked():
-            scan_type = "Partition Scan"
+            return "Partition Scan"
         elif self.full_disk_scan_radio.isChecked():
-            scan_type = "Full Disk Scan"
+            return "Full Disk Scan"
         elif self.existing_scan_radio.isChecked():
-            scan_type = "Existing Images"
+            return "Existing Images"
+        elif self.container_scan_radio.isChecked():
+            return "Container Scan"
+        return "USB Scan"
+
+    def metadata_filter(self):
+        """Build the existing-image filter from the filter controls"""
+        taken_after = taken_before = None
+        if self.date_check.isChecked():
+            taken_after = datetime.datetime.combine(self.date_from_edit.date().toPyDate(), datetime.time.min)
+            taken_before = datetime.datetime.combine(self.date_to_edit.date().toPyDate(), datetime.time.max)
+
+        return MetadataFilter(
+            min_width=self.min_width_spin.value() or None,
+            min_height=self.min_height_spin.value() or None,
+            taken_after=taken_after,
+            taken_before=taken_before,
+            camera_model=self.camera_edit.text().strip() or None
+        )
+
+    def add_to_queue(self):
+        """Queue the selected scan mode and target for a concurrent batch scan"""
+        selected_index = self.drive_combo.currentIndex()
+        if selected_index < 0:
+            QMessageBox.warning(self, "Invalid Selection", "Please select a target drive.")
+            return
+
+        scan_type = self.selected_scan_type()
+        target_path = self.drive_combo.itemData(selected_index)
+        # Partitions of one physical disk share a device ID so they are read by a single reader
+        device_id = next((drive.get('device_id') for drive in self.drives if drive['path'] == target_path), None)
+
+        self.scan_queue.append((scan_type, target_path, device_id))
+        self.queue_list.addItem(f"{scan_type}: {self.drive_combo.currentText()}")
+        self.update_status(f"Queued {scan_type} on {target_path} ({len(self.scan_queue)} in queue)")
+
+    def clear_queue(self):
+        """Remove all queued scans"""
+        self.scan_queue = []
+        self.queue_list.clear()
+
+    def start_scan(self):
+        """Start the scan process"""
+        # Get the scan type
+        scan_type = self.selected_scan_type()
             
         # Get the target path
         selected_index = self.drive_combo.currentIndex()
@@ -374,13 +604,33 @@ class MainWindow(QMainWindow):
         self.progress_bar.setRange(0, 100)
         self.progress_bar.setValue(0)
         
-        # Create and start recovery thread
-        self.recovery_thread = RecoveryThread(
-            scan_type, 
-            target_path, 
-            output_dir,
-            self.recovery_callback
-        )
+        options = {
+            'layout_scheme': self.layout_combo.currentData(),
+            'validation_level': self.validation_combo.currentData(),
+            'extract_options': {
+                'hardlink': self.hardlink_check.isChecked(),
+                'sniff': self.sniff_check.isChecked(),
+                'storage': self.storage_combo.currentData(),
+                'metadata_filter': self.metadata_filter()
+            }
+        }
+
+        # Create and start recovery thread; a non-empty queue runs as one concurrent batch
+        if self.scan_queue and self.batch_callback is not None:
+            self.recovery_thread = BatchRecoveryThread(
+                list(self.scan_queue),
+                output_dir,
+                self.batch_callback,
+                options
+            )
+        else:
+            self.recovery_thread = RecoveryThread(
+                scan_type, 
+                target_path, 
+                output_dir,
+                self.recovery_callback,
+                options
+            )
         
         # Connect signals
         self.recovery_thread.update_progress.connect(self.set_progress_value)
@@ -399,9 +649,9 @@ class MainWindow(QMainWindow):
             self.stop_button.setEnabled(False)
             self.progress_bar.setValue(0)
             
-    def on_recovery_complete(self, recovered_files, output_dir, report_path):
+    def on_recovery_complete(self, file_count, output_dir, report_path):
         """Handle completion of recovery process"""
-        self.update_status(f"Recovery complete! Found {len(recovered_files)} files.")
+        self.update_status(f"Recovery complete! Found {file_count} files.")
         self.update_status(f"Files saved to: {output_dir}")
         self.update_status(f"Report generated at: {report_path}")
         
@@ -417,7 +667,7 @@ class MainWindow(QMainWindow):
             self,
             "Recovery Complete",
             f"Recovery process completed successfully!\n\n"
-            f"Recovered {len(recovered_files)} files to:\n{output_dir}\n\n"
+            f"Recovered {file_count} files to:\n{output_dir}\n\n"
             f"Report saved to:\n{report_path}"
         )
         
@@ -0,0 +1,393 @@
+# headers.py
+import io
+import time
+import datetime
+from .signatures import PNG_SIGNATURE
+
+# PNG color type -> samples per pixel
+_PNG_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+
+# JPEG SOFn markers (C4 DHT, C8 JPG and CC DAC share the range but are not frames)
+_JPEG_FRAME_MARKERS = {m for m in range(0xC0, 0xD0) if m not in (0xC4, 0xC8, 0xCC)}
+
+# IFD0 and the Exif IFD sit at the start of APP1, ahead of the embedded thumbnail
+_EXIF_READ_SIZE = 8192
+
+_TAG_MODEL = 0x0110
+_TAG_DATETIME = 0x0132
+_TAG_EXIF_IFD = 0x8769
+_TAG_DATETIME_ORIGINAL = 0x9003
+_TAG_PIXEL_X = 0xA002
+_TAG_PIXEL_Y = 0xA003
+
+# MCUs decoded between checks of the time budget
+_DEADLINE_CHECK_INTERVAL = 256
+
+
+class DecodeDeadlineExceeded(Exception):
+    """Raised by a JpegScan decode that runs past its time budget"""
+
+
+def image_dimensions(data, file_type):
+    """
+    Read image dimensions from the file header without decoding
+
+    Args:
+        data: Start of the file (the JPEG frame header may follow large APPn
+            segments, so pass at least the first 64 KB)
+        file_type: Type of the image (jpg, png)
+
+    Returns:
+        Tuple of (width, height, channels), or None if the header could not be parsed
+    """
+    metadata = read_metadata(io.BytesIO(data), file_type)
+    if metadata is None or metadata['channels'] is None:
+        return None
+    return metadata['width'], metadata['height'], metadata['channels']
+
+
+def read_metadata(f, file_type):
+    """
+    Read dimensions and capture metadata from an image header without decoding
+
+    For JPEGs only the marker segment headers, the frame header and the first
+    few KB of the Exif APP1 segment are read, seeking over everything else.
+    For PNGs only the IHDR chunk is read.
+
+    Args:
+        f: Binary file object positioned anywhere (seekable)
+        file_type: Type of the image (jpg, png)
+
+    Returns:
+        Dictionary with 'width', 'height', 'channels' (None if the frame
+        header was not reached), 'date_taken' (datetime or None) and
+        'camera_model' (str or None), or None if the header could not be parsed
+    """
+    f.seek(0)
+    if file_type == 'png':
+        return _png_metadata(f.read(26))
+    if file_type == 'jpg':
+        return _jpeg_metadata(f)
+    return None
+
+
+def _ceil_div(a, b):
+    return -(-a // b)
+
+
+class _HuffmanTable:
+    """Canonical JPEG Huffman table with a 16-bit lookahead decode table"""
+
+    def __init__(self, counts, symbols):
+        self.lookup = [None] * 65536
+        code = 0
+        k = 0
+        for length in range(1, 17):
+            for _ in range(counts[length - 1]):
+                if code >= (1 << length):
+                    raise ValueError("Invalid Huffman table")
+                span = 1 << (16 - length)
+                start = code << (16 - length)
+                self.lookup[start:start + span] = [(length, symbols[k])] * span
+                code += 1
+                k += 1
+            code <<= 1
+
+    def is_prefix(self, bits):
+        """True if a bit string shorter than 16 bits is the start of some code"""
+        free = 16 - len(bits)
+        base = int(bits or '0', 2) << free
+        return any(entry is not None for entry in self.lookup[base:base + (1 << free)])
+
+
+class JpegScan:
+    """Decoding parameters for the first scan of a sequential Huffman-coded JPEG"""
+
+    def __init__(self, frame, sos, tables, restart_interval, scan_start):
+        height, width, components = frame
+        selectors = [(sos[1 + 2 * i], sos[2 + 2 * i]) for i in range(sos[0])]
+        hmax = max(h for h, v in components.values())
+        vmax = max(v for h, v in components.values())
+
+        self.restart_interval = restart_interval
+        self.scan_start = scan_start
+        self.blocks = []
+        # True if the scan codes every component, so its MCUs tile the whole picture
+        self.covers_frame = len(selectors) == len(components)
+
+        if len(selectors) == 1:
+            # Non-interleaved scan: one block per MCU
+            component_id, table_ids = selectors[0]
+            h, v = components[component_id]
+            cols = _ceil_div(_ceil_div(width * h, hmax), 8)
+            rows = _ceil_div(_ceil_div(height * v, vmax), 8)
+            self.mcu_count = cols * rows
+            self.mcu_cols = cols
+            self.mcu_blocks = (1, 1)
+            self.blocks.append((tables[(0, table_ids >> 4)], tables[(1, table_ids & 0x0F)]))
+        else:
+            self.mcu_count = _ceil_div(width, 8 * hmax) * _ceil_div(height, 8 * vmax)
+            self.mcu_cols = _ceil_div(width, 8 * hmax)
+            # Blocks of the full-resolution grid each MCU covers, across and down
+            self.mcu_blocks = (hmax, vmax)
+            for component_id, table_ids in selectors:
+                h, v = components[component_id]
+                dc_ac = (tables[(0, table_ids >> 4)], tables[(1, table_ids & 0x0F)])
+                self.blocks.extend([dc_ac] * (h * v))
+
+    @classmethod
+    def parse(cls, data):
+        """
+        Parse JPEG headers up to the first start-of-scan segment
+
+        Returns:
+            JpegScan instance, or None if the headers are truncated, invalid
+            or use a coding mode that cannot be validated (progressive,
+            lossless, arithmetic)
+        """
+        if not data.startswith(b'\xff\xd8'):
+            return None
+
+        try:
+            pos = 2
+            tables = {}
+            restart_interval = 0
+            frame = None
+
+            while pos + 4 <= len(data):
+                if data[pos] != 0xFF:
+                    return None
+                marker = data[pos + 1]
+                if marker == 0xFF:
+                    pos += 1
+                    continue
+                if 0xD0 <= marker <= 0xD7 or marker == 0x01:
+                    pos += 2
+                    continue
+
+                length = int.from_bytes(data[pos + 2:pos + 4], 'big')
+                segment = data[pos + 4:pos + 2 + length]
+                if length < 2 or len(segment) < length - 2:
+                    return None
+
+                if marker == 0xC4:
+                    i = 0
+                    while i + 17 <= len(segment):
+                        counts = segment[i + 1:i + 17]
+                        symbols = segment[i + 17:i + 17 + sum(counts)]
+                        if len(symbols) < sum(counts):
+                            return None
+                        tables[(segment[i] >> 4, segment[i] & 0x0F)] = _HuffmanTable(counts, symbols)
+                        i += 17 + len(symbols)
+                elif marker == 0xDD:
+                    restart_interval = int.from_bytes(segment[:2], 'big')
+                elif marker in (0xC0, 0xC1):
+                    height = int.from_bytes(segment[1:3], 'big')
+                    width = int.from_bytes(segment[3:5], 'big')
+                    components = {}
+                    for i in range(segment[5]):
+                        sampling = segment[7 + 3 * i]
+                        components[segment[6 + 3 * i]] = (sampling >> 4, sampling & 0x0F)
+                    if not height or not width or not components:
+                        return None
+                    frame = (height, width, components)
+                elif 0xC2 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+                    return None
+                elif marker == 0xDA:
+                    if frame is None:
+                        return None
+                    return cls(frame, segment, tables, restart_interval, pos + 2 + length)
+                elif marker == 0xD9:
+                    return None
+
+                pos += 2 + length
+
+        except (ValueError, IndexError, KeyError, ZeroDivisionError):
+            return None
+
+        return None
+
+    def decode(self, bits, count, boundaries=None, deadline=None):
+        """
+        Huffman-decode up to count MCUs from a bit string
+
+        Args:
+            bits: Unstuffed entropy-coded data as a '0'/'1' string
+            count: Number of MCUs expected in the data
+            boundaries: Optional list that receives the bit position after each MCU
+            deadline: time.monotonic() value after which DecodeDeadlineExceeded is raised
+
+        Returns:
+            Tuple of (MCUs decoded, bit position, error flag). The error flag
+            is set when an invalid code is found or too much data is left
+            over; running out of bits, including in the middle of a code, is
+            not an error.
+        """
+        end = len(bits)
+        bits += '1' * 16  # Lookahead past the end; only codes read whole from real bits count
+        pos = 0
+        blocks = self.blocks
+
+        def truncated(table, entry):
+            # The lookahead ran into the padding: a cut code is not a bad code
+            if end - pos >= 16:
+                return False
+            if entry is not None:
+                return entry[0] > end - pos
+            return table.is_prefix(bits[pos:end])
+
+        for decoded in range(count):
+            if deadline is not None and decoded % _DEADLINE_CHECK_INTERVAL == 0 and time.monotonic() > deadline:
+                raise DecodeDeadlineExceeded()
+            for dc, ac in blocks:
+                entry = dc.lookup[int(bits[pos:pos + 16], 2)]
+                if entry is None or entry[1] > 11:
+                    if truncated(dc, entry):
+                        return decoded, end, False
+                    return decoded, pos, True
+                pos += entry[0] + entry[1]
+                if pos > end:
+                    return decoded, end, False
+
+                k = 1
+                while k < 64:
+                    entry = ac.lookup[int(bits[pos:pos + 16], 2)]
+                    if entry is None:
+                        if truncated(ac, entry):
+                            return decoded, end, False
+                        return decoded, pos, True
+                    run, size = entry[1] >> 4, entry[1] & 0x0F
+                    if size > 10:
+                        if truncated(ac, entry):
+                            return decoded, end, False
+                        return decoded, pos, True
+                    pos += entry[0] + size
+                    if pos > end:
+                        return decoded, end, False
+                    if size:
+                        k += run + 1
+                    elif run == 15:
+                        k += 16
+                    else:
+                        break
+                if k > 64:
+                    return decoded, pos, True
+
+            if boundaries is not None:
+                boundaries.append(pos)
+
+        return count, pos, end - pos >= 8
+
+
+def _png_metadata(data):
+    # IHDR must be the first chunk: length, type, width, height, depth, color type
+    if len(data) < 26 or not data.startswith(PNG_SIGNATURE) or data[12:16] != b'IHDR':
+        return None
+    channels = _PNG_CHANNELS.get(data[25])
+    if channels is None:
+        return None
+    return {
+        'width': int.from_bytes(data[16:20], 'big'),
+        'height': int.from_bytes(data[20:24], 'big'),
+        'channels': channels,
+        'date_taken': None,
+        'camera_model': None
+    }
+
+
+def _jpeg_metadata(f):
+    if f.read(2) != b'\xff\xd8':
+        return None
+
+    metadata = {'width': None, 'height': None, 'channels': None, 'date_taken': None, 'camera_model': None}
+    exif_seen = False
+
+    while True:
+        header = f.read(4)
+        if len(header) < 4 or header[0] != 0xFF:
+            break
+        marker = header[1]
+        if marker == 0xFF:
+            f.seek(-3, io.SEEK_CUR)  # Fill byte before the real marker
+            continue
+        if marker in (0xD9, 0xDA):
+            break  # No frame header before the image data
+        length = int.from_bytes(header[2:4], 'big')
+        if length < 2:
+            break
+
+        if marker in _JPEG_FRAME_MARKERS:
+            # SOFn: precision, height, width, component count
+            frame = f.read(6)
+            if len(frame) == 6:
+                metadata['height'] = int.from_bytes(frame[1:3], 'big')
+                metadata['width'] = int.from_bytes(frame[3:5], 'big')
+                metadata['channels'] = frame[5]
+            return metadata
+
+        if marker == 0xE1 and not exif_seen:
+            segment = f.read(min(length - 2, _EXIF_READ_SIZE))
+            if segment.startswith(b'Exif\x00\x00'):
+                exif_seen = True
+                _parse_exif(segment[6:], metadata)
+            f.seek(length - 2 - len(segment), io.SEEK_CUR)
+        else:
+            f.seek(length - 2, io.SEEK_CUR)
+
+    # Truncated before the frame header: Exif may still carry the pixel size
+    return metadata if exif_seen else None
+
+
+def _parse_exif(tiff, metadata):
+    """Fill camera model, capture date and (as a fallback) pixel size from a TIFF structure"""
+    if tiff[:2] == b'II':
+        order = 'little'
+    elif tiff[:2] == b'MM':
+        order = 'big'
+    else:
+        return
+
+    def read_ifd(offset):
+        # Map each tag to (type, count, offset of its 4-byte value field)
+        entries = {}
+        count = int.from_bytes(tiff[offset:offset + 2], order)
+        for i in range(count):
+            entry = offset + 2 + 12 * i
+            if entry + 12 > len(tiff):
+                break
+            tag = int.from_bytes(tiff[entry:entry + 2], order)
+            entries[tag] = (int.from_bytes(tiff[entry + 2:entry + 4], order),
+                            int.from_bytes(tiff[entry + 4:entry + 8], order), entry + 8)
+        return entries
+
+    def ascii_value(entry):
+        if entry is None or entry[0] != 2:
+            return None
+        _, count, field = entry
+        start = field if count <= 4 else int.from_bytes(tiff[field:field + 4], order)
+        value = tiff[start:start + count].split(b'\x00', 1)[0].decode('ascii', 'replace').strip()
+        return value or None
+
+    def int_value(entry):
+        if entry is None:
+            return None
+        size = 2 if entry[0] == 3 else 4  # SHORT or LONG, stored inline
+        return int.from_bytes(tiff[entry[2]:entry[2] + size], order)
+
+    ifd0 = read_ifd(int.from_bytes(tiff[4:8], order))
+    metadata['camera_model'] = ascii_value(ifd0.get(_TAG_MODEL))
+    date_text = ascii_value(ifd0.get(_TAG_DATETIME))
+
+    exif_pointer = int_value(ifd0.get(_TAG_EXIF_IFD))
+    if exif_pointer:
+        exif_ifd = read_ifd(exif_pointer)
+        date_text = ascii_value(exif_ifd.get(_TAG_DATETIME_ORIGINAL)) or date_text
+        width, height = int_value(exif_ifd.get(_TAG_PIXEL_X)), int_value(exif_ifd.get(_TAG_PIXEL_Y))
+        if width and height:
+            metadata['width'], metadata['height'] = width, height
+
+    if date_text:
+        try:
+            metadata['date_taken'] = datetime.datetime.strptime(date_text, '%Y:%m:%d %H:%M:%S')
+        except ValueError:
+            pass
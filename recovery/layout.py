@@ -0,0 +1,158 @@
+# layout.py
+import os
+import json
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger("ImageRecovery.Layout")
+
+MANIFEST_NAME = "manifest.jsonl"
+
+# Entries recorded per manifest write; one append per file costs an open and close each
+MANIFEST_BATCH = 256
+
+class OutputLayout:
+    """Module for placing output files in a flat or sharded directory tree with a manifest"""
+
+    SCHEMES = ('flat', 'hash', 'offset')
+
+    def __init__(self, output_dir, scheme='flat', levels=2, offset_span=1024 ** 3):
+        """
+        Args:
+            output_dir: Root output directory
+            scheme: 'flat' puts every file in output_dir, 'hash' shards by a
+                hash prefix of the logical ID, 'offset' shards by source offset
+                range (files without an offset fall back to hash sharding)
+            levels: Number of two-hex-digit directory levels for hash sharding
+            offset_span: Bytes of source covered by one offset shard
+        """
+        if scheme not in self.SCHEMES:
+            raise ValueError(f"Unknown output layout: {scheme}")
+
+        self.output_dir = output_dir
+        self.scheme = scheme
+        self.levels = levels
+        self.offset_span = offset_span
+        self.manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+        self._created = set()
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # Layouts are handed to worker processes, which only need path_for
+        state = self.__dict__.copy()
+        state['_created'] = set()
+        state['_lock'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def shard_for(self, logical_id, offset=None):
+        """Return the shard directory of a file relative to output_dir ('' when flat)"""
+        if self.scheme == 'offset' and offset is not None:
+            return f"{offset // self.offset_span:06x}"
+        if self.scheme in ('hash', 'offset'):
+            digest = hashlib.md5(logical_id.encode('utf-8')).hexdigest()
+            return os.path.join(*(digest[2 * i:2 * i + 2] for i in range(self.levels)))
+        return ''
+
+    def path_for(self, logical_id, extension, offset=None):
+        """
+        Return the output path for a file, creating its shard directory if needed
+
+        Args:
+            logical_id: Unique ID of the file within this output directory
+            extension: File extension without the dot
+            offset: Source offset of the file, if known
+
+        Returns:
+            Path to write the file to
+        """
+        shard = self.shard_for(logical_id, offset)
+        directory = os.path.join(self.output_dir, shard) if shard else self.output_dir
+        if directory not in self._created:
+            os.makedirs(directory, exist_ok=True)
+            self._created.add(directory)
+        return os.path.join(directory, f"{logical_id}.{extension}")
+
+    def record(self, file_list):
+        """
+        Append manifest entries for files; a later entry for the same ID
+        supersedes earlier ones (e.g. after a file is quarantined)
+
+        Args:
+            file_list: List of file information dictionaries with an 'id' key
+        """
+        lines = [json.dumps(self._entry(file_info)) for file_info in file_list if 'id' in file_info]
+        if not lines:
+            return
+
+        try:
+            with self._lock, open(self.manifest_path, 'a', encoding='utf-8') as f:
+                f.write('\n'.join(lines) + '\n')
+        except OSError as e:
+            logger.error(f"Error writing manifest {self.manifest_path}: {str(e)}")
+
+    def rewrite(self, file_list):
+        """
+        Replace the manifest with one entry per file, dropping superseded
+        entries and IDs left over from earlier runs
+
+        The new manifest is written aside and renamed, so an interrupted
+        rewrite leaves the old one in place.
+
+        Args:
+            file_list: Iterable of file information dictionaries with an 'id' key
+        """
+        temp_path = self.manifest_path + ".tmp"
+        try:
+            with self._lock:
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    for file_info in file_list:
+                        if 'id' in file_info:
+                            f.write(json.dumps(self._entry(file_info)) + '\n')
+                os.replace(temp_path, self.manifest_path)
+        except OSError as e:
+            logger.error(f"Error rewriting manifest {self.manifest_path}: {str(e)}")
+
+    def _entry(self, file_info):
+        """Manifest entry of a file, its path relative to output_dir"""
+        entry = {'id': file_info['id'], 'path': os.path.relpath(file_info['path'], self.output_dir)}
+        for key in ('type', 'size', 'status', 'reason', 'score', 'duplicate_group',
+                    'offset', 'original_path', 'source_mtime', 'hash', 'duplicate_of'):
+            if key in file_info:
+                entry[key] = file_info[key]
+        return entry
+
+    @staticmethod
+    def load_manifest(output_dir):
+        """
+        Load the manifest of an output directory
+
+        Args:
+            output_dir: Root output directory
+
+        Returns:
+            Dictionary mapping logical IDs to manifest entries, with 'path'
+            resolved against output_dir
+        """
+        entries = {}
+        manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+
+        try:
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # Torn final line from an interrupted run
+                    entry['path'] = os.path.join(output_dir, entry['path'])
+                    entries[entry['id']] = entry
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.error(f"Error reading manifest {manifest_path}: {str(e)}")
+
+        return entries
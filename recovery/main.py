@@ -2,97 +2,431 @@
 
 import os
 import sys
+import stat
+import io
+import re
+import gzip
+import lzma
+import errno
 import logging
 import tempfile
+import threading
+import multiprocessing
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from PyQt5.QtWidgets import QApplication
 from PyQt5.QtCore import pyqtSignal, QObject
-from .enumerator import list_drives
+from .enumerator import list_drives, get_size_formatted, block_device_for
 from .gui import MainWindow
 from .permissions import check_admin, run_as_admin
 from .existing import ExistingImageExtractor
+from .containers import ContainerImageCarver
 from .verifier import FileIntegrityVerifier
+from .fragments import BifragmentCarver
+from .duplicates import NearDuplicateFinder
+from .signatures import find_header, FOOTERS, MAX_SIGNATURE_LENGTH
 from .report_generator import ReportGenerator
+from .layout import OutputLayout, MANIFEST_BATCH
+from .cache import VERIFY_CACHE_NAME
+from .catalog import RecoveryCatalog, CATALOG_NAME
+from .timing import StageTimer
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 # === Logging Setup ===
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("ImageRecovery.Main")
 
+# Carved bytes gathered before each write to the output disk, so a write slot is held per chunk, not per carve
+_WRITE_CHUNK = 1024 * 1024
+
+# Magic bytes of compressed disk images that can be carved as a stream
+_COMPRESSED_MAGIC = [
+    (b'\x1f\x8b', 'gzip'),
+    (b'\xfd7zXZ\x00', 'xz'),
+    (b'\x28\xb5\x2f\xfd', 'zstd')
+]
+
+def _compression_format(path):
+    """Return 'gzip', 'xz' or 'zstd' if path is a compressed image file, otherwise None"""
+    try:
+        if not os.path.isfile(path):
+            return None
+        with open(path, 'rb') as f:
+            magic = f.read(6)
+    except OSError:
+        return None
+
+    for prefix, name in _COMPRESSED_MAGIC:
+        if magic.startswith(prefix):
+            return name
+    return None
+
+def _open_decompressor(source, compression):
+    """Wrap an open compressed image in a streaming decompressor"""
+    if compression == 'gzip':
+        return gzip.GzipFile(fileobj=source, mode='rb')
+    if compression == 'xz':
+        return lzma.LZMAFile(source, 'rb')
+    if zstandard is None:
+        raise RuntimeError("The zstandard package is required to scan .zst images")
+    # Buffer so reads always return full sectors
+    reader = zstandard.ZstdDecompressor().stream_reader(source, read_across_frames=True, closefd=False)
+    return io.BufferedReader(reader, buffer_size=1024 * 1024)
+
+def _data_extents(path):
+    """
+    List the byte ranges of a sparse image file that hold data
+
+    Args:
+        path: Path of the scan target
+
+    Returns:
+        List of (start, end) tuples, or None if the target is not a regular
+        file or the platform/file system cannot report holes
+    """
+    if not hasattr(os, 'SEEK_DATA'):
+        return None
+
+    try:
+        if not stat.S_ISREG(os.stat(path).st_mode):
+            return None
+
+        extents = []
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            length = os.fstat(fd).st_size
+            pos = 0
+            while pos < length:
+                try:
+                    start = os.lseek(fd, pos, os.SEEK_DATA)
+                except OSError as e:
+                    if e.errno == errno.ENXIO:
+                        break  # Only a hole remains
+                    raise
+                end = os.lseek(fd, start, os.SEEK_HOLE)
+                extents.append((start, end))
+                pos = end
+        finally:
+            os.close(fd)
+
+        return extents
+
+    except OSError as e:
+        logger.warning(f"Could not map sparse extents of {path}: {str(e)}")
+        return None
+
+def _raw_access_path(target_path):
+    """Normalize a scan target to a raw access path; image files are read directly"""
+    if target_path.startswith("\\\\.\\") or os.path.isfile(target_path):
+        return target_path
+    if sys.platform != 'win32':
+        # Mount points are read through their block device
+        return block_device_for(target_path) or target_path
+    drive_letter = target_path.strip("\\")[:2]
+    return f"\\\\.\\{drive_letter}"
+
+def _device_key(target_path):
+    """Identify the physical device behind a scan target that has no device ID"""
+    try:
+        if os.path.exists(target_path) and not target_path.startswith("\\\\.\\"):
+            return ('st_dev', os.stat(target_path).st_dev)
+    except OSError:
+        pass
+    return target_path
+
+def _job_label(target_path):
+    """File-system safe label for a scan target, used for its output subdirectory"""
+    return re.sub(r'[^\w.-]+', '_', target_path).strip('_') or 'target'
+
 class RecoveryWorker(QObject):
     """Worker class for handling recovery operations with progress signals"""
     progress_updated = pyqtSignal(int)
     status_updated = pyqtSignal(str)
-    recovery_complete = pyqtSignal(list, str, str)
+    recovery_complete = pyqtSignal(int, str, str)
     error_occurred = pyqtSignal(str)
 
-    def __init__(self):
+    def __init__(self, max_concurrent_writes=2, verify_workers=None):
         super().__init__()
         self._is_running = True
+        self.max_concurrent_writes = max_concurrent_writes
+        self.verify_workers = verify_workers or os.cpu_count() or 1
+        # Set during batch scans to cap concurrent writes to the output disk
+        self.write_slots = None
 
-    def run_recovery(self, scan_type, target_path, output_dir):
+    def run_recovery(self, scan_type, target_path, output_dir, layout_scheme='flat', validation_level='verify',
+                     extract_options=None):
         """Main recovery method to be run in a separate thread"""
         try:
             self.status_updated.emit(f"Initializing {scan_type} on {target_path}...")
-            
-            # Normalize raw access path
-            if target_path.startswith("\\\\.\\"):
-                raw_path = target_path
-            else:
-                drive_letter = target_path.strip("\\")[:2]
-                raw_path = f"\\\\.\\{drive_letter}"
-
-            all_files = []
+            raw_path = _raw_access_path(target_path)
+            layout = OutputLayout(output_dir, layout_scheme)
+            timer = StageTimer()
             
             # Initial setup
             self.progress_updated.emit(0)
 
-            if scan_type == "Existing Images":
-                self.status_updated.emit("Scanning for existing images...")
-                extractor = ExistingImageExtractor()
-                all_files = extractor.extract_images(target_path, output_dir) or []
-            else:
-                self.status_updated.emit("Performing raw recovery...")
-                all_files = self.raw_recovery(raw_path, output_dir)
-                
-                self.status_updated.emit("Verifying recovered files...")
-                verifier = FileIntegrityVerifier()
-                corrupted_dir = os.path.join(output_dir, "corrupted")
-                all_files = verifier.verify_files(all_files, corrupted_dir) or []
-
-            self.status_updated.emit("Generating recovery report...")
-            report_path = os.path.join(output_dir, "recovery_report.html")
-            report_gen = ReportGenerator()
-            report_gen.generate_report(all_files, report_path, scan_type, target_path)
+            # One set of worker processes serves every CPU-bound stage of the run
+            with ProcessPoolExecutor(max_workers=self.verify_workers) as pool:
+                all_files = self._scan_target(scan_type, target_path, raw_path, output_dir, layout,
+                                              extract_options=extract_options, timer=timer, pool=pool)
+                file_count = self._verify_target(scan_type, raw_path, all_files, output_dir, layout,
+                                                 validation_level=validation_level, timer=timer, pool=pool)
+                del all_files
+
+                # The report streams from the catalog rather than an in-memory list
+                self.status_updated.emit("Generating recovery report...")
+                report_path = os.path.join(output_dir, "recovery_report.html")
+                report_gen = ReportGenerator(pool=pool)
+                with RecoveryCatalog(os.path.join(output_dir, CATALOG_NAME)) as catalog:
+                    report_gen.generate_report(catalog.iter_files(), report_path, scan_type, target_path, timer=timer)
             
             # Complete
             self.progress_updated.emit(100)
 
             if self._is_running:
-                self.recovery_complete.emit(all_files, output_dir, report_path)
+                self.recovery_complete.emit(file_count, output_dir, report_path)
 
         except Exception as e:
             self.error_occurred.emit(f"Error during recovery: {str(e)}")
 
-    def raw_recovery(self, drive_path, output_dir):
-        """Raw recovery implementation with improved progress updates"""
+    def run_batch(self, jobs, output_dir, layout_scheme='flat', validation_level='verify', extract_options=None):
+        """
+        Run a queue of scans concurrently, to be run in a separate thread
+
+        Each physical device gets one reader thread that runs its scans in
+        order, so partitions of one disk never compete for the same head.
+        Verification is handed to a thread per finished scan, and all CPU
+        work of every job runs on one process pool for the whole batch.
+        At most max_concurrent_writes writes to the output disk (carves and
+        copies of every job type) run at once; device reads are never held
+        back by the cap.
+
+        Args:
+            jobs: List of (scan_type, target_path, device_id) tuples; device_id
+                may be None, in which case the device is derived from the path
+            output_dir: Base output directory; each scan writes to its own subdirectory
+            layout_scheme: Output layout used inside each subdirectory
+            validation_level: Verifier tier applied to every job
+            extract_options: ExistingImageExtractor keyword arguments for Existing Images jobs
+        """
+        manager = None
+        try:
+            self.status_updated.emit(f"Starting {len(jobs)} queued scans...")
+            self.progress_updated.emit(0)
+            # A manager semaphore also reaches the pool workers that write container carves
+            manager = multiprocessing.Manager()
+            self.write_slots = manager.BoundedSemaphore(self.max_concurrent_writes)
+            timer = StageTimer()
+
+            devices = {}
+            for n, (scan_type, target_path, device_id) in enumerate(jobs):
+                devices.setdefault(device_id or _device_key(target_path), []).append((n, scan_type, target_path))
+            self.status_updated.emit(f"Scanning {len(devices)} devices concurrently")
+
+            job_progress = [0] * len(jobs)
+            progress_lock = threading.Lock()
+            reported = [0]
+            job_dirs = [None] * len(jobs)
+
+            def update_progress(n, value):
+                # Overall progress is the mean of all scans, never moving backward
+                with progress_lock:
+                    job_progress[n] = value
+                    overall = min(95, sum(job_progress) // len(jobs))
+                    if overall > reported[0]:
+                        reported[0] = overall
+                        self.progress_updated.emit(overall)
+
+            with ProcessPoolExecutor(max_workers=self.verify_workers) as pool, \
+                    ThreadPoolExecutor(max_workers=self.verify_workers) as cpu_pool, \
+                    ThreadPoolExecutor(max_workers=len(devices)) as readers:
+
+                def read_device(device_jobs):
+                    verifications = []
+                    for n, scan_type, target_path in device_jobs:
+                        if not self._is_running:
+                            break
+                        label = _job_label(target_path)
+                        job_dir = os.path.join(output_dir, f"{n + 1}_{label}")
+                        raw_path = _raw_access_path(target_path)
+                        layout = OutputLayout(job_dir, layout_scheme)
+                        status = lambda message, label=label: self.status_updated.emit(f"[{label}] {message}")
+
+                        files = self._scan_target(scan_type, target_path, raw_path, job_dir, layout,
+                                                  progress=lambda value, n=n: update_progress(n, value),
+                                                  status=status, extract_options=extract_options, timer=timer,
+                                                  pool=pool)
+                        # Hand validation to another thread so this reader moves on to its next scan
+                        verifications.append((n, job_dir, cpu_pool.submit(self._verify_target, scan_type,
+                                                                          raw_path, files, job_dir, layout,
+                                                                          status, validation_level, timer, pool)))
+                    for n, job_dir, future in verifications:
+                        future.result()
+                        job_dirs[n] = job_dir
+
+                for future in [readers.submit(read_device, device_jobs) for device_jobs in devices.values()]:
+                    future.result()
+
+                # Combined catalog of every job, built from the job catalogs
+                with RecoveryCatalog(os.path.join(output_dir, CATALOG_NAME)) as catalog:
+                    catalog.add(self._catalog_entries(job_dir for job_dir in job_dirs if job_dir), replace=True)
+                    file_count = sum(catalog.status_counts().values())
+
+                    # Regroup across devices; hashes from the per-job passes are reused
+                    self.status_updated.emit("Grouping near-duplicate images across all scans...")
+                    with timer.stage("group") as stage:
+                        NearDuplicateFinder(pool=pool).group_catalog(catalog)
+                        stage['items'] = catalog.status_counts().get('OK', 0)
+
+                    self.status_updated.emit("Generating recovery report...")
+                    report_path = os.path.join(output_dir, "recovery_report.html")
+                    report_gen = ReportGenerator(pool=pool)
+                    report_gen.generate_report(catalog.iter_files(), report_path, "Batch Scan",
+                                               ", ".join(target_path for _, target_path, _ in jobs), timer=timer)
+
+            self.progress_updated.emit(100)
+
+            if self._is_running:
+                self.recovery_complete.emit(file_count, output_dir, report_path)
+
+        except Exception as e:
+            self.error_occurred.emit(f"Error during batch recovery: {str(e)}")
+
+        finally:
+            self.write_slots = None
+            if manager is not None:
+                manager.shutdown()
+
+    def _scan_target(self, scan_type, target_path, raw_path, output_dir, layout, progress=None, status=None,
+                     extract_options=None, timer=None, pool=None):
+        """Run the I/O-bound scan stage for one target and return the found files"""
+        emit_status = status or self.status_updated.emit
+
+        with (timer or StageTimer()).stage("scan", target_path) as stage:
+            if scan_type == "Existing Images":
+                emit_status("Scanning for existing images...")
+                extractor = ExistingImageExtractor(**(extract_options or {}), write_slots=self.write_slots)
+                files = extractor.extract_images(target_path, output_dir, layout,
+                                                 progress=progress or self.progress_updated.emit,
+                                                 status=emit_status) or []
+                if extractor.stats:
+                    emit_status(f"Extracted {extractor.stats['files']} images with {extractor.stats['workers']} "
+                                f"copy workers: {extractor.stats['files_per_second']:.1f} files/s, "
+                                f"{extractor.stats['mb_per_second']:.1f} MB/s")
+                if extractor.deduplicated_bytes:
+                    emit_status(f"Stored duplicate images once, saving {get_size_formatted(extractor.deduplicated_bytes)}")
+                stage.update(items=len(files), bytes_read=extractor.stats.get('bytes', 0),
+                             bytes_written=extractor.stats.get('bytes', 0))
+                return files
+
+            if scan_type == "Container Scan":
+                emit_status("Carving embedded images from files...")
+                carver = ContainerImageCarver(pool=pool, write_slots=self.write_slots)
+                files = carver.carve_directory(target_path, output_dir, layout)
+                emit_status(f"Carved {len(files)} images from {carver.file_count} files")
+                stage.update(items=len(files), bytes_read=carver.bytes_scanned,
+                             bytes_written=sum(f.get('size', 0) for f in files))
+                return files
+
+            emit_status("Performing raw recovery...")
+            files = self.raw_recovery(raw_path, output_dir, progress=progress, status=status, layout=layout,
+                                      stage=stage)
+            stage.update(items=len(files), bytes_written=sum(f.get('size', 0) for f in files))
+            return files
+
+    def _verify_target(self, scan_type, raw_path, all_files, output_dir, layout, status=None,
+                       validation_level='verify', timer=None, pool=None):
+        """
+        Run the CPU-bound verification stage for one target's files, on the run's process pool if given
+
+        The results go to the output directory's catalog, which later stages
+        read instead of keeping the file list in memory.
+
+        Returns:
+            Number of catalogued files
+        """
+        emit_status = status or self.status_updated.emit
+
+        with (timer or StageTimer()).stage("verify", output_dir) as stage:
+            if scan_type == "Existing Images":
+                self._write_catalog(output_dir, all_files)
+                # Earlier extractions stay listed: unchanged sources and stored copies are found through them
+                layout.rewrite(OutputLayout.load_manifest(output_dir).values())
+                stage['items'] = len(all_files)
+                return len(all_files)
+
+            emit_status("Verifying recovered files...")
+            verifier = FileIntegrityVerifier(workers=self.verify_workers, level=validation_level,
+                                             cache_path=os.path.join(output_dir, VERIFY_CACHE_NAME), pool=pool)
+            corrupted_dir = os.path.join(output_dir, "corrupted")
+            all_files = verifier.verify_files(all_files, corrupted_dir) or []
+            stage.update(items=verifier.stats.get('files', 0), bytes_read=verifier.stats.get('bytes', 0))
+            if verifier.stats:
+                emit_status(f"Verified {verifier.stats['files']} files ({verifier.stats['cached']} cached) with "
+                            f"{verifier.stats['workers']} workers: {verifier.stats['files_per_second']:.1f} files/s, "
+                            f"{verifier.stats['mb_per_second']:.1f} MB/s")
+
+            # Retry failed JPEG carves as two-fragment files (needs random access to the source)
+            if scan_type != "Container Scan" and _compression_format(raw_path) is None:
+                emit_status("Searching for fragmented JPEG files...")
+                carver = BifragmentCarver(pool=pool)
+                reassembled = carver.recover(raw_path, all_files, output_dir, layout)
+                if reassembled:
+                    emit_status(f"Reassembled {len(reassembled)} fragmented files")
+                    all_files.extend(verifier.verify_files(reassembled, corrupted_dir) or [])
+                    stage['items'] += verifier.stats.get('files', 0)
+                    stage['bytes_read'] += verifier.stats.get('bytes', 0)
+                    stage['bytes_written'] += sum(f.get('size', 0) for f in reassembled)
+
+            file_count = len(all_files)
+            self._write_catalog(output_dir, all_files)
+            del all_files
+
+            with RecoveryCatalog(os.path.join(output_dir, CATALOG_NAME)) as catalog:
+                emit_status("Grouping near-duplicate images...")
+                groups = NearDuplicateFinder(pool=pool).group_catalog(catalog)
+                if groups:
+                    emit_status(f"Found {groups} groups of near-duplicate images")
+
+                # Final status and quarantine locations of this run's files, replacing the entries
+                # appended while carving and any left by an earlier run
+                layout.rewrite(catalog.iter_files())
+            return file_count
+
+    def _write_catalog(self, output_dir, all_files):
+        """Replace the output directory's catalog with this run's files"""
+        with RecoveryCatalog(os.path.join(output_dir, CATALOG_NAME)) as catalog:
+            catalog.add(all_files, replace=True)
+
+    def _catalog_entries(self, job_dirs):
+        """File information from the catalogs of a batch's jobs, with IDs made unique across jobs"""
+        for job_dir in job_dirs:
+            job = os.path.basename(job_dir)
+            with RecoveryCatalog(os.path.join(job_dir, CATALOG_NAME)) as catalog:
+                for file_info in catalog.iter_files():
+                    yield dict(file_info, id=f"{job}/{file_info['id']}")
+
+    def raw_recovery(self, drive_path, output_dir, progress=None, status=None, layout=None, stage=None):
+        """Raw recovery implementation with improved progress updates; fills stage['bytes_read'] if given"""
+        layout = layout or OutputLayout(output_dir)
+        # Batch scans route progress and status through per-device callbacks
+        emit_progress = progress or self.progress_updated.emit
+        emit_status = status or self.status_updated.emit
         size = 512
         rcvd = 0
         recovered_files = []
+        recorded = 0
         
-        # Define signatures for JPG and PNG
-        jpg_signatures = [
-            b'\xff\xd8\xff\xe0\x00\x10\x4a\x46',  # JPEG SOI + APP0 JFIF
-            b'\xff\xd8\xff\xe1',                   # JPEG SOI + APP1 Exif
-            b'\xff\xd8\xff\xdb',                   # JPEG SOI + DQT
-            b'\xff\xd8\xff\xe0',                   # JPEG SOI + APP0
-            b'\xff\xd8\xff\xee',                   # JPEG SOI + APP14
-            b'\xff\xd8\xff\xc0',                   # JPEG SOI + SOF0
-            b'\xff\xd8\xff\xc4'                    # JPEG SOI + DHT
-        ]
-        png_signature = b'\x89\x50\x4e\x47\x0d\x0a\x1a\x0a'  # PNG signature
+        # Bytes of the previous block kept so signatures straddling two blocks are still found
+        lookback = MAX_SIGNATURE_LENGTH - 1
         
         try:
             os.makedirs(output_dir, exist_ok=True)
-            self.status_updated.emit(f"Scanning drive sectors for image files...")
+            emit_status(f"Scanning drive sectors for image files...")
 
             if not os.path.exists(drive_path):
                 raise FileNotFoundError(f"Drive path not found: {drive_path}")
@@ -108,58 +442,68 @@ class RecoveryWorker(QObject):
 
             processed_sectors = 0
             prev_progress = 0
+
+            # Compressed images are carved from a streaming decompressor
+            compression = _compression_format(drive_path)
+            if compression:
+                emit_status(f"Streaming {compression}-compressed image, no temporary copy needed")
+
+            def scan_fraction():
+                # Progress of a compressed image is measured on the compressed stream
+                if compression:
+                    return source.tell() / max(drive_size, 1)
+                return processed_sectors / total_sectors
+
+            # Sparse images: only read extents that hold data, skip holes unread
+            extents = _data_extents(drive_path) if compression is None else None
+            extent_index = 0
+            if extents is not None:
+                data_bytes = sum(end - start for start, end in extents)
+                emit_status(f"Sparse image: {get_size_formatted(data_bytes)} of data in "
+                                         f"{len(extents)} extents, skipping holes")
             
             # Reserve part of the progress bar for verification and post-processing
             # Only use 90% for scanning, reserve 10% for post-processing
             scan_progress_weight = 0.90
             
-            with open(drive_path, "rb") as fileD:
-                byte = fileD.read(size)
+            with open(drive_path, "rb") as source, \
+                    (_open_decompressor(source, compression) if compression else nullcontext(source)) as fileD:
                 drec = False
                 offs = 0
+                tail = b''
+                if extents:
+                    offs = extents[0][0] // size
+                    processed_sectors = offs
+                    fileD.seek(offs * size)
+                byte = fileD.read(size) if extents != [] else b''
                 
                 while byte and self._is_running:
-                    # Check for signatures
-                    file_type = None
-                    found_pos = -1
-                    
-                    # Check for JPG signatures
-                    for sig in jpg_signatures:
-                        found = byte.find(sig)
-                        if found >= 0:
-                            file_type = "jpg"
-                            found_pos = found
-                            break
-                    
-                    # Check for PNG signature if no JPG found
-                    if found_pos < 0:
-                        found = byte.find(png_signature)
-                        if found >= 0:
-                            file_type = "png"
-                            found_pos = found
+                    # Check for JPG and PNG signatures; the tail only holds partial
+                    # headers, which were not matched in the previous block
+                    window = tail + byte
+                    found_pos, file_type = find_header(window)
                     
                     # If we found a signature
                     if found_pos >= 0:
                         drec = True
-                        logger.info(f'Found {file_type.upper()} at location: {hex(found_pos+(size*offs))}')
+                        file_offset = size * offs + found_pos - len(tail)
+                        logger.info(f'Found {file_type.upper()} at location: {hex(file_offset)}')
                         
-                        file_path = os.path.join(output_dir, f"recovered_{rcvd}.{file_type}")
+                        file_id = f"recovered_{rcvd}"
+                        file_path = layout.path_for(file_id, file_type, file_offset)
                         
                         # Save current position to calculate per-file progress
                         file_start_pos = processed_sectors
                         estimated_file_size = 1000  # Estimate in sectors, will adjust during recovery
                         
                         with open(file_path, "wb") as fileN:
-                            fileN.write(byte[found_pos:])
+                            pending = bytearray(window[found_pos:])
                             
-                            # For JPG, we look for the end marker
-                            if file_type == "jpg":
-                                end_signature = b'\xff\xd9'
-                            # For PNG, we look for IEND chunk
-                            else:  # file_type == "png"
-                                end_signature = b'\x49\x45\x4e\x44\xae\x42\x60\x82'
+                            # JPG ends with the EOI marker, PNG with the IEND chunk
+                            end_signature, footer_length = FOOTERS[file_type]
                             
                             file_sectors = 0
+                            end_tail = window[found_pos:][-(len(end_signature) - 1):]
                             
                             while drec and self._is_running:
                                 byte = fileD.read(size)
@@ -169,7 +513,7 @@ class RecoveryWorker(QObject):
                                 
                                 # Calculate two components of progress:
                                 # 1. Overall drive scanning progress (weighted at 90%)
-                                scan_progress = min(100, int((processed_sectors / total_sectors) * 100))
+                                scan_progress = min(100, int(scan_fraction() * 100))
                                 
                                 # 2. Current file recovery progress (provide micro-updates)
                                 # Dynamically adjust file size estimation based on seen data
@@ -189,58 +533,105 @@ class RecoveryWorker(QObject):
                                 current_progress = min(95, current_progress)
                                 
                                 if current_progress > prev_progress:
-                                    self.progress_updated.emit(current_progress)
-                                    self.status_updated.emit(f"Recovering {file_type.upper()} file ({file_progress}% complete)")
+                                    emit_progress(current_progress)
+                                    emit_status(f"Recovering {file_type.upper()} file ({file_progress}% complete)")
                                     prev_progress = current_progress
                                 
                                 if not byte:
                                     drec = False
                                     break
+
+                                # A carve cannot continue into a hole of a sparse image
+                                if extents and extent_index < len(extents) and offs * size >= extents[extent_index][1]:
+                                    drec = False
+                                    break
                                 
-                                bfind = byte.find(end_signature)
+                                # A footer may start in the tail of the previous block
+                                bfind = (end_tail + byte).find(end_signature, max(0, len(end_tail) - len(end_signature) + 1))
                                 if bfind >= 0:
-                                    # For JPG, end marker is 2 bytes
-                                    if file_type == "jpg":
-                                        fileN.write(byte[:bfind+2])
-                                    # For PNG, IEND chunk is 12 bytes total (including the length field and CRC)
-                                    else:  # file_type == "png"
-                                        fileN.write(byte[:bfind+12])
-                                    
+                                    bfind -= len(end_tail)
+                                    pending += byte[:bfind + footer_length]
                                     drec = False
                                 else:
-                                    fileN.write(byte)
+                                    pending += byte
+                                    end_tail = (end_tail + byte)[-(len(end_signature) - 1):]
+                                if len(pending) >= _WRITE_CHUNK:
+                                    self._write_carve(fileN, pending)
+                                    pending.clear()
+
+                            self._write_carve(fileN, pending)
                         
                         rcvd += 1
-                        self.status_updated.emit(f"Recovered file {rcvd}: {os.path.basename(file_path)}")
+                        emit_status(f"Recovered file {rcvd}: {os.path.basename(file_path)}")
                         
                         recovered_files.append({
+                            'id': file_id,
                             'path': file_path,
                             'size': os.path.getsize(file_path),
                             'type': file_type,
-                            'status': 'Recovered'
+                            'status': 'Recovered',
+                            'offset': file_offset
                         })
+                        if len(recovered_files) - recorded >= MANIFEST_BATCH:
+                            layout.record(recovered_files[recorded:])
+                            recorded = len(recovered_files)
+                        tail = b''
+                    else:
+                        tail = byte[-lookback:]
                     
-                    byte = fileD.read(size)
                     offs += 1
                     processed_sectors += 1
+
+                    # Jump over holes once the current data extent is exhausted
+                    if extents is not None and extent_index < len(extents) and offs * size >= extents[extent_index][1]:
+                        while extent_index < len(extents) and offs * size >= extents[extent_index][1]:
+                            extent_index += 1
+                        if extent_index == len(extents):
+                            break
+                        next_offs = extents[extent_index][0] // size
+                        if next_offs > offs:
+                            processed_sectors += next_offs - offs
+                            offs = next_offs
+                            fileD.seek(offs * size)
+                            tail = b''
+                            current_progress = min(95, int(scan_fraction() * scan_progress_weight * 100))
+                            if current_progress > prev_progress:
+                                emit_progress(current_progress)
+                                prev_progress = current_progress
+
+                    byte = fileD.read(size)
                     
                     # Update overall scanning progress periodically
                     if processed_sectors % 1000 == 0:
-                        current_progress = min(95, int((processed_sectors / total_sectors) * scan_progress_weight * 100))
+                        current_progress = min(95, int(scan_fraction() * scan_progress_weight * 100))
                         if current_progress > prev_progress:
-                            self.progress_updated.emit(current_progress)
+                            emit_progress(current_progress)
                             prev_progress = current_progress
 
+                # Position reached in the source file (compressed images: in the compressed stream)
+                if stage is not None:
+                    stage['bytes_read'] = source.tell()
+
             # Move to 98% after scanning is complete
-            self.progress_updated.emit(98)
-            self.status_updated.emit(f"Scan complete. Found {rcvd} files.")
+            emit_progress(98)
+            emit_status(f"Scan complete. Found {rcvd} files.")
 
         except Exception as e:
             self.error_occurred.emit(f"Error during raw recovery: {str(e)}")
             return []
 
+        finally:
+            # Carves written before a stop or an error are still recorded
+            layout.record(recovered_files[recorded:])
+
         return recovered_files
 
+    def _write_carve(self, f, data):
+        """Write carved bytes; batch scans hold a write slot only while the output disk is written"""
+        with self.write_slots or nullcontext():
+            f.write(data)
+            f.flush()
+
     def stop(self):
         self._is_running = False
         self.status_updated.emit("Recovery process stopping...")
@@ -255,7 +646,7 @@ def main():
     app = QApplication(sys.argv)
 
     worker = RecoveryWorker()
-    window = MainWindow(drives, worker.run_recovery)
+    window = MainWindow(drives, worker.run_recovery, worker.run_batch)
 
     # Connect signals
     worker.progress_updated.connect(window.set_progress_value)
@@ -9,6 +9,8 @@ logger = logging.getLogger("ImageRecovery.Permissions")
 def is_admin():
     """Check if the current process has admin privileges"""
     try:
+        if os.name != 'nt':
+            return os.geteuid() == 0
         return ctypes.windll.shell32.IsUserAnAdmin() != 0
     except Exception as e:
         logger.error(f"Error checking admin status: {str(e)}")
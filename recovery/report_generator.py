@@ -3,108 +3,209 @@ import os
 import time
 import logging
 import datetime
+import html
+import json
 import platform
+import urllib.parse
+from contextlib import nullcontext
+from pathlib import Path
 import psutil
+from .layout import MANIFEST_NAME
+from .thumbnails import ThumbnailGenerator, THUMBNAIL_DIR_NAME
+from .timing import StageTimer
 
 logger = logging.getLogger("ImageRecovery.ReportGenerator")
 
 class ReportGenerator:
     """Module for generating recovery reports"""
     
-    def __init__(self):
-        pass
+    def __init__(self, rows_per_page=1000, thumbnails=True, thumbnail_size=160, thumbnail_workers=None, pool=None):
+        """
+        Args:
+            rows_per_page: Files listed on each page of the report
+            thumbnails: Show a contact sheet of thumbnails on each page
+            thumbnail_size: Longest side of a thumbnail in pixels
+            thumbnail_workers: Processes rendering thumbnails (CPU count by default)
+            pool: ProcessPoolExecutor shared across a run to render thumbnails on
+        """
+        self.rows_per_page = rows_per_page
+        self.thumbnails = thumbnails
+        self.thumbnail_size = thumbnail_size
+        self.thumbnail_workers = thumbnail_workers
+        self.pool = pool
     
-    def generate_report(self, file_list, report_path, scan_type, target_path):
+    def generate_report(self, file_list, report_path, scan_type, target_path, timer=None):
         """
         Generate a report of the recovery operation
+
+        The report is an index page with the summary, linking to pages of at
+        most rows_per_page files each. Files are written out as they are
+        read and all statistics are gathered in the same pass, so generation
+        time and the size of any one page stay flat however many files
+        there are.
+
+        Thumbnails are rendered a page at a time across a process pool and
+        kept in a thumbnails directory next to the report, named by content
+        hash, so regenerating the report only renders new images.
+
+        A JSON copy of the summary and the per-stage performance figures is
+        written next to the index page.
         
         Args:
-            file_list: List of file information dictionaries
-            report_path: Path to save the report
+            file_list: Iterable of file information dictionaries, read once
+            report_path: Path to save the index page to; pages are written to
+                a directory next to it
             scan_type: Type of scan performed
             target_path: Path that was scanned
+            timer: StageTimer holding the earlier stages of the run; the
+                report's own stage is added to it
             
         Returns:
             Path to the generated report
         """
         logger.info(f"Generating report to {report_path}")
+        stats = {'total': 0, 'OK': 0, 'Partial': 0, 'Corrupted': 0, 'Copied': 0, 'Unchanged': 0, 'Duplicate': 0,
+                 'size': 0}
         
         try:
-            # Count statistics
-            total_files = len(file_list)
-            ok_files = len([f for f in file_list if f['status'] == 'OK'])
-            corrupted_files = len([f for f in file_list if 'Corrupted' in f['status']])
-            copied_files = len([f for f in file_list if f['status'] == 'Copied'])
-            
-            # Get total recovered size
-            total_size = sum(f['size'] for f in file_list if 'size' in f)
-            
-            # Generate HTML report
+            # Paths are shown relative to the report so sharded layouts stay readable
+            report_dir = os.path.dirname(os.path.abspath(report_path))
+            report_name = os.path.basename(report_path)
+            pages_name = os.path.splitext(report_name)[0] + "_pages"
+            pages_dir = os.path.join(report_dir, pages_name)
+            os.makedirs(pages_dir, exist_ok=True)
+
+            duplicate_groups = {}
+            partial = []  # (score, display path, reason)
+            pages = []  # [file name, first row, last row]
+            batch = []
+            thumbnails = None
+            if self.thumbnails:
+                thumbnails = ThumbnailGenerator(os.path.join(report_dir, THUMBNAIL_DIR_NAME), self.thumbnail_size,
+                                                self.thumbnail_workers, pool=self.pool)
+
+            timer = timer or StageTimer()
+
+            def write_page(has_next):
+                first = pages[-1][2] + 1 if pages else 1
+                pages.append([f"page_{len(pages) + 1:05d}.html", first, first + len(batch) - 1])
+                self._write_page(pages_dir, pages, batch, thumbnails, report_name, report_dir, has_next)
+                stage['bytes_written'] += os.path.getsize(os.path.join(pages_dir, pages[-1][0]))
+
+            with timer.stage("report", report_path) as stage, thumbnails or nullcontext():
+                for file_info in file_list:
+                    stats['total'] += 1
+                    stats['size'] += file_info.get('size', 0)
+                    status = file_info['status']
+                    if 'Corrupted' in status:
+                        stats['Corrupted'] += 1
+                    elif status in stats:
+                        stats[status] += 1
+                    if status == 'Partial':
+                        partial.append((file_info.get('score', 0.0), self._display_path(file_info['path'], report_dir),
+                                        file_info.get('reason', '')))
+                    if 'duplicate_group' in file_info:
+                        duplicate_groups.setdefault(file_info['duplicate_group'], []).append(
+                            self._display_path(file_info['path'], report_dir))
+
+                    # A full page is written once another file shows that a next page follows
+                    if len(batch) == self.rows_per_page:
+                        write_page(has_next=True)
+                        batch = []
+                    batch.append(file_info)
+
+                if batch:
+                    write_page(has_next=False)
+                stage['items'] = stats['total']
+
+            if thumbnails:
+                logger.info(f"Thumbnails: {thumbnails.rendered_count} rendered, {thumbnails.cached_count} cached")
+            current_pages = {name for name, _, _ in pages}
+            if duplicate_groups:
+                current_pages.add("duplicates.html")
+            if partial:
+                current_pages.add("partial.html")
+            self._remove_stale_pages(pages_dir, current_pages)
+
+            # Near duplicates (re-saves, resizes, thumbnails) listed together on their own page
+            if duplicate_groups:
+                with self._open_page(os.path.join(pages_dir, "duplicates.html"), "Near-Duplicate Groups") as f:
+                    f.write("""
+    <table>
+        <tr>
+            <th>Group</th>
+            <th>Files</th>
+        </tr>
+""")
+                    for group_id, names in sorted(duplicate_groups.items()):
+                        f.write(f"""
+        <tr>
+            <td>{group_id}</td>
+            <td>{"<br>".join(names)}</td>
+        </tr>""")
+                    f.write(f"""
+    </table>
+    <p><a href="../{report_name}">Index</a></p>
+</body>
+</html>
+""")
+
+            # Partially decodable files, best first, so the most complete ones are checked first
+            if partial:
+                with self._open_page(os.path.join(pages_dir, "partial.html"), "Partially Recovered Files") as f:
+                    f.write("""
+    <table>
+        <tr>
+            <th>Score</th>
+            <th>File Name</th>
+            <th>Reason</th>
+        </tr>
+""")
+                    for score, name, reason in sorted(partial, key=lambda p: -p[0]):
+                        f.write(f"""
+        <tr>
+            <td>{self._format_score(score)}</td>
+            <td>{name}</td>
+            <td>{html.escape(reason)}</td>
+        </tr>""")
+                    f.write(f"""
+    </table>
+    <p><a href="../{report_name}">Index</a></p>
+</body>
+</html>
+""")
+
+            manifest_html = ""
+            if os.path.exists(os.path.join(report_dir, MANIFEST_NAME)):
+                manifest_html = f'<p><strong>Manifest:</strong> <a href="{MANIFEST_NAME}">{MANIFEST_NAME}</a></p>'
+            partial_html = '<p><strong>Partially Recovered:</strong> 0</p>'
+            if partial:
+                partial_html = (f'<p><strong>Partially Recovered:</strong> '
+                                f'<a href="{pages_name}/partial.html">{len(partial)}</a></p>')
+            duplicates_html = '<p><strong>Near-Duplicate Groups:</strong> 0</p>'
+            if duplicate_groups:
+                duplicates_html = (f'<p><strong>Near-Duplicate Groups:</strong> '
+                                   f'<a href="{pages_name}/duplicates.html">{len(duplicate_groups)}</a></p>')
+
+            # Generate HTML index
             with open(report_path, 'w', encoding='utf-8') as f:
-                f.write(f"""<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Image Recovery Report</title>
-    <style>
-        body {{
-            font-family: Arial, sans-serif;
-            line-height: 1.6;
-            color: #333;
-            max-width: 1200px;
-            margin: 0 auto;
-            padding: 20px;
-        }}
-        h1, h2, h3 {{
-            color: #2c3e50;
-        }}
-        table {{
-            width: 100%;
-            border-collapse: collapse;
-            margin-bottom: 20px;
-        }}
-        th, td {{
-            border: 1px solid #ddd;
-            padding: 8px;
-            text-align: left;
-        }}
-        th {{
-            background-color: #f2f2f2;
-        }}
-        tr:nth-child(even) {{
-            background-color: #f9f9f9;
-        }}
-        .summary {{
-            background-color: #f8f9fa;
-            padding: 15px;
-            border-radius: 5px;
-            margin-bottom: 20px;
-        }}
-        .status-ok {{
-            color: green;
-        }}
-        .status-corrupted {{
-            color: red;
-        }}
-        .status-copied {{
-            color: blue;
-        }}
-    </style>
-</head>
-<body>
-    <h1>Image Recovery Report</h1>
-    
+                f.write(self._page_header("Image Recovery Report"))
+                f.write(f"""
     <div class="summary">
         <h2>Summary</h2>
         <p><strong>Date/Time:</strong> {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</p>
         <p><strong>Scan Type:</strong> {scan_type}</p>
         <p><strong>Target Path:</strong> {target_path}</p>
-        <p><strong>Total Files:</strong> {total_files}</p>
-        <p><strong>Successfully Recovered:</strong> {ok_files}</p>
-        <p><strong>Corrupted Files:</strong> {corrupted_files}</p>
-        <p><strong>Existing Files Copied:</strong> {copied_files}</p>
-        <p><strong>Total Data Size:</strong> {self._format_size(total_size)}</p>
+        <p><strong>Total Files:</strong> {stats['total']}</p>
+        <p><strong>Successfully Recovered:</strong> {stats['OK']}</p>
+        {partial_html}
+        <p><strong>Corrupted Files:</strong> {stats['Corrupted']}</p>
+        <p><strong>Existing Files Copied:</strong> {stats['Copied']}</p>
+        <p><strong>Unchanged Since Last Extraction:</strong> {stats['Unchanged']}</p>
+        <p><strong>Duplicates Stored Once:</strong> {stats['Duplicate']}</p>
+        <p><strong>Total Data Size:</strong> {self._format_size(stats['size'])}</p>
+        {duplicates_html}
+        {manifest_html}
     </div>
     
     <h2>System Information</h2>
@@ -131,48 +232,35 @@ class ReportGenerator:
         </tr>
     </table>
     
+    {self._performance_html(timer.stages)}
+
     <h2>Recovered Files</h2>
     <table>
         <tr>
-            <th>#</th>
-            <th>File Name</th>
-            <th>Type</th>
-            <th>Size</th>
-            <th>Status</th>
-            <th>Hash</th>
+            <th>Page</th>
+            <th>Files</th>
         </tr>
 """)
-
-                # Add file entries
-                for i, file_info in enumerate(file_list, 1):
-                    status_class = ""
-                    if file_info['status'] == 'OK':
-                        status_class = "status-ok"
-                    elif 'Corrupted' in file_info['status']:
-                        status_class = "status-corrupted"
-                    elif file_info['status'] == 'Copied':
-                        status_class = "status-copied"
-                        
+                for n, (name, first, last) in enumerate(pages, 1):
                     f.write(f"""
         <tr>
-            <td>{i}</td>
-            <td>{os.path.basename(file_info['path'])}</td>
-            <td>{file_info.get('type', 'Unknown')}</td>
-            <td>{self._format_size(file_info.get('size', 0))}</td>
-            <td class="{status_class}">{file_info['status']}</td>
-            <td>{file_info.get('hash', 'N/A')}</td>
+            <td><a href="{pages_name}/{name}">{n}</a></td>
+            <td>{first}&ndash;{last}</td>
         </tr>""")
 
                 # Close HTML document
                 f.write("""
     </table>
-    
+
     <p><em>Report generated by Image Recovery Tool</em></p>
 </body>
 </html>
 """)
 
-            logger.info(f"Report generated successfully: {report_path}")
+            self._write_json_report(os.path.splitext(report_path)[0] + ".json", scan_type, target_path, stats,
+                                    len(duplicate_groups), timer.stages)
+
+            logger.info(f"Report generated successfully: {report_path} ({len(pages)} pages)")
             return report_path
             
         except Exception as e:
@@ -186,24 +274,267 @@ class ReportGenerator:
                     f.write(f"Date/Time: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
                     f.write(f"Scan Type: {scan_type}\n")
                     f.write(f"Target Path: {target_path}\n")
-                    f.write(f"Total Files: {total_files}\n")
-                    f.write(f"Successfully Recovered: {ok_files}\n")
-                    f.write(f"Corrupted Files: {corrupted_files}\n")
-                    f.write(f"Total Data Size: {self._format_size(total_size)}\n\n")
+                    f.write(f"Files Listed Before The Error: {stats['total']}\n")
+                    f.write(f"Successfully Recovered: {stats['OK']}\n")
+                    f.write(f"Partially Recovered: {stats['Partial']}\n")
+                    f.write(f"Corrupted Files: {stats['Corrupted']}\n")
+                    f.write(f"Total Data Size: {self._format_size(stats['size'])}\n\n")
                     
+                    # A list can be read again; a consumed iterator has nothing left to list
                     f.write("File List:\n")
                     for i, file_info in enumerate(file_list, 1):
                         f.write(f"{i}. {os.path.basename(file_info['path'])} - "
                               f"{file_info.get('type', 'Unknown')} - "
                               f"{self._format_size(file_info.get('size', 0))} - "
-                              f"{file_info['status']}\n")
+                              f"{file_info['status']} - "
+                              f"{self._format_score(file_info.get('score'))}\n")
                 
                 return text_report_path
                 
             except Exception as fallback_error:
                 logger.error(f"Failed to create fallback text report: {str(fallback_error)}")
                 return None
+
+    def _performance_html(self, stages):
+        """Table of wall time, CPU time, I/O and throughput per pipeline stage"""
+        if not stages:
+            return ""
+
+        rows = []
+        for stage in stages:
+            wall = max(stage['wall_seconds'], 1e-3)
+            moved = (stage['bytes_read'] + stage['bytes_written']) / wall
+            rows.append(f"""
+        <tr>
+            <td>{stage['stage']}</td>
+            <td>{html.escape(str(stage['target'] or ''))}</td>
+            <td>{stage['wall_seconds']:.2f} s</td>
+            <td>{stage['cpu_seconds']:.2f} s</td>
+            <td>{self._format_size(stage['bytes_read'])}</td>
+            <td>{self._format_size(stage['bytes_written'])}</td>
+            <td>{stage['items']}</td>
+            <td>{stage['items'] / wall:.1f} items/s, {self._format_size(moved)}/s</td>
+        </tr>""")
+
+        return f"""<h2>Performance</h2>
+    <table>
+        <tr>
+            <th>Stage</th>
+            <th>Target</th>
+            <th>Wall Time</th>
+            <th>CPU Time</th>
+            <th>Read</th>
+            <th>Written</th>
+            <th>Items</th>
+            <th>Throughput</th>
+        </tr>{"".join(rows)}
+    </table>"""
+
+    def _write_json_report(self, json_path, scan_type, target_path, stats, duplicate_groups, stages):
+        """Write the summary and stage figures as JSON for later analysis"""
+        report = {
+            'generated': datetime.datetime.now().isoformat(timespec='seconds'),
+            'scan_type': scan_type,
+            'target_path': target_path,
+            'summary': {
+                'total_files': stats['total'],
+                'ok': stats['OK'],
+                'partial': stats['Partial'],
+                'corrupted': stats['Corrupted'],
+                'copied': stats['Copied'],
+                'unchanged': stats['Unchanged'],
+                'duplicates': stats['Duplicate'],
+                'total_size': stats['size'],
+                'near_duplicate_groups': duplicate_groups
+            },
+            'system': {
+                'os': f"{platform.system()} {platform.release()}",
+                'machine': platform.machine(),
+                'processor': platform.processor(),
+                'cpu_count': os.cpu_count(),
+                'total_ram': psutil.virtual_memory().total
+            },
+            'performance': stages
+        }
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    def _open_page(self, page_path, title):
+        """Open a report page and write its head and heading"""
+        f = open(page_path, 'w', encoding='utf-8')
+        f.write(self._page_header(title))
+        return f
+
+    def _write_page(self, pages_dir, pages, batch, thumbnails, report_name, report_dir, has_next):
+        """Write the last page in pages: a contact sheet, then a table of its files"""
+        name, first, _ = pages[-1]
+        with self._open_page(os.path.join(pages_dir, name), f"Recovered Files (page {len(pages)})") as f:
+            if thumbnails:
+                f.write("""
+    <div class="contact-sheet">
+""")
+                for i, (file_info, thumb_path) in enumerate(zip(batch, thumbnails.thumbnails(batch)), first):
+                    if thumb_path is None:
+                        continue
+                    f.write(f"""
+        <figure>
+            <a href="{self._page_link(file_info['path'], pages_dir)}">
+                <img src="{self._page_link(thumb_path, pages_dir)}" loading="lazy" alt="#{i}"></a>
+            <figcaption>#{i}</figcaption>
+        </figure>""")
+                f.write("""
+    </div>
+""")
+
+            f.write("""
+    <table>
+        <tr>
+            <th>#</th>
+            <th>File Name</th>
+            <th>Type</th>
+            <th>Size</th>
+            <th>Status</th>
+            <th>Score</th>
+            <th>Hash</th>
+        </tr>
+""")
+            for i, file_info in enumerate(batch, first):
+                status_class = ""
+                if file_info['status'] == 'OK':
+                    status_class = "status-ok"
+                elif file_info['status'] == 'Partial':
+                    status_class = "status-partial"
+                elif 'Corrupted' in file_info['status']:
+                    status_class = "status-corrupted"
+                elif file_info['status'] == 'Copied':
+                    status_class = "status-copied"
+
+                f.write(f"""
+        <tr>
+            <td>{i}</td>
+            <td>{self._display_path(file_info['path'], report_dir)}</td>
+            <td>{file_info.get('type', 'Unknown')}</td>
+            <td>{self._format_size(file_info.get('size', 0))}</td>
+            <td class="{status_class}" title="{html.escape(file_info.get('reason', ''))}">{file_info['status']}</td>
+            <td>{self._format_score(file_info.get('score'))}</td>
+            <td>{file_info.get('hash', 'N/A')}</td>
+        </tr>""")
+
+            links = []
+            if len(pages) > 1:
+                links.append(f'<a href="{pages[-2][0]}">Previous</a>')
+            links.append(f'<a href="../{report_name}">Index</a>')
+            if has_next:
+                links.append(f'<a href="page_{len(pages) + 1:05d}.html">Next</a>')
+            f.write(f"""
+    </table>
+    <p>{" | ".join(links)}</p>
+</body>
+</html>
+""")
+
+    def _page_link(self, file_path, pages_dir):
+        """URL of a file relative to the report pages"""
+        try:
+            file_path = os.path.relpath(file_path, pages_dir)
+        except ValueError:
+            return Path(os.path.abspath(file_path)).as_uri()
+        return urllib.parse.quote(file_path.replace(os.sep, '/'))
+
+    def _remove_stale_pages(self, pages_dir, current):
+        """Delete pages left behind by an earlier, longer report"""
+        for name in os.listdir(pages_dir):
+            if name.endswith('.html') and name not in current:
+                try:
+                    os.remove(os.path.join(pages_dir, name))
+                except OSError as e:
+                    logger.warning(f"Could not remove stale report page {name}: {str(e)}")
+
+    def _page_header(self, title):
+        """HTML from the doctype to the page heading, shared by the index and every page"""
+        return f"""<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>{title}</title>
+    <style>
+        body {{
+            font-family: Arial, sans-serif;
+            line-height: 1.6;
+            color: #333;
+            max-width: 1200px;
+            margin: 0 auto;
+            padding: 20px;
+        }}
+        h1, h2, h3 {{
+            color: #2c3e50;
+        }}
+        table {{
+            width: 100%;
+            border-collapse: collapse;
+            margin-bottom: 20px;
+        }}
+        th, td {{
+            border: 1px solid #ddd;
+            padding: 8px;
+            text-align: left;
+        }}
+        th {{
+            background-color: #f2f2f2;
+        }}
+        tr:nth-child(even) {{
+            background-color: #f9f9f9;
+        }}
+        .summary {{
+            background-color: #f8f9fa;
+            padding: 15px;
+            border-radius: 5px;
+            margin-bottom: 20px;
+        }}
+        .status-ok {{
+            color: green;
+        }}
+        .status-partial {{
+            color: darkorange;
+        }}
+        .status-corrupted {{
+            color: red;
+        }}
+        .status-copied {{
+            color: blue;
+        }}
+        .contact-sheet {{
+            display: flex;
+            flex-wrap: wrap;
+            gap: 8px;
+            margin-bottom: 20px;
+        }}
+        .contact-sheet figure {{
+            margin: 0;
+            text-align: center;
+            font-size: 12px;
+        }}
+    </style>
+</head>
+<body>
+    <h1>{title}</h1>
+"""
     
+    def _format_score(self, score):
+        """Format a decodable-fraction score as a percentage"""
+        if score is None:
+            return "N/A"
+        return f"{score * 100:.0f}%"
+
+    def _display_path(self, file_path, report_dir):
+        """Path of a file relative to the report directory, or its name if unrelated"""
+        try:
+            relative_path = os.path.relpath(file_path, report_dir)
+        except ValueError:
+            return os.path.basename(file_path)
+        return os.path.basename(file_path) if relative_path.startswith('..') else relative_path
+
     def _format_size(self, size_bytes):
         """Format size in bytes to a human-readable string"""
         if size_bytes == 0:
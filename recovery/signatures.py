@@ -0,0 +1,71 @@
+# signatures.py
+import re
+
+# Define signatures for JPG and PNG
+JPG_SIGNATURES = [
+    b'\xff\xd8\xff\xe0\x00\x10\x4a\x46',  # JPEG SOI + APP0 JFIF
+    b'\xff\xd8\xff\xe1',                   # JPEG SOI + APP1 Exif
+    b'\xff\xd8\xff\xdb',                   # JPEG SOI + DQT
+    b'\xff\xd8\xff\xe0',                   # JPEG SOI + APP0
+    b'\xff\xd8\xff\xee',                   # JPEG SOI + APP14
+    b'\xff\xd8\xff\xc0',                   # JPEG SOI + SOF0
+    b'\xff\xd8\xff\xc4'                    # JPEG SOI + DHT
+]
+PNG_SIGNATURE = b'\x89\x50\x4e\x47\x0d\x0a\x1a\x0a'  # PNG signature
+
+# End markers, and how many bytes from the start of the marker belong to the file
+FOOTERS = {
+    'jpg': (b'\xff\xd9', 2),                          # JPEG EOI
+    'png': (b'\x49\x45\x4e\x44\xae\x42\x60\x82', 8)   # PNG IEND chunk type + CRC
+}
+
+# Longest header, used to size lookback buffers between read blocks
+MAX_SIGNATURE_LENGTH = max(len(sig) for sig in JPG_SIGNATURES + [PNG_SIGNATURE])
+
+# All headers in one alternation so a buffer is scanned in a single pass
+_HEADER_RE = re.compile(b'|'.join(re.escape(sig) for sig in JPG_SIGNATURES + [PNG_SIGNATURE]))
+
+
+def find_header(buffer, start=0):
+    """
+    Find the earliest image header in a buffer
+
+    Args:
+        buffer: bytes, bytearray or mmap to search
+        start: Offset to start searching from
+
+    Returns:
+        Tuple of (offset, file type) or (-1, None) if no header was found
+    """
+    match = _HEADER_RE.search(buffer, start)
+    if match is None:
+        return -1, None
+    return match.start(), _header_type(match.group())
+
+
+def iter_headers(buffer, start=0):
+    """Yield (offset, file type) for every image header in a buffer"""
+    for match in _HEADER_RE.finditer(buffer, start):
+        yield match.start(), _header_type(match.group())
+
+
+def sniff_type(header):
+    """
+    Identify an image file from its first bytes
+
+    Args:
+        header: At least the first 8 bytes of the file
+
+    Returns:
+        'jpg', 'png' or None if the bytes are not an image header
+    """
+    if header.startswith(PNG_SIGNATURE):
+        return 'png'
+    # Any SOI followed by a marker; JPG_SIGNATURES lists only the common carving headers
+    if header.startswith(b'\xff\xd8\xff'):
+        return 'jpg'
+    return None
+
+
+def _header_type(header):
+    return 'png' if header == PNG_SIGNATURE else 'jpg'
@@ -0,0 +1,137 @@
+# thumbnails.py
+import os
+import hashlib
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image
+
+logger = logging.getLogger("ImageRecovery.Thumbnails")
+
+THUMBNAIL_DIR_NAME = "thumbnails"
+
+# Larger images are not previewed; JPEGs are measured after draft scaling
+_MAX_DECODE_PIXELS = 50_000_000
+
+
+def _thumbnail_path(cache_dir, file_hash):
+    return os.path.join(cache_dir, file_hash[:2], f"{file_hash}.jpg")
+
+
+def _render_chunk(tasks):
+    """
+    Render thumbnails for a chunk of images
+
+    Args:
+        tasks: List of (image path, SHA-256 hex digest or None, cache directory, size)
+
+    Returns:
+        List of thumbnail paths, None where the image could not be decoded
+    """
+    results = []
+    for file_path, file_hash, cache_dir, size in tasks:
+        try:
+            if file_hash is None:
+                sha256_hash = hashlib.sha256()
+                with open(file_path, 'rb') as f:
+                    for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                        sha256_hash.update(chunk)
+                file_hash = sha256_hash.hexdigest()
+
+            thumb_path = _thumbnail_path(cache_dir, file_hash)
+            if not os.path.exists(thumb_path):
+                with Image.open(file_path) as img:
+                    # JPEG DCT scaling decodes at 1/2 to 1/8 size instead of full resolution
+                    img.draft('RGB', (size, size))
+                    if img.width * img.height > _MAX_DECODE_PIXELS:
+                        results.append(None)
+                        continue
+                    img.thumbnail((size, size), Image.BILINEAR, reducing_gap=2.0)
+                    thumb = img.convert('RGB')
+
+                os.makedirs(os.path.dirname(thumb_path), exist_ok=True)
+                # Written aside and renamed, so a concurrent report never reads half a thumbnail
+                temp_path = f"{thumb_path}.{os.getpid()}.tmp"
+                thumb.save(temp_path, 'JPEG', quality=80)
+                os.replace(temp_path, thumb_path)
+            results.append(thumb_path)
+        except Exception:
+            results.append(None)
+    return results
+
+
+class ThumbnailGenerator:
+    """Module for rendering image previews, cached by content hash"""
+
+    def __init__(self, cache_dir, size=160, max_workers=None, chunk_size=16, pool=None):
+        """
+        Args:
+            cache_dir: Directory holding thumbnails; reports regenerated into
+                the same directory reuse them
+            size: Longest side of a thumbnail in pixels
+            max_workers: Rendering processes (CPU count by default)
+            chunk_size: Images rendered per task
+            pool: ProcessPoolExecutor shared across a run, left running on
+                close(); one is started on first use if None
+        """
+        self.cache_dir = cache_dir
+        self.size = size
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.cached_count = 0
+        self.rendered_count = 0
+        self._shared_pool = pool
+        self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Shut down the rendering processes"""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def thumbnails(self, file_list):
+        """
+        Get thumbnails for files, rendering those not cached yet
+
+        Files with a 'hash' (as set by the verifier and the extractor) are
+        looked up without being read; the rest are hashed by the workers.
+
+        Args:
+            file_list: List of file information dictionaries
+
+        Returns:
+            List of thumbnail paths in the order of file_list, None for files
+            that could not be previewed
+        """
+        results = [None] * len(file_list)
+        tasks = []
+        indices = []
+        for i, file_info in enumerate(file_list):
+            file_hash = file_info.get('hash')
+            if file_hash and os.path.exists(_thumbnail_path(self.cache_dir, file_hash)):
+                results[i] = _thumbnail_path(self.cache_dir, file_hash)
+                self.cached_count += 1
+            elif os.path.exists(file_info['path']):
+                tasks.append((file_info['path'], file_hash, self.cache_dir, self.size))
+                indices.append(i)
+
+        if not tasks:
+            return results
+
+        chunks = [tasks[i:i + self.chunk_size] for i in range(0, len(tasks), self.chunk_size)]
+        if self.max_workers <= 1 or len(chunks) == 1:
+            rendered = [_render_chunk(chunk) for chunk in chunks]
+        else:
+            if self._shared_pool is None and self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+            rendered = (self._shared_pool or self._pool).map(_render_chunk, chunks)
+
+        for i, thumb_path in zip(indices, (path for chunk in rendered for path in chunk)):
+            results[i] = thumb_path
+            self.rendered_count += thumb_path is not None
+        return results
@@ -0,0 +1,53 @@
+# timing.py
+import time
+import threading
+from contextlib import contextmanager
+import psutil
+
+class StageTimer:
+    """Module for recording wall time, CPU time, I/O and item counts of pipeline stages"""
+
+    def __init__(self):
+        self.stages = []
+        self._lock = threading.Lock()
+        self._process = psutil.Process()
+
+    @contextmanager
+    def stage(self, name, target=None):
+        """
+        Time a stage; the body fills in what it read, wrote and processed
+
+        CPU time is that of the whole process tree: the running worker
+        processes (a pool lives for the whole run) and, on POSIX, workers
+        that have exited. Stages of concurrent batch jobs share each other's
+        CPU time.
+
+        Args:
+            name: Stage name (scan, verify, report...)
+            target: Path the stage worked on, if any
+
+        Yields:
+            Dictionary whose 'bytes_read', 'bytes_written' and 'items'
+            counts the stage sets before it ends
+        """
+        record = {'stage': name, 'target': target, 'bytes_read': 0, 'bytes_written': 0, 'items': 0}
+        started = time.perf_counter()
+        cpu_started = self._cpu_seconds()
+        try:
+            yield record
+        finally:
+            record['wall_seconds'] = round(time.perf_counter() - started, 3)
+            record['cpu_seconds'] = round(self._cpu_seconds() - cpu_started, 3)
+            with self._lock:
+                self.stages.append(record)
+
+    def _cpu_seconds(self):
+        times = self._process.cpu_times()
+        total = times.user + times.system + getattr(times, 'children_user', 0) + getattr(times, 'children_system', 0)
+        for child in self._process.children(recursive=True):
+            try:
+                child_times = child.cpu_times()
+            except psutil.Error:
+                continue  # Exited since it was listed; its time is in children_* once reaped
+            total += child_times.user + child_times.system
+        return total
@@ -1,21 +1,407 @@
 # verifier.py
+import io
 import os
+import re
+import time
+import zlib
+import mmap
 import hashlib
+import json
+import errno
 import logging
 import shutil
-from PIL import Image
+from contextlib import nullcontext
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from PIL import Image, JpegImagePlugin, PngImagePlugin
+from .signatures import PNG_SIGNATURE, FOOTERS
+from .cache import VerificationCache, lookup_content
+from .headers import image_dimensions, JpegScan
 
 logger = logging.getLogger("ImageRecovery.Verifier")
 
+# Per-directory index of quarantined files: original location, offset and reason
+QUARANTINE_INDEX_NAME = "index.jsonl"
+
+# Validation tiers from cheapest to strictest; each tier includes the checks of those before it
+VALIDATION_LEVELS = ('magic', 'structure', 'verify', 'draft', 'full')
+
+_MAGIC = {'jpg': b'\xff\xd8\xff', 'png': PNG_SIGNATURE}
+
+# Format plugins for the types whose dimensions are checked against our own limits
+# before opening; constructing them directly skips PIL's process-wide bomb limit
+_PLUGINS = {'jpg': JpegImagePlugin.JpegImageFile, 'png': PngImagePlugin.PngImageFile}
+
+# Leading bytes searched for the image dimensions (JPEG frame headers may follow large APPn segments)
+_HEADER_BYTES = 256 * 1024
+
+# Any JPEG marker other than stuffing, restart markers and fill bytes
+_JPEG_MARKER_RE = re.compile(b'\xff[^\x00\xd0-\xd7\xff]')
+# Restart markers, which libjpeg resynchronizes on
+_JPEG_RST_RE = re.compile(b'\xff[\xd0-\xd7]')
+# Markers that may legitimately appear between the scans of a progressive JPEG
+_JPEG_INTERSCAN_MARKERS = {0xC4, 0xCC, 0xDA, 0xDB, 0xDC, 0xDD}
+
+def _defect(reason, file_path):
+    """Log why a file failed verification and return the reason"""
+    logger.warning(f"{reason}: {file_path}")
+    return reason
+
+def _image_file(data):
+    """File object over file contents for PIL, without copying a memory map"""
+    if isinstance(data, mmap.mmap):
+        data.seek(0)
+        return data
+    return io.BytesIO(data)
+
+def _open_image(data, file_type):
+    """Open file contents with PIL, leaving the pixel limit of header-checked types to the verifier"""
+    plugin = _PLUGINS.get(file_type)
+    return plugin(_image_file(data)) if plugin else Image.open(_image_file(data))
+
+def _has_magic_and_trailer(data, file_type):
+    """Check the header magic and that the end marker falls near the end of the file"""
+    if file_type not in _MAGIC:
+        return True
+    end_signature, _ = FOOTERS[file_type]
+    # Allow a little trailing padding after the end marker
+    magic = _MAGIC[file_type]
+    return data[:len(magic)] == magic and data.rfind(end_signature, max(0, len(data) - 4096)) >= 0
+
+def _jpeg_break(data):
+    """
+    Walk JPEG marker segments and scans
+
+    Returns:
+        None if a frame and scan lead to a clean EOI, 0 if the headers are
+        broken, otherwise the offset where the scan data breaks or runs out
+    """
+    pos = 2
+    seen_frame = False
+
+    # Header segments up to the first scan
+    while True:
+        if pos + 4 > len(data) or data[pos] != 0xFF:
+            return 0
+        marker = data[pos + 1]
+        if marker == 0xFF:
+            pos += 1
+            continue
+        length = int.from_bytes(data[pos + 2:pos + 4], 'big')
+        if length < 2:
+            return 0
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            seen_frame = True
+        pos += 2 + length
+        if marker == 0xDA:
+            break
+
+    if not seen_frame:
+        return 0
+
+    # Entropy-coded data may only be interrupted by tables and further scans before EOI
+    while True:
+        match = _JPEG_MARKER_RE.search(data, pos)
+        if match is None:
+            return len(data)
+        marker = data[match.start() + 1]
+        if marker == 0xD9:
+            return None
+        if marker not in _JPEG_INTERSCAN_MARKERS or match.start() + 4 > len(data):
+            return match.start()
+        pos = match.start() + 2 + int.from_bytes(data[match.start() + 2:match.start() + 4], 'big')
+
+def _walk_jpeg(data):
+    """True if a JPEG's frame and scans lead to a clean EOI"""
+    return _jpeg_break(data) is None
+
+def _decode_blocks(data, scale, scan_break=None):
+    """
+    Decode a JPEG to one pixel per 8x8 block
+
+    A broken scan is cut at its first bad marker and closed with EOI, so
+    libjpeg fills the rest instead of failing and what survives is kept.
+
+    Args:
+        data: Contents of the JPEG file
+        scale: 8 decodes at 1/8 size with draft(); 1 decodes every pixel and
+            averages each block
+        scan_break: Offset from _jpeg_break where the scan data breaks, if any
+
+    Returns:
+        Tuple of (PIL image as decoded, int16 array of block colors)
+    """
+    if scan_break:
+        data = data[:scan_break] + b'\xff\xd9'
+
+    img = _open_image(data, 'jpg')
+    if scale > 1:
+        # DCT scaling decodes at 1/8 size, touching all entropy data for a fraction of the CPU
+        img.draft('RGB', (max(1, img.size[0] // 8), max(1, img.size[1] // 8)))
+    img.load()  # Raises if the pixel data is truncated or undecodable
+    # Reducing first keeps a full decode to a single full-size buffer
+    blocks = img.reduce(8) if scale == 1 else img
+    blocks = blocks if blocks.mode == 'RGB' else blocks.convert('RGB')
+    return img, np.asarray(blocks, dtype=np.int16)
+
+def _restart_damage(data, scan, scan_end):
+    """
+    Find the MCUs of a JPEG with restart markers that decode wrongly or out of place
+
+    libjpeg resynchronizes at each restart marker but only knows its number
+    modulo 8. A wrong marker with the count intact damages the intervals on
+    either side of it. Markers lost or gained shift every later MCU, so
+    everything from the first missing or extra marker on is lost.
+
+    Args:
+        data: Contents of the JPEG file
+        scan: JpegScan of the first scan
+        scan_end: Offset where the first scan's entropy-coded data ends
+
+    Returns:
+        Boolean array with one entry per MCU, True where the MCU is lost
+    """
+    interval = scan.restart_interval
+    lost = np.zeros(scan.mcu_count, dtype=bool)
+    positions = [match.start() for match in _JPEG_RST_RE.finditer(data, scan.scan_start, scan_end)]
+    numbers = np.array([data[pos + 1] - 0xD0 for pos in positions], dtype=np.int64)
+    wrong = np.flatnonzero(numbers != np.arange(len(numbers)) % 8)
+
+    if len(positions) == -(-scan.mcu_count // interval) - 1:
+        for i in wrong:
+            lost[i * interval:(i + 2) * interval] = True
+        return lost
+
+    # The count is off: the first marker out of sequence, or the first interval far
+    # longer than the rest (data with its markers overwritten), is where it broke
+    lengths = np.diff([scan.scan_start] + positions + [scan_end])
+    overlong = np.flatnonzero(lengths > 8 * np.median(lengths))
+    first = min(wrong[0] if len(wrong) else len(positions), overlong[0] if len(overlong) else len(positions))
+    lost[first * interval:] = True
+    return lost
+
+def _mcu_blocks(mcu_mask, scan, shape):
+    """Spread a per-MCU mask over the block grid of the picture"""
+    rows = -(-len(mcu_mask) // scan.mcu_cols)
+    grid = np.zeros(rows * scan.mcu_cols, dtype=bool)
+    grid[:len(mcu_mask)] = mcu_mask
+    across, down = scan.mcu_blocks
+    grid = np.repeat(np.repeat(grid.reshape(rows, scan.mcu_cols), down, axis=0), across, axis=1)
+    padded = np.ones(shape, dtype=bool)  # Blocks outside the MCU grid cannot have decoded
+    padded[:min(shape[0], grid.shape[0]), :min(shape[1], grid.shape[1])] = grid[:shape[0], :shape[1]]
+    return padded
+
+def _decodable_fraction(data, pixels, scan_break):
+    """
+    Estimate the fraction of a JPEG that decodes to picture content
+
+    Only meaningful for a file already known to be damaged: synthetic
+    pictures (stripes, charts) can score low while decoding perfectly.
+
+    Three kinds of damage are counted, block by block: the constant fill
+    libjpeg emits once scan data runs out or breaks, rows of block noise
+    from misdecoded data, and blocks decoded out of place. With restart
+    markers, the marker sequence shows which intervals are lost or
+    shifted, and an interval misdecoded in place shows as a band of rows
+    the picture continues across. Without them the decoder never resynchronizes, so every
+    block from the first misdecoded row on is wrong.
+
+    Args:
+        data: Contents of the JPEG file
+        pixels: Block colors from _decode_blocks
+        scan_break: Offset from _jpeg_break where the scan data breaks, if any
+
+    Returns:
+        Score between 0.0 (nothing decodable) and 1.0 (fully intact)
+    """
+    height, width = pixels.shape[:2]
+    if height * width == 0:
+        return 0.0
+    lost = np.zeros((height, width), dtype=bool)
+
+    # A trailing run of identical blocks in raster order is decoder fill. Fill
+    # after a premature EOI starts mid-row; flat borders start on a row boundary,
+    # or within a row that only differs from them by the ringing of their edge.
+    blocks = pixels.reshape(-1, 3)
+    differs = np.flatnonzero(np.any(blocks != blocks[-1], axis=1))
+    fill_start = differs[-1] + 1 if len(differs) else 0
+    row_start = fill_start - fill_start % width
+    border = np.all(np.abs(blocks[row_start:fill_start] - blocks[-1]) <= 16)
+    if scan_break is not None or (not border and blocks.shape[0] - fill_start >= width):
+        lost.reshape(-1)[fill_start:] = True
+
+    # Misdecoded rows are far rougher block-to-block than the rest of the picture
+    bad_rows = np.zeros(height, dtype=bool)
+    roughness = np.zeros(height)
+    if width > 1:
+        roughness = np.abs(np.diff(pixels, axis=1)).mean(axis=(1, 2))
+        bad_rows |= roughness > max(4 * np.median(roughness), 40)
+
+    # Misdecoding also starts where the picture jumps between two rows far more than
+    # between the rows on either side, a seam natural edges (blurred over two block
+    # rows at this scale) do not make. Letterbox edges, with flat bands out to the
+    # border (ending in at most one block row mixing band and picture), are the
+    # exception.
+    jumps = np.abs(np.diff(pixels, axis=0)).mean(axis=(1, 2))
+    if height > 2:
+        smooth = roughness < 1
+        flat_to_top = np.logical_and.accumulate(smooth & (np.concatenate(([0], jumps)) < 1))
+        flat_to_bottom = np.logical_and.accumulate((smooth & (np.concatenate((jumps, [0])) < 1))[::-1])[::-1]
+        picture = ~(flat_to_top[:-1] | flat_to_bottom[1:])
+        typical = np.median(jumps[picture]) if picture.any() else 0
+        padded = np.concatenate(([0], jumps, [0]))
+        seams = jumps - np.maximum(padded[:-2], padded[2:]) > max(20, 6 * typical)
+        band_above = np.concatenate(([True], flat_to_top[:-2]))
+        band_below = np.concatenate((flat_to_bottom[2:], [True]))
+        seams &= ~(flat_to_top[:-1] | band_above) & ~(flat_to_bottom[1:] | band_below)
+        bad_rows[1:] |= seams
+
+    scan = JpegScan.parse(data[:_HEADER_BYTES])
+    if scan is not None and scan.covers_frame and scan.restart_interval:
+        if scan_break is None:
+            end = _JPEG_MARKER_RE.search(data, scan.scan_start)
+            scan_break = end.start() if end else len(data)
+        lost |= _mcu_blocks(_restart_damage(data, scan, scan_break), scan, lost.shape)
+        # The decoder picks up again at the next marker, leaving a band of misdecoded
+        # rows that the picture continues across (taller bands are rough or seamed)
+        band = max(1, scan.restart_interval // scan.mcu_cols) * scan.mcu_blocks[1]
+        for rows in range(1, min(band, 8, height - 2) + 1):
+            across = np.abs(pixels[rows + 1:] - pixels[:-rows - 1]).mean(axis=(1, 2))
+            edges = np.minimum(jumps[:-rows], jumps[rows:])
+            for top in np.flatnonzero((edges > max(20, 4 * np.median(jumps))) & (across < edges / 2)) + 1:
+                bad_rows[top:top + rows] = True
+        lost[bad_rows] = True
+    elif bad_rows.any():
+        lost[np.argmax(bad_rows):] = True
+
+    return round(1.0 - float(np.count_nonzero(lost)) / lost.size, 4)
+
+def _walk_png(data):
+    """Walk PNG chunks checking each CRC; True if IHDR leads through IDAT to IEND"""
+    view = memoryview(data)
+    pos = len(PNG_SIGNATURE)
+    seen_idat = False
+
+    while pos + 12 <= len(data):
+        length = int.from_bytes(data[pos:pos + 4], 'big')
+        chunk_type = bytes(view[pos + 4:pos + 8])
+        end = pos + 12 + length
+        if end > len(data) or zlib.crc32(view[pos + 4:end - 4]) != int.from_bytes(data[end - 4:end], 'big'):
+            return False
+        if pos == len(PNG_SIGNATURE) and chunk_type != b'IHDR':
+            return False
+        if chunk_type == b'IDAT':
+            seen_idat = True
+        if chunk_type == b'IEND':
+            return seen_idat
+        pos = end
+
+    return False
+
+_STRUCTURE_WALKERS = {'jpg': _walk_jpeg, 'png': _walk_png}
+
+def _check_file(verifier, item):
+    """
+    Hash and validate one file; runs in a worker process in parallel mode
+
+    Returns:
+        Tuple of (hash, is_valid, size, score, reason, dimensions, cached),
+        dimensions being (width, height) from the header or None and cached
+        True if the result was found in the cache by content, or None if the
+        file does not exist
+    """
+    file_path, file_type = item
+    try:
+        # One mapping feeds both the hash and the image parse; pages are read on
+        # demand, so a carve running to the end of a device is never held in RAM
+        with open(file_path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.error(f"Error reading {file_path}: {str(e)}")
+        return "hash_error", False, 0, None, f"Read error ({str(e)})", None, False
+
+    try:
+        file_hash = verifier._calculate_file_hash(data)
+        if verifier.cache_path:
+            hit = lookup_content(verifier.cache_path, file_hash, verifier._settings_key)
+            if hit is not None:
+                return (file_hash, hit[0], size) + hit[1:] + (True,)
+        dimensions = image_dimensions(data[:_HEADER_BYTES], file_type)
+        reason, score = verifier._inspect(file_path, file_type, data, dimensions)
+        return file_hash, reason is None, size, score, reason, dimensions[:2] if dimensions else None, False
+    finally:
+        if size:
+            data.close()
+
+def _index_key(entry):
+    """Identity of a quarantined file across runs: its source offset, or where it was recovered to"""
+    if entry.get('offset') is not None:
+        return entry.get('original_path'), entry['offset']
+    return entry.get('recovered_path')
+
 class FileIntegrityVerifier:
     """Module for verifying the integrity of recovered image files"""
     
-    def __init__(self):
+    def __init__(self, workers=None, parallel_threshold=64, level='verify', cache_path=None,
+                 max_dimension=65535, max_pixels=300_000_000, memory_budget=512 * 1024 * 1024, min_score=0.1,
+                 pool=None):
+        """
+        Args:
+            workers: Worker processes for parallel verification (defaults to
+                the CPU count; 1 verifies in this process)
+            parallel_threshold: Smallest file count worth starting a process pool for
+            level: Validation tier, one of VALIDATION_LEVELS: 'magic' checks the
+                header and end marker, 'structure' walks JPEG markers or PNG
+                chunks, 'verify' runs PIL's verify(), 'draft' decodes JPEGs at
+                reduced scale and 'full' decodes every pixel
+            cache_path: SQLite file caching results by path, size, mtime and
+                inode, so unchanged files are not re-read, and by content, so
+                files rewritten with the same bytes are hashed but not
+                decoded again (no cache if None)
+            max_dimension: Largest width or height accepted as a valid image
+            max_pixels: Largest width x height accepted as a valid image
+            memory_budget: Largest pixel buffer one decode may allocate; files
+                over it are checked with verify() instead of being decoded
+            min_score: Smallest decodable fraction of a damaged JPEG that is
+                kept in place as 'Partial' rather than quarantined
+            pool: ProcessPoolExecutor shared across a run; one is started for
+                each parallel verification if None
+        """
+        if level not in VALIDATION_LEVELS:
+            raise ValueError(f"Unknown validation level: {level}")
+
+        self.level = level
         self.corrupted_count = 0
+        self.workers = workers or os.cpu_count() or 1
+        self.parallel_threshold = parallel_threshold
+        self.cache_path = cache_path
+        self.max_dimension = max_dimension
+        self.max_pixels = max_pixels
+        self.memory_budget = memory_budget
+        self.min_score = min_score
+        self.pool = pool
+        # Cached results are only reused under the same level and limits
+        self._settings_key = f"{level}:{max_dimension}:{max_pixels}:{memory_budget}"
+        self.stats = {}
+        self._active_workers = 1
+
+    def __getstate__(self):
+        # Workers receive the settings, not the pool they run in
+        state = self.__dict__.copy()
+        state['pool'] = None
+        return state
         
     def verify_files(self, file_list, corrupted_dir):
         """
         Verify the integrity of image files
+
+        Damaged JPEGs that still decode to at least min_score of their
+        picture stay where they are with status 'Partial' and their score;
+        everything else that fails is moved to corrupted_dir.
         
         Args:
             file_list: List of file information dictionaries
@@ -27,109 +413,313 @@ class FileIntegrityVerifier:
         logger.info(f"Starting verification of {len(file_list)} files")
         self.corrupted_count = 0
         verified_files = []
+        started = time.perf_counter()
+        total_bytes = 0
+        cache = None
+        quarantined = []
+        cached_count = 0
         
         try:
             # Create corrupted files directory if it doesn't exist
             os.makedirs(corrupted_dir, exist_ok=True)
+            if self.cache_path:
+                cache = VerificationCache(self.cache_path)
             
-            for file_info in file_list:
+            # Results stream back in file_list order, from the pool in parallel mode
+            for file_info, result in zip(file_list, self._check_files(file_list, cache)):
                 file_path = file_info['path']
                 
-                if not os.path.exists(file_path):
+                if result is None:
                     logger.warning(f"File does not exist: {file_path}")
                     file_info['status'] = 'Missing'
                     verified_files.append(file_info)
                     continue
                     
-                # Calculate file hash
-                file_hash = self._calculate_file_hash(file_path)
+                file_hash, is_valid, file_size, score, reason, dimensions, cached = result
+                cached_count += cached
                 file_info['hash'] = file_hash
-                
-                # Check if the file is a valid image
-                is_valid = self._verify_image_integrity(file_path, file_info['type'])
+                if dimensions:
+                    file_info['width'], file_info['height'] = dimensions
+                if score is not None:
+                    file_info['score'] = score
+                total_bytes += file_size
                 
                 if is_valid:
                     file_info['status'] = 'OK'
+                elif score is not None and score >= self.min_score:
+                    file_info['status'] = 'Partial'
+                    file_info['reason'] = reason
+                    logger.warning(f"Keeping partially decodable file ({score:.0%}): {file_path}")
                 else:
                     # Move to corrupted files directory
                     self.corrupted_count += 1
+                    file_info['reason'] = reason
                     corrupted_filename = f"corrupted_{self.corrupted_count}_{os.path.basename(file_path)}"
                     corrupted_path = os.path.join(corrupted_dir, corrupted_filename)
                     
                     try:
-                        shutil.move(file_path, corrupted_path)
+                        self._quarantine(file_path, corrupted_path)
                         file_info['path'] = corrupted_path
                         file_info['status'] = 'Corrupted'
                         logger.warning(f"Moved corrupted file to: {corrupted_path}")
+                        if cache:
+                            cache.store(corrupted_path, os.stat(corrupted_path), self._settings_key, result)
                     except Exception as e:
                         logger.error(f"Error moving corrupted file: {str(e)}")
                         file_info['status'] = 'Corrupted (not moved)'
+
+                    entry = {'file': os.path.relpath(file_info['path'], corrupted_dir), 'recovered_path': file_path,
+                             'reason': reason, 'hash': file_hash}
+                    for key in ('original_path', 'offset'):
+                        if key in file_info:
+                            entry[key] = file_info[key]
+                    quarantined.append(entry)
                 
                 verified_files.append(file_info)
                 
+            self._record_throughput(len(verified_files), total_bytes, time.perf_counter() - started)
+            self.stats['cached'] = cached_count
             logger.info(f"Verification complete. {len([f for f in verified_files if f['status'] == 'OK'])} OK, "
-                      f"{len([f for f in verified_files if 'Corrupted' in f['status']])} corrupted")
+                      f"{len([f for f in verified_files if f['status'] == 'Partial'])} partial, "
+                      f"{len([f for f in verified_files if 'Corrupted' in f['status']])} corrupted "
+                      f"({self.stats['files_per_second']:.1f} files/s, {self.stats['mb_per_second']:.1f} MB/s)")
             return verified_files
             
         except Exception as e:
             logger.error(f"Error verifying files: {str(e)}", exc_info=True)
             return file_list
+
+        finally:
+            if cache:
+                cache.close()
+            if quarantined:
+                self._update_index(corrupted_dir, quarantined)
     
-    def _calculate_file_hash(self, file_path):
-        """Calculate SHA-256 hash of a file"""
+    def _check_files(self, file_list, cache=None):
+        """Yield _check_file results in order, reusing cached results for unchanged files and known content"""
+        items = [(file_info['path'], file_info['type']) for file_info in file_list]
+
+        stats = []
+        for file_path, _ in items:
+            try:
+                stats.append(os.stat(file_path))
+            except OSError:
+                stats.append(None)
+
+        cached = [cache.lookup(item[0], st, self._settings_key) if cache and st else None
+                  for item, st in zip(items, stats)]
+        fresh = self._run_checks([item for item, st, hit in zip(items, stats, cached)
+                                  if st is not None and hit is None])
+
+        for item, st, hit in zip(items, stats, cached):
+            if st is None:
+                yield None
+            elif hit is not None:
+                yield hit + (True,)
+            else:
+                result = next(fresh)
+                if cache and result is not None and result[0] != "hash_error":
+                    cache.store(item[0], st, self._settings_key, result)
+                yield result
+
+    def _run_checks(self, items):
+        """Yield _check_file results in order, spreading work over a process pool for large sets"""
+        if self.workers <= 1 or len(items) < self.parallel_threshold:
+            self._active_workers = 1
+            for item in items:
+                yield _check_file(self, item)
+            return
+
+        # Chunks amortize inter-process overhead on many small files
+        self._active_workers = self.workers
+        chunksize = max(1, min(64, len(items) // (self.workers * 4)))
+        with nullcontext(self.pool) if self.pool else ProcessPoolExecutor(max_workers=self.workers) as pool:
+            yield from pool.map(partial(_check_file, self), items, chunksize=chunksize)
+
+    def _record_throughput(self, file_count, total_bytes, elapsed):
+        """Store throughput of the last verification run in self.stats"""
+        elapsed = max(elapsed, 1e-9)
+        self.stats = {
+            'files': file_count,
+            'bytes': total_bytes,
+            'seconds': elapsed,
+            'files_per_second': file_count / elapsed,
+            'mb_per_second': total_bytes / elapsed / (1024 * 1024),
+            'workers': self._active_workers
+        }
+
+    def _quarantine(self, file_path, corrupted_path):
+        """Move a file into quarantine with a rename, copying only across filesystems"""
         try:
-            sha256_hash = hashlib.sha256()
-            
-            with open(file_path, "rb") as f:
-                # Read the file in chunks
-                for byte_block in iter(lambda: f.read(4096), b""):
-                    sha256_hash.update(byte_block)
-                    
-            return sha256_hash.hexdigest()
-            
-        except Exception as e:
-            logger.error(f"Error calculating hash for {file_path}: {str(e)}")
-            return "hash_error"
+            os.replace(file_path, corrupted_path)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            shutil.move(file_path, corrupted_path)
+
+    def _update_index(self, corrupted_dir, entries):
+        """
+        Merge quarantine entries into the corrupted directory's index
+
+        Entries are keyed on where the file came from: the source and offset
+        of a carve, otherwise its recovered path. A rerun replaces the entry
+        for the same key or the same quarantined file instead of adding
+        another, and entries whose file has gone are dropped, so the index
+        lists each file in quarantine once.
+        """
+        index_path = os.path.join(corrupted_dir, QUARANTINE_INDEX_NAME)
+        keys = {_index_key(entry) for entry in entries}
+        files = {entry['file'] for entry in entries}
+        kept = []
+        try:
+            with open(index_path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if (_index_key(entry) not in keys and entry.get('file') not in files
+                            and os.path.exists(os.path.join(corrupted_dir, entry.get('file', '')))):
+                        kept.append(entry)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.error(f"Error reading quarantine index {index_path}: {str(e)}")
+
+        try:
+            with open(index_path + ".tmp", 'w', encoding='utf-8') as f:
+                f.write(''.join(json.dumps(entry) + '\n' for entry in kept + entries))
+            os.replace(index_path + ".tmp", index_path)
+        except OSError as e:
+            logger.error(f"Error writing quarantine index {index_path}: {str(e)}")
+
+    def _decode_allowed(self, dimensions, scale=1):
+        """
+        Check whether decoding an image fits the memory budget
+
+        PIL pads multi-band pixels to four bytes and keeps 16-bit single-band
+        images at two or four, so every pixel is counted as four bytes.
+
+        Args:
+            dimensions: (width, height, channels) from the header, or None
+            scale: Downscale factor of the decode (8 for 1/8 draft decodes)
+
+        Returns:
+            True if the decoded pixel buffer fits within memory_budget
+        """
+        if dimensions is None:
+            return False
+        width, height, _ = dimensions
+        if width * height > self.max_pixels:
+            return False
+        return -(-width // scale) * -(-height // scale) * 4 <= self.memory_budget
+
+    def _calculate_file_hash(self, data):
+        """Calculate SHA-256 hash of a file's contents (bytes or a memory map)"""
+        return hashlib.sha256(data).hexdigest()
     
-    def _verify_image_integrity(self, file_path, file_type):
+    def _verify_image_integrity(self, file_path, file_type, data):
         """
         Verify that a file is a valid image
         
         Args:
-            file_path: Path to the image file
+            file_path: Path to the image file (for logging)
             file_type: Type of the image (jpg, png)
+            data: Contents of the file
             
         Returns:
             True if the file is a valid image, False otherwise
         """
+        return self._inspect(file_path, file_type, data)[0] is None
+
+    def _inspect(self, file_path, file_type, data, dimensions=None):
+        """
+        Check a file at the configured validation level
+
+        Args:
+            file_path: Path of the file, for logging
+            file_type: Type of the image (jpg, png)
+            data: Contents of the file
+            dimensions: (width, height, channels) already read from the
+                header; read here if None
+
+        Returns:
+            Tuple of (reason, score): reason is None if the file is a valid
+            image, otherwise why it is not; score is the decodable fraction
+            of a JPEG at the levels that decode it ('draft' and 'full'),
+            taken from that same decode, otherwise None. The score only
+            grades files the structure walk or the decode found broken; for
+            a clean decode it is informational and never makes the file invalid
+        """
         try:
             # Check file size
-            file_size = os.path.getsize(file_path)
-            if file_size == 0:
-                logger.warning(f"Empty file: {file_path}")
-                return False
-                
+            if len(data) == 0:
+                return _defect("Empty file", file_path), None
+
+            rank = VALIDATION_LEVELS.index(self.level)
+
+            if not _has_magic_and_trailer(data, file_type):
+                return _defect("Missing header or end marker", file_path), None
+            if rank < VALIDATION_LEVELS.index('structure'):
+                return None, None
+
+            # Limits are enforced from the header, before PIL allocates anything
+            if dimensions is None:
+                dimensions = image_dimensions(data[:_HEADER_BYTES], file_type)
+            if dimensions is not None:
+                width, height, _ = dimensions
+                if (width <= 0 or height <= 0 or width > self.max_dimension or height > self.max_dimension
+                        or width * height > self.max_pixels):
+                    return _defect(f"Invalid image dimensions {width}x{height}", file_path), None
+
+            decodes = rank >= VALIDATION_LEVELS.index('draft')
+            scale = 8 if self.level == 'draft' and file_type == 'jpg' else 1
+
+            if file_type == 'jpg':
+                scan_break = _jpeg_break(data)
+                broken = scan_break is not None
+                if decodes and self._decode_allowed(dimensions, scale):
+                    # One decode both validates and scores; a broken scan is decoded up to the break
+                    try:
+                        img, pixels = _decode_blocks(data, scale, scan_break)
+                    except Exception as e:
+                        return _defect(f"Invalid image file ({str(e)})", file_path), 0.0
+                    score = _decodable_fraction(data, pixels, scan_break)
+                    if broken:
+                        return _defect("Broken jpg structure", file_path), score
+                    # Stripes, charts and flat corners can look like damage to the score
+                    return self._check_decoded(file_path, file_type, img), score
+                if broken:
+                    return _defect("Broken jpg structure", file_path), None
+            elif file_type in _STRUCTURE_WALKERS and not _STRUCTURE_WALKERS[file_type](data):
+                return _defect(f"Broken {file_type} structure", file_path), None
+
+            if rank < VALIDATION_LEVELS.index('verify'):
+                return None, None
+
             # Attempt to open and verify the image using PIL
-            img = Image.open(file_path)
-            img.verify()  # This will raise an exception if the file is not a valid image
-            
-            # Additional checks for corruption
+            img = _open_image(data, file_type)
             width, height = img.size
-            if width <= 0 or height <= 0 or width > 10000 or height > 10000:
-                logger.warning(f"Invalid image dimensions: {width}x{height} for {file_path}")
-                return False
-                
-            # Check for expected format
-            if file_type == 'jpg' and img.format not in ['JPEG', 'JPG']:
-                logger.warning(f"File extension mismatch: {file_path} is not a JPEG")
-                return False
-                
-            if file_type == 'png' and img.format != 'PNG':
-                logger.warning(f"File extension mismatch: {file_path} is not a PNG")
-                return False
-                
-            return True
+            if (width <= 0 or height <= 0 or width > self.max_dimension or height > self.max_dimension
+                    or width * height > self.max_pixels):
+                return _defect(f"Invalid image dimensions {width}x{height}", file_path), None
+
+            if not decodes or not self._decode_allowed((width, height, len(img.getbands())), scale):
+                img.verify()  # This will raise an exception if the file is not a valid image
+            else:
+                img.load()  # Raises if the pixel data is truncated or undecodable
+
+            return self._check_decoded(file_path, file_type, img), None
             
         except Exception as e:
-            logger.warning(f"Invalid image file {file_path}: {str(e)}")
-            return False
\ No newline at end of file
+            return _defect(f"Invalid image file ({str(e)})", file_path), None
+
+    def _check_decoded(self, file_path, file_type, img):
+        """Check that an opened image has the format its type promises; returns the defect or None"""
+        if file_type == 'jpg' and img.format not in ['JPEG', 'JPG']:
+            return _defect("File extension mismatch, not a JPEG", file_path)
+            
+        if file_type == 'png' and img.format != 'PNG':
+            return _defect("File extension mismatch, not a PNG", file_path)
+            
+        return None
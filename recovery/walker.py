@@ -0,0 +1,83 @@
+# walker.py
+import os
+import queue
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger("ImageRecovery.Walker")
+
+_DONE = object()
+
+
+def scan_tree(root, match, max_workers=16, skip_dirs=(), max_pending=4096):
+    """
+    Walk a directory tree concurrently, yielding matching files as they are found
+
+    Every directory is listed with os.scandir on a pool thread, so network
+    shares and very large volumes are walked with many listings in flight.
+    The stat data of each match comes from its DirEntry (free on Windows,
+    one call elsewhere) rather than a separate lookup by path.
+
+    Args:
+        root: Directory to walk
+        match: Function taking a file name and returning True for wanted files
+        max_workers: Directories listed concurrently
+        skip_dirs: Absolute directory paths not to descend into
+        max_pending: Matches buffered ahead of the consumer before walkers wait
+
+    Yields:
+        Tuples of (file path, os.stat_result), in no particular order
+    """
+    found = queue.Queue(maxsize=max_pending)
+    stop = threading.Event()
+    lock = threading.Lock()
+    outstanding = [1]
+    skip_dirs = {os.path.abspath(d) for d in skip_dirs}
+
+    def put(item):
+        # Bounded put that gives up once the consumer has gone away
+        while not stop.is_set():
+            try:
+                found.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def scan(path):
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if stop.is_set():
+                        return
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if os.path.abspath(entry.path) not in skip_dirs:
+                                with lock:
+                                    outstanding[0] += 1
+                                pool.submit(scan, entry.path)
+                        elif entry.is_file() and match(entry.name):
+                            put((entry.path, entry.stat()))
+                    except OSError as e:
+                        logger.warning(f"Could not read {entry.path}: {str(e)}")
+        except OSError as e:
+            logger.warning(f"Could not list {path}: {str(e)}")
+        finally:
+            with lock:
+                outstanding[0] -= 1
+                finished = outstanding[0] == 0
+            if finished:
+                put(_DONE)
+
+    pool = ThreadPoolExecutor(max_workers=max_workers)
+    pool.submit(scan, root)
+
+    try:
+        while True:
+            item = found.get()
+            if item is _DONE:
+                return
+            yield item
+    finally:
+        stop.set()
+        pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,62 @@
+import io
+import os
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from recovery.cache import VerificationCache, lookup_content
+from recovery.verifier import FileIntegrityVerifier
+
+
+def _jpeg():
+    pixels = np.random.default_rng(0).integers(0, 256, (96, 128, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+
+def _verify(verifier, tmp_path, name):
+    return verifier.verify_files([{'path': str(tmp_path / name), 'type': 'jpg'}], str(tmp_path / "corrupted"))[0]
+
+
+def test_unchanged_file_is_served_from_the_cache(tmp_path, monkeypatch):
+    (tmp_path / "carved_1.jpg").write_bytes(_jpeg())
+    cache_path = str(tmp_path / "cache.db")
+    first = _verify(FileIntegrityVerifier(workers=1, level='full', cache_path=cache_path), tmp_path, "carved_1.jpg")
+
+    verifier = FileIntegrityVerifier(workers=1, level='full', cache_path=cache_path)
+    monkeypatch.setattr(verifier, '_calculate_file_hash', lambda data: pytest.fail("file was read again"))
+    second = _verify(verifier, tmp_path, "carved_1.jpg")
+
+    assert (second['status'], second['hash'], second['score']) == (first['status'], first['hash'], first['score'])
+    assert verifier.stats['cached'] == 1
+
+
+def test_recarved_file_is_not_decoded_again(tmp_path, monkeypatch):
+    # A rerun re-carves the same bytes to a new file: path, mtime and inode all change
+    data = _jpeg()
+    (tmp_path / "carved_1.jpg").write_bytes(data)
+    cache_path = str(tmp_path / "cache.db")
+    _verify(FileIntegrityVerifier(workers=1, level='full', cache_path=cache_path), tmp_path, "carved_1.jpg")
+    os.remove(tmp_path / "carved_1.jpg")
+    (tmp_path / "carved_7.jpg").write_bytes(data)
+
+    verifier = FileIntegrityVerifier(workers=1, level='full', cache_path=cache_path)
+    monkeypatch.setattr(verifier, '_inspect', lambda *args: pytest.fail("file was decoded again"))
+    result = _verify(verifier, tmp_path, "carved_7.jpg")
+
+    assert (result['status'], result['score']) == ('OK', 1.0)
+    assert verifier.stats['cached'] == 1
+
+
+def test_content_lookup_is_scoped_to_the_settings(tmp_path):
+    cache_path = str(tmp_path / "cache.db")
+    (tmp_path / "a.jpg").write_bytes(b'x')
+    cache = VerificationCache(cache_path)
+    cache.store(str(tmp_path / "a.jpg"), os.stat(tmp_path / "a.jpg"), "full:1", ("abc", False, 1, 0.5, "Only 50% decodable", None))
+    cache.close()
+
+    assert lookup_content(cache_path, "abc", "full:1") == (False, 0.5, "Only 50% decodable", None)
+    assert lookup_content(cache_path, "abc", "draft:1") is None
+    assert lookup_content(str(tmp_path / "missing.db"), "abc", "full:1") is None
@@ -0,0 +1,63 @@
+import sqlite3
+
+from recovery.catalog import RecoveryCatalog
+
+
+def test_catalog_round_trip_keeps_order_and_omits_unset_keys(tmp_path):
+    files = [{'id': f"f{n}", 'path': f"/missing/{n}.jpg", 'type': 'jpg', 'size': n, 'status': 'OK',
+              'width': 640, 'height': 480} for n in (3, 1, 2)]
+    files[1]['status'] = 'Corrupted'
+    files[1]['reason'] = "Truncated"
+
+    with RecoveryCatalog(str(tmp_path / "catalog.db")) as catalog:
+        catalog.add(files)
+        assert list(catalog.iter_files()) == files
+        assert [f['id'] for f in catalog.iter_files(status='OK')] == ['f3', 'f2']
+        assert catalog.status_counts() == {'OK': 2, 'Corrupted': 1}
+
+
+def test_catalog_stores_dimensions_without_opening_files(tmp_path, monkeypatch):
+    image = tmp_path / "a.jpg"
+    image.write_bytes(b'\xff\xd8\xff\xe0')
+    monkeypatch.setattr('builtins.open', lambda *args, **kwargs: (_ for _ in ()).throw(AssertionError(args)))
+
+    with RecoveryCatalog(str(tmp_path / "catalog.db")) as catalog:
+        catalog.add([{'id': 'a', 'path': str(image), 'type': 'jpg', 'status': 'OK'}])
+        assert 'width' not in next(catalog.iter_files())
+
+
+def test_hashes_and_groups_are_set_in_place(tmp_path):
+    with RecoveryCatalog(str(tmp_path / "catalog.db")) as catalog:
+        catalog.add([{'id': n, 'path': n, 'status': 'OK', 'duplicate_group': 1} for n in 'abcde'])
+        catalog.add([{'id': 'x', 'path': 'x', 'status': 'Corrupted'}])
+
+        batches = []
+        for batch in catalog.iter_unhashed(batch_size=2):
+            batches.append([path for _, path in batch])
+            # Files left unhashed (undecodable) are not listed again
+            catalog.set_phashes((row, f"{row:016x}") for row, path in batch if path != 'c')
+        assert batches == [['a', 'b'], ['c', 'd'], ['e']]
+        assert [path for batch in catalog.iter_unhashed() for _, path in batch] == ['c']
+
+        rows = dict(catalog.iter_phashes())
+        catalog.set_duplicate_groups((row, 2) for row in list(rows)[:2])
+
+        assert [(f['id'], f.get('phash'), f.get('duplicate_group')) for f in catalog.iter_files()] == \
+            [('a', f"{1:016x}", 2), ('b', f"{2:016x}", 2), ('c', None, None), ('d', f"{4:016x}", None),
+             ('e', f"{5:016x}", None), ('x', None, None)]
+
+
+def test_catalog_without_phash_column_is_migrated(tmp_path):
+    path = str(tmp_path / "catalog.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE files (id TEXT PRIMARY KEY, path TEXT NOT NULL, original_path TEXT, offset INTEGER, "
+                 "type TEXT, size INTEGER, hash TEXT, status TEXT NOT NULL, reason TEXT, width INTEGER, "
+                 "height INTEGER, score REAL, duplicate_group INTEGER, duplicate_of TEXT, source_mtime INTEGER)")
+    conn.execute("INSERT INTO files (id, path, status) VALUES ('old', 'old.jpg', 'OK')")
+    conn.commit()
+    conn.close()
+
+    with RecoveryCatalog(path) as catalog:
+        catalog.add([{'id': 'new', 'path': 'new.jpg', 'status': 'OK', 'phash': 'abcd'}])
+        assert list(catalog.iter_files()) == [{'id': 'old', 'path': 'old.jpg', 'status': 'OK'},
+                                              {'id': 'new', 'path': 'new.jpg', 'status': 'OK', 'phash': 'abcd'}]
@@ -0,0 +1,55 @@
+import os
+import random
+
+import pytest
+
+from recovery.containers import ContainerImageCarver, carve_container
+from recovery.layout import OutputLayout
+from recovery.signatures import FOOTERS, PNG_SIGNATURE, iter_headers
+
+_HEADERS = {'jpg': b'\xff\xd8\xff\xdb', 'png': PNG_SIGNATURE}
+
+
+def _expected_carves(data, max_carve_size):
+    """Carves found by searching from every header for its footer"""
+    carves = []
+    carve_end = 0
+    for offset, file_type in iter_headers(data):
+        if offset < carve_end:
+            continue
+        end_signature, footer_length = FOOTERS[file_type]
+        footer = data.find(end_signature, offset, min(len(data), offset + max_carve_size))
+        if footer >= 0:
+            carve_end = footer + footer_length
+            carves.append((offset, carve_end - offset, file_type))
+    return carves
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_footer_search_matches_a_search_per_header(tmp_path, seed):
+    # Many headers without footers in range, e.g. SOI-like bytes in a memory dump
+    rng = random.Random(seed)
+    pieces = [_HEADERS[rng.choice('jpg png'.split())] if rng.random() < 0.6
+              else FOOTERS[rng.choice('jpg png'.split())][0] for _ in range(60)]
+    data = b''.join(bytes(rng.randrange(1, 400)) + piece for piece in pieces)
+    (tmp_path / "dump.bin").write_bytes(data)
+
+    carved = carve_container(str(tmp_path / "dump.bin"), OutputLayout(str(tmp_path / "out")), "carved_1", 2000)
+
+    assert [(f['offset'], f['size'], f['type']) for f in carved] == _expected_carves(data, 2000)
+    assert all(os.path.getsize(f['path']) == f['size'] for f in carved)
+
+
+@pytest.mark.skipif(not hasattr(os, 'mkfifo'), reason="needs FIFOs")
+def test_only_regular_files_are_carved(tmp_path):
+    source = tmp_path / "source"
+    source.mkdir()
+    (source / "memory.dmp").write_bytes(bytes(100) + _HEADERS['jpg'] + bytes(100) + b'\xff\xd9')
+    # Opening a FIFO with no writer would block forever
+    os.mkfifo(source / "pipe")
+
+    carver = ContainerImageCarver(max_workers=1)
+    carved = carver.carve_directory(str(source), str(tmp_path / "out"))
+
+    assert [(f['offset'], f['size']) for f in carved] == [(100, 106)]
+    assert carver.file_count == 1
@@ -0,0 +1,61 @@
+import os
+
+from PIL import Image
+
+from recovery.copying import copy_file
+from recovery.existing import ExistingImageExtractor
+
+
+def _make_image(path, color):
+    Image.new('RGB', (32, 32), color).save(path)
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def test_copy_replaces_output_hard_linked_to_source(tmp_path):
+    source = tmp_path / "a.jpg"
+    data = _make_image(source, (200, 10, 10))
+    output = tmp_path / "out.jpg"
+    os.link(source, output)
+
+    copy_file(str(source), str(output))
+
+    assert source.read_bytes() == data
+    assert output.read_bytes() == data
+    assert not os.path.samefile(source, output)
+    assert [p.name for p in tmp_path.iterdir() if p.name.endswith('.tmp')] == []
+
+
+def test_hardlink_copy_onto_existing_link_leaves_no_temp_file(tmp_path):
+    source = tmp_path / "a.jpg"
+    _make_image(source, (10, 200, 10))
+    output = tmp_path / "out.jpg"
+    os.link(source, output)
+
+    assert copy_file(str(source), str(output), hardlink=True) == 'hardlink'
+    assert os.path.samefile(source, output)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["a.jpg", "out.jpg"]
+
+
+def test_copy_run_after_hardlink_run_keeps_sources(tmp_path):
+    src = tmp_path / "src"
+    out = tmp_path / "out"
+    src.mkdir()
+    originals = {name: _make_image(src / name, color)
+                 for name, color in (("a.jpg", (1, 2, 3)), ("b.jpg", (90, 90, 200)))}
+
+    linked = ExistingImageExtractor(hardlink=True, dedup=False).extract_images(str(src), str(out))
+    assert {f['status'] for f in linked} == {'Copied'}
+
+    # A touched source is recopied; the recopy must not write through the earlier hard link
+    for name in originals:
+        os.utime(src / name, ns=(0, 1_000_000_000))
+    copied = ExistingImageExtractor(hardlink=False, dedup=False).extract_images(str(src), str(out))
+
+    assert {f['status'] for f in copied} == {'Copied'}
+    for name, data in originals.items():
+        assert (src / name).read_bytes() == data
+    for file_info in copied:
+        assert not os.path.samefile(file_info['path'], file_info['original_path'])
+        with open(file_info['path'], 'rb') as f:
+            assert f.read() == originals[os.path.basename(file_info['original_path'])]
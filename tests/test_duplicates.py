@@ -0,0 +1,87 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from recovery.catalog import RecoveryCatalog
+from recovery.duplicates import NearDuplicateFinder, _popcount
+
+
+def _photo(seed, size=(192, 128)):
+    rng = np.random.default_rng(seed)
+    # Smooth random field, so re-saves and resizes keep its low frequencies
+    coarse = rng.integers(0, 256, (6, 8, 3), dtype=np.uint8)
+    return Image.fromarray(coarse).resize(size, Image.BICUBIC)
+
+
+def _save(img, path, file_format='JPEG', **options):
+    img.save(path, file_format, **options)
+    return {'id': path.stem, 'path': str(path), 'status': 'OK'}
+
+
+def test_resaves_and_resizes_are_grouped_apart_from_other_images(tmp_path):
+    files = [_save(_photo(0), tmp_path / "a.jpg", quality=95),
+             _save(_photo(0), tmp_path / "a_low.jpg", quality=40),
+             _save(_photo(0).resize((96, 64)), tmp_path / "a_thumb.png", 'PNG'),
+             _save(_photo(1), tmp_path / "b.jpg"),
+             _save(_photo(2), tmp_path / "c.jpg")]
+    files.append(dict(_save(_photo(0), tmp_path / "a_bad.jpg"), status='Corrupted'))
+
+    groups = NearDuplicateFinder(max_workers=1).group(files)
+
+    assert [[f['id'] for f in group] for group in groups] == [['a', 'a_low', 'a_thumb']]
+    assert [f.get('duplicate_group') for f in files] == [1, 1, 1, None, None, None]
+    assert 'phash' not in files[-1]
+
+
+def test_stored_hashes_are_not_decoded_again(tmp_path, monkeypatch):
+    files = [{'id': n, 'path': str(tmp_path / f"{n}.jpg"), 'status': 'OK', 'phash': value}
+             for n, value in (('a', 'ffff0000ffff0000'), ('b', 'ffff0000ffff0001'), ('c', '0000ffff0000ffff'))]
+    monkeypatch.setattr(NearDuplicateFinder, '_hash_files', lambda self, paths: pytest.fail(paths))
+
+    NearDuplicateFinder().group(files)
+
+    assert [f.get('duplicate_group') for f in files] == [1, 1, None]
+
+
+@pytest.mark.parametrize('threshold', [0, 6, 10])
+def test_near_pairs_match_a_brute_force_comparison(threshold):
+    rng = np.random.default_rng(threshold)
+    hashes = rng.integers(0, 2 ** 63, 300, dtype=np.uint64)
+    # Plant neighbours at every distance up to just past the threshold
+    for i, distance in enumerate(range(threshold + 2)):
+        bits = rng.choice(64, distance, replace=False)
+        hashes[2 * i + 1] = hashes[2 * i] ^ np.uint64(sum(1 << int(b) for b in bits))
+
+    pairs = set(NearDuplicateFinder(threshold=threshold)._near_pairs(hashes))
+
+    distances = _popcount(hashes[:, None] ^ hashes[None, :])
+    expected = {(i, j) for i, j in zip(*np.nonzero(distances <= threshold)) if i < j}
+    assert pairs == expected
+    assert len(pairs) >= threshold + 1
+
+
+def test_catalog_groups_are_streamed_and_stored(tmp_path, monkeypatch):
+    files = [_save(_photo(0), tmp_path / "a.jpg", quality=95),
+             _save(_photo(1), tmp_path / "b.jpg"),
+             _save(_photo(0), tmp_path / "a_low.jpg", quality=40),
+             {'id': 'broken', 'path': str(tmp_path / "broken.jpg"), 'status': 'OK'},
+             dict(_save(_photo(1), tmp_path / "b_bad.jpg"), status='Corrupted')]
+    with RecoveryCatalog(str(tmp_path / "catalog.db")) as catalog:
+        catalog.add(files)
+        monkeypatch.setattr(RecoveryCatalog, 'iter_files', lambda *args, **kwargs: pytest.fail("files loaded"))
+
+        assert NearDuplicateFinder(max_workers=1, chunk_size=2).group_catalog(catalog) == 1
+        # A second pass decodes only the image that never hashed
+        hashed = []
+        monkeypatch.setattr(NearDuplicateFinder, '_hash_files',
+                            lambda self, paths: hashed.extend(paths) or (np.zeros(len(paths), np.uint64),
+                                                                         np.zeros(len(paths), bool)))
+        assert NearDuplicateFinder(max_workers=1).group_catalog(catalog) == 1
+        assert hashed == [files[3]['path']]
+
+        monkeypatch.undo()
+        assert [(f['id'], 'phash' in f, f.get('duplicate_group')) for f in catalog.iter_files()] == \
+            [('a', True, 1), ('b', True, None), ('a_low', True, 1), ('broken', False, None),
+             ('b_bad', False, None)]
@@ -0,0 +1,76 @@
+import os
+
+import pytest
+
+from recovery import enumerator
+
+
+def _write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text + "\n")
+
+
+@pytest.fixture
+def fake_linux(tmp_path, monkeypatch):
+    """A SATA disk with two partitions, an unpartitioned USB stick and devices that are never listed"""
+    block = tmp_path / "sys" / "block"
+    _write(block / "sda" / "removable", "0")
+    _write(block / "sda" / "dev", "8:0")
+    _write(block / "sda" / "device" / "vendor", "ATA")
+    _write(block / "sda" / "device" / "model", "Samsung SSD")
+    for n in (1, 2):
+        _write(block / "sda" / f"sda{n}" / "partition", str(n))
+        _write(block / "sda" / f"sda{n}" / "dev", f"8:{n}")
+    _write(block / "sdb" / "removable", "1")
+    _write(block / "sdb" / "dev", "8:16")
+    _write(block / "loop0" / "dev", "7:0")
+    _write(block / "ram0" / "dev", "1:0")
+
+    _write(tmp_path / "partitions", "major minor  #blocks  name\n\n"
+                                    "   8        0  1000000 sda\n   8        1   600000 sda1\n"
+                                    "   8        2   400000 sda2\n   8       16    32000 sdb\n"
+                                    "   7        0        0 loop0\n   1        0    65536 ram0")
+
+    mount_point = tmp_path / "my photos"
+    mount_point.mkdir()
+    (tmp_path / "stick").mkdir()
+    escaped = str(mount_point).replace(" ", "\\040")
+    _write(tmp_path / "mountinfo", f"36 25 8:1 / {escaped} rw,relatime shared:1 - ext4 /dev/sda1 rw\n"
+                                   f"37 25 8:2 /backup /srv/backup rw - ext4 /dev/sda2 rw\n"
+                                   f"38 25 8:16 / {tmp_path / 'stick'} rw - vfat /dev/sdb rw")
+
+    labels = tmp_path / "by-label"
+    labels.mkdir()
+    os.symlink("../../sda2", labels / "Holiday\\x20Pics")
+
+    monkeypatch.setattr(enumerator, '_SYS_BLOCK', str(block))
+    monkeypatch.setattr(enumerator, '_PROC_PARTITIONS', str(tmp_path / "partitions"))
+    monkeypatch.setattr(enumerator, '_MOUNTINFO', str(tmp_path / "mountinfo"))
+    monkeypatch.setattr(enumerator, '_BY_LABEL', str(labels))
+    return str(mount_point)
+
+
+def test_linux_drives_are_listed_from_sysfs_and_procfs(fake_linux):
+    drives = enumerator._list_linux_drives()
+
+    summary = [(d['path'], d['device_id'], d['label'], d['filesystem'], d['type']) for d in drives]
+    assert summary == [
+        (fake_linux, "/dev/sda", 'No Label', 'ext4', 'Fixed'),
+        ("/dev/sda2", "/dev/sda", "Holiday Pics", 'Unmounted', 'Partition'),
+        (os.path.join(os.path.dirname(fake_linux), "stick"), "/dev/sdb", 'No Label', 'vfat', 'Removable'),
+        ("/dev/sda", "/dev/sda", "Physical Disk sda", 'Raw Disk', 'Physical Drive'),
+        ("/dev/sdb", "/dev/sdb", "Physical Disk sdb", 'Raw Disk', 'Physical Drive'),
+    ]
+    usage = os.statvfs(fake_linux)
+    assert drives[0]['size_bytes'] == usage.f_blocks * usage.f_frsize
+    assert drives[1]['size_bytes'] == 400000 * 1024
+    assert (drives[3]['model'], drives[4]['model']) == ("ATA Samsung SSD", 'Unknown Model')
+    assert drives[3]['size_bytes'] == 1000000 * 1024
+
+
+def test_mount_point_is_read_through_its_block_device(fake_linux, tmp_path, monkeypatch):
+    monkeypatch.setattr(enumerator.os.path, 'realpath', lambda path: path.replace("/sys/dev/block/8:1", "/x/sda1"))
+    monkeypatch.setattr(enumerator.os.path, 'exists', lambda path: path == "/dev/sda1")
+
+    assert enumerator.block_device_for(fake_linux) == "/dev/sda1"
+    assert enumerator.block_device_for(str(tmp_path)) is None
@@ -0,0 +1,154 @@
+import os
+
+import pytest
+from PIL import Image
+
+from recovery.catalog import CATALOG_NAME, RecoveryCatalog
+from recovery.existing import ExistingImageExtractor
+from recovery.layout import MANIFEST_BATCH, MANIFEST_NAME, OutputLayout
+from recovery.main import RecoveryWorker
+
+
+def _make_image(path, color, size=(32, 32)):
+    Image.new('RGB', size, color).save(path)
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def _by_source(files):
+    return {os.path.basename(f['original_path']): f for f in files}
+
+
+def test_changed_source_does_not_leave_stale_duplicate_target(tmp_path):
+    src = tmp_path / "src"
+    out = tmp_path / "out"
+    src.mkdir()
+    content_a = _make_image(src / "a.jpg", (200, 10, 10))
+    ExistingImageExtractor(copy_workers=1).extract_images(str(src), str(out))
+
+    # a.jpg now holds B, and a new c.jpg holds a.jpg's old content A
+    (src / "c.jpg").write_bytes(content_a)
+    (src / "a.jpg").write_bytes(content_a[:-2] + b'\x00\xff\xd9')
+    os.utime(src / "a.jpg", ns=(0, 1_000_000_000))
+    files = _by_source(ExistingImageExtractor(copy_workers=1).extract_images(str(src), str(out)))
+
+    assert files['c.jpg']['status'] == 'Copied'
+    with open(files['c.jpg']['path'], 'rb') as f:
+        assert f.read() == content_a
+    with open(files['a.jpg']['path'], 'rb') as f:
+        assert f.read() == (src / "a.jpg").read_bytes()
+
+
+def test_only_sources_with_colliding_sizes_are_hashed(tmp_path, monkeypatch):
+    src = tmp_path / "src"
+    src.mkdir()
+    _make_image(src / "small.png", (1, 2, 3), (8, 8))
+    _make_image(src / "large.png", (1, 2, 3), (64, 64))
+    data = _make_image(src / "a.png", (9, 9, 9), (16, 16))
+    (src / "copy_of_a.png").write_bytes(data)
+
+    hashed = []
+    original_hash = ExistingImageExtractor._hash_file
+    monkeypatch.setattr(ExistingImageExtractor, '_hash_file',
+                        lambda self, path: hashed.append(os.path.basename(path)) or original_hash(self, path))
+    files = _by_source(ExistingImageExtractor().extract_images(str(src), str(tmp_path / "out")))
+
+    # The second of the pair hashes its source and the stored copy (from its source or output)
+    assert len(hashed) == 2 and {"a.png", "copy_of_a.png"} & set(hashed)
+    assert {files['a.png']['status'], files['copy_of_a.png']['status']} == {'Copied', 'Duplicate'}
+    assert files['small.png']['status'] == files['large.png']['status'] == 'Copied'
+
+
+def test_touched_identical_source_is_not_recopied(tmp_path):
+    src = tmp_path / "src"
+    out = tmp_path / "out"
+    src.mkdir()
+    _make_image(src / "a.png", (5, 6, 7))
+    first = _by_source(ExistingImageExtractor(copy_workers=1).extract_images(str(src), str(out)))
+
+    os.utime(src / "a.png", ns=(0, 1_000_000_000))
+    second = _by_source(ExistingImageExtractor(copy_workers=1).extract_images(str(src), str(out)))
+
+    assert second['a.png']['status'] == 'Unchanged'
+    assert second['a.png']['id'] == first['a.png']['id']
+    assert OutputLayout.load_manifest(str(out))[first['a.png']['id']]['source_mtime'] == 1_000_000_000
+
+
+def test_sniff_mode_identifies_images_by_content(tmp_path):
+    src = tmp_path / "src"
+    src.mkdir()
+    jpeg = _make_image(src / "a.jpg", (1, 2, 3))
+    os.rename(src / "a.jpg", src / "DSC0001.dat")
+    _make_image(src / "b.png", (4, 5, 6))
+    os.rename(src / "b.png", src / "noext")
+    (src / "fake.jpg").write_text("not an image at all")
+
+    files = _by_source(ExistingImageExtractor(sniff=True, sniff_batch=2).extract_images(str(src), str(tmp_path / "out")))
+
+    assert {name: f['type'] for name, f in files.items()} == {'DSC0001.dat': 'jpg', 'noext': 'png'}
+    with open(files['DSC0001.dat']['path'], 'rb') as f:
+        assert f.read() == jpeg
+
+
+def test_pipelined_extraction_through_small_queues_accounts_every_file(tmp_path):
+    src = tmp_path / "src"
+    for n in range(40):
+        (src / f"d{n % 5}").mkdir(parents=True, exist_ok=True)
+        _make_image(src / f"d{n % 5}" / f"{n}.png", (n, 0, 0), (8 + n, 8))
+    progress = []
+
+    extractor = ExistingImageExtractor(dedup=False, copy_workers=4, queue_size=2)
+    files = extractor.extract_images(str(src), str(tmp_path / "out"), progress=progress.append)
+
+    assert len(files) == 40 and all(f['status'] == 'Copied' for f in files)
+    assert len({f['path'] for f in files}) == 40
+    assert (extractor.stats['files'], extractor.stats['workers']) == (40, 4)
+    assert extractor.stats['bytes'] == sum(f['size'] for f in files)
+    assert progress == sorted(progress) and all(percent <= 90 for percent in progress)
+    assert len(OutputLayout.load_manifest(str(tmp_path / "out"))) == 40
+
+
+def test_duplicates_are_recorded_and_not_rehashed_on_the_next_run(tmp_path, monkeypatch):
+    src = tmp_path / "src"
+    out = str(tmp_path / "out")
+    src.mkdir()
+    data = _make_image(src / "a.png", (7, 7, 7))
+    (src / "b.png").write_bytes(data)
+    worker = RecoveryWorker()
+
+    def run():
+        layout = OutputLayout(out)
+        files = worker._scan_target("Existing Images", str(src), str(src), out, layout)
+        worker._verify_target("Existing Images", str(src), files, out, layout)
+        with RecoveryCatalog(os.path.join(out, CATALOG_NAME)) as catalog:
+            return _by_source(catalog.iter_files()), OutputLayout.load_manifest(out)
+
+    catalogued, manifest = run()
+    assert sorted(f['status'] for f in catalogued.values()) == ['Copied', 'Duplicate']
+    duplicate = next(f for f in catalogued.values() if f['status'] == 'Duplicate')
+    original = next(f for f in catalogued.values() if f['status'] == 'Copied')
+    assert duplicate['duplicate_of'] == original['id'] and duplicate['path'] == original['path']
+    assert manifest[duplicate['id']]['duplicate_of'] == original['id']
+
+    monkeypatch.setattr(ExistingImageExtractor, '_hash_file', lambda self, path: pytest.fail(path))
+    catalogued, manifest = run()
+    assert {f['id'] for f in catalogued.values()} == {duplicate['id'], original['id']}
+    assert manifest[duplicate['id']]['duplicate_of'] == original['id']
+    # Only one copy of the content is stored
+    assert sorted(os.listdir(out)) == sorted([os.path.basename(original['path']), MANIFEST_NAME, CATALOG_NAME])
+
+
+def test_extraction_records_the_manifest_in_batches(tmp_path, monkeypatch):
+    src = tmp_path / "src"
+    src.mkdir()
+    for n in range(MANIFEST_BATCH + 5):
+        (src / f"{n}.jpg").write_bytes(b'\xff\xd8\xff\xe0' + n.to_bytes(4, 'big') + b'\xff\xd9')
+    layout = OutputLayout(str(tmp_path / "out"))
+    writes = []
+    record = layout.record
+    monkeypatch.setattr(layout, 'record', lambda files: (writes.append(len(files)), record(files)))
+
+    files = ExistingImageExtractor(copy_workers=4).extract_images(str(src), str(tmp_path / "out"), layout)
+
+    assert writes == [MANIFEST_BATCH, 5]
+    assert len(OutputLayout.load_manifest(str(tmp_path / "out"))) == len(files) == MANIFEST_BATCH + 5
@@ -0,0 +1,84 @@
+import datetime
+import io
+
+from PIL import Image
+
+from recovery.existing import ExistingImageExtractor
+from recovery.filters import MetadataFilter
+from recovery.headers import read_metadata
+
+
+def _photo(path, size=(64, 48), model=None, taken=None, original=None):
+    exif = Image.Exif()
+    if model:
+        exif[0x0110] = model
+    if taken:
+        exif[0x0132] = taken
+    if original:
+        exif.get_ifd(0x8769)[0x9003] = original
+    Image.new('RGB', size, (90, 120, 150)).save(path, 'JPEG', exif=exif)
+    return str(path)
+
+
+class _CountingReader(io.BytesIO):
+    def __init__(self, data):
+        super().__init__(data)
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.bytes_read += len(data)
+        return data
+
+
+def test_header_metadata_is_read_without_the_image_data(tmp_path):
+    path = _photo(tmp_path / "a.jpg", size=(1200, 800), model="Canon EOS 5D", taken="2019:01:01 00:00:00",
+                  original="2018:06:30 12:34:56")
+    with open(path, 'rb') as f:
+        reader = _CountingReader(f.read() + b'\x00' * (1 << 20))
+
+    metadata = read_metadata(reader, 'jpg')
+
+    assert (metadata['width'], metadata['height'], metadata['channels']) == (1200, 800, 3)
+    assert metadata['camera_model'] == "Canon EOS 5D"
+    assert metadata['date_taken'] == datetime.datetime(2018, 6, 30, 12, 34, 56)
+    assert reader.bytes_read < 16 * 1024
+
+
+def test_each_bound_rejects_what_it_should(tmp_path):
+    photo = _photo(tmp_path / "a.jpg", size=(640, 480), model="NIKON D750", taken="2020:03:04 05:06:07")
+    png = str(tmp_path / "b.png")
+    Image.new('RGB', (640, 480)).save(png)
+
+    bounds = {
+        'min_width': (MetadataFilter(min_width=640), MetadataFilter(min_width=641)),
+        'max_height': (MetadataFilter(max_height=480), MetadataFilter(max_height=479)),
+        'taken_after': (MetadataFilter(taken_after=datetime.datetime(2020, 1, 1)),
+                        MetadataFilter(taken_after=datetime.datetime(2021, 1, 1))),
+        'taken_before': (MetadataFilter(taken_before=datetime.datetime(2021, 1, 1)),
+                         MetadataFilter(taken_before=datetime.datetime(2020, 1, 1))),
+        'camera_model': (MetadataFilter(camera_model="nikon"), MetadataFilter(camera_model="canon")),
+    }
+    for name, (matching, rejecting) in bounds.items():
+        assert matching.matches(photo, 'jpeg'), name
+        assert not rejecting.matches(photo, 'jpeg'), name
+
+    # Without a capture date or model a date or model bound never matches
+    assert MetadataFilter(min_width=100).matches(png, 'png')
+    assert not MetadataFilter(taken_after=datetime.datetime(2000, 1, 1)).matches(png, 'png')
+    assert not MetadataFilter(camera_model="nikon").matches(png, 'png')
+    assert MetadataFilter().matches(str(tmp_path / "missing.jpg"), 'jpg')
+    assert not MetadataFilter(min_width=1).matches(str(tmp_path / "missing.jpg"), 'jpg')
+
+
+def test_extraction_copies_only_matching_images(tmp_path):
+    src = tmp_path / "src"
+    src.mkdir()
+    _photo(src / "large.jpg", size=(800, 600))
+    _photo(src / "small.jpg", size=(80, 60))
+
+    extractor = ExistingImageExtractor(metadata_filter=MetadataFilter(min_width=640))
+    files = extractor.extract_images(str(src), str(tmp_path / "out"))
+
+    assert [f['original_path'] for f in files] == [str(src / "large.jpg")]
+    assert extractor.filtered_count == 1
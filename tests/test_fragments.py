@@ -0,0 +1,56 @@
+import io
+import random
+import time
+
+import numpy as np
+from PIL import Image
+
+from recovery.fragments import _PROBE_WINDOW, _unstuffed_bits, reassemble_jpeg
+from recovery.headers import JpegScan
+
+CLUSTER = 4096
+
+
+def _noisy_jpeg(width, height, seed=0):
+    """Baseline JPEG without restart markers whose scan does not compress away"""
+    rng = np.random.default_rng(seed)
+    gradient = np.linspace(0, 255, width)[None, :, None] * np.ones((height, 1, 3))
+    pixels = np.clip(gradient + rng.normal(0, 40, (height, width, 3)), 0, 255).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def _split_with_gap(jpeg, gap_clusters, seed=2):
+    split = (len(jpeg) // 2) // CLUSTER * CLUSTER
+    gap = random.Random(seed).randbytes(CLUSTER * gap_clusters)
+    return jpeg[:split] + gap + jpeg[split:] + random.Random(seed + 1).randbytes(CLUSTER), split, len(gap)
+
+
+def test_truncated_scan_is_not_an_error():
+    jpeg = _noisy_jpeg(320, 240)
+    scan = JpegScan.parse(jpeg)
+    rng = random.Random(1)
+    for _ in range(40):
+        cut = rng.randrange(scan.scan_start + 1, len(jpeg) - 2)
+        decoded, _, error = scan.decode(_unstuffed_bits(jpeg[scan.scan_start:cut]), scan.mcu_count)
+        assert not error, f"cut at {cut} reported as an error after {decoded} MCUs"
+        assert decoded < scan.mcu_count
+
+
+def test_reassembles_jpeg_larger_than_probe_window():
+    jpeg = _noisy_jpeg(640, 480)
+    assert len(jpeg) - len(jpeg) // 2 > _PROBE_WINDOW
+    data, split, gap = _split_with_gap(jpeg, 3)
+
+    assert reassemble_jpeg(data, 0, CLUSTER) == (split, split + gap, len(jpeg) + gap)
+
+
+def test_deadline_bounds_full_candidate_validation():
+    jpeg = _noisy_jpeg(1600, 1200)
+    data, _, _ = _split_with_gap(jpeg, 25)
+
+    budget = 0.3
+    started = time.monotonic()
+    reassemble_jpeg(data, 0, CLUSTER, deadline=started + budget)
+    assert time.monotonic() - started < budget + 0.5
@@ -0,0 +1,58 @@
+import os
+
+import pytest
+
+from recovery.layout import MANIFEST_NAME, OutputLayout
+
+
+@pytest.mark.parametrize('scheme, shard_depth', [('flat', 0), ('hash', 2), ('offset', 1)])
+def test_path_for_shards_by_scheme(tmp_path, scheme, shard_depth):
+    layout = OutputLayout(str(tmp_path), scheme)
+
+    path = layout.path_for("recovered_7", 'jpg', offset=3 * 1024 ** 3)
+
+    assert os.path.basename(path) == "recovered_7.jpg"
+    shard = os.path.relpath(os.path.dirname(path), tmp_path)
+    assert (0 if shard == '.' else len(shard.split(os.sep))) == shard_depth
+    assert os.path.isdir(os.path.dirname(path))
+    if scheme == 'offset':
+        assert os.path.dirname(path) == os.path.join(str(tmp_path), "000003")
+
+
+def test_manifest_round_trip_with_superseding_entries(tmp_path):
+    layout = OutputLayout(str(tmp_path), 'hash')
+    first = {'id': 'a', 'path': layout.path_for('a', 'jpg'), 'type': 'jpg', 'size': 10, 'status': 'Recovered',
+             'offset': 4096}
+    second = {'id': 'b', 'path': layout.path_for('b', 'png'), 'type': 'png', 'size': 20, 'status': 'OK',
+              'score': 1.0, 'duplicate_group': 2}
+    layout.record([first, second, {'path': 'no-id.jpg'}])
+    quarantined = dict(first, path=os.path.join(str(tmp_path), "corrupted", "a.jpg"), status='Corrupted',
+                       reason="Truncated")
+    layout.record([quarantined])
+
+    manifest = OutputLayout.load_manifest(str(tmp_path))
+
+    assert manifest == {'a': quarantined, 'b': second}
+
+
+def test_torn_final_manifest_line_is_ignored(tmp_path):
+    layout = OutputLayout(str(tmp_path))
+    entry = {'id': 'a', 'path': layout.path_for('a', 'jpg'), 'status': 'Recovered'}
+    layout.record([entry])
+    with open(tmp_path / MANIFEST_NAME, 'a', encoding='utf-8') as f:
+        f.write('{"id": "b", "pa')
+
+    assert OutputLayout.load_manifest(str(tmp_path)) == {'a': entry}
+
+
+def test_rewrite_leaves_one_entry_per_listed_file(tmp_path):
+    layout = OutputLayout(str(tmp_path))
+    files = [{'id': n, 'path': layout.path_for(n, 'jpg'), 'status': 'Recovered'} for n in 'abc']
+    layout.record(files)
+    layout.record([dict(files[0], status='OK')])
+
+    layout.rewrite(iter([dict(files[0], status='OK'), files[1]]))
+
+    lines = (tmp_path / MANIFEST_NAME).read_text().splitlines()
+    assert len(lines) == 2 and not (tmp_path / (MANIFEST_NAME + ".tmp")).exists()
+    assert OutputLayout.load_manifest(str(tmp_path)) == {'a': dict(files[0], status='OK'), 'b': files[1]}
@@ -0,0 +1,210 @@
+import gzip
+import io
+import lzma
+import os
+from pathlib import Path
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from recovery.catalog import CATALOG_NAME, RecoveryCatalog
+from recovery.containers import carve_container
+from recovery.existing import ExistingImageExtractor
+from recovery.layout import MANIFEST_BATCH, MANIFEST_NAME, OutputLayout
+from recovery.main import RecoveryWorker, _data_extents
+
+
+def _jpeg(seed=0):
+    pixels = np.random.default_rng(seed).integers(0, 256, (16, 16, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+
+def _disk_image(path, images, gap=4096):
+    """Write images separated by zeroed gaps; returns their offsets"""
+    offsets = []
+    with open(path, 'wb') as f:
+        for data in images:
+            f.write(b'\x00' * gap)
+            offsets.append(f.tell())
+            f.write(data)
+        f.write(b'\x00' * gap)
+    return offsets
+
+
+def test_sparse_image_is_scanned_without_reading_its_holes(tmp_path, monkeypatch):
+    path = tmp_path / "sparse.img"
+    offsets = [1 << 20, 40 << 20]
+    with open(path, 'wb') as f:
+        f.truncate(64 << 20)
+        for offset in offsets:
+            f.seek(offset)
+            f.write(_jpeg())
+    extents = _data_extents(str(path))
+    if not extents or extents == [(0, 64 << 20)]:
+        pytest.skip("file system does not report holes")
+
+    reads = []
+
+    class CountingFile(io.FileIO):
+        def read(self, size=-1):
+            data = super().read(size)
+            reads.append(len(data))
+            return data
+
+    monkeypatch.setattr('recovery.main.open', lambda name, mode='r': CountingFile(name, 'r')
+                        if name == str(path) else open(name, mode), raising=False)
+    files = RecoveryWorker().raw_recovery(str(path), str(tmp_path / "out"))
+
+    assert [f['offset'] for f in files] == offsets
+    assert all(f['size'] == len(_jpeg()) for f in files)
+    # The data extents and a compression check, none of the 64 MiB of holes
+    assert sum(reads) <= sum(end - start for start, end in extents) + 6
+
+
+@pytest.mark.parametrize('compress', [gzip.compress, lzma.compress])
+def test_compressed_image_is_carved_at_uncompressed_offsets(tmp_path, compress):
+    images = [_jpeg(0), _jpeg(1)]
+    offsets = _disk_image(tmp_path / "disk.img", images, gap=3000)
+    (tmp_path / "disk.img.z").write_bytes(compress((tmp_path / "disk.img").read_bytes()))
+
+    files = RecoveryWorker().raw_recovery(str(tmp_path / "disk.img.z"), str(tmp_path / "out"))
+
+    assert [f['offset'] for f in files] == offsets
+    assert [Path(f['path']).read_bytes() for f in files] == images
+
+
+def test_raw_recovery_records_the_manifest_in_batches(tmp_path, monkeypatch):
+    count = MANIFEST_BATCH + 10
+    offsets = _disk_image(tmp_path / "disk.img", [_jpeg()] * count, gap=1024)
+    output_dir = str(tmp_path / "out")
+    layout = OutputLayout(output_dir)
+    writes = []
+    record = layout.record
+    monkeypatch.setattr(layout, 'record', lambda files: (writes.append(len(files)), record(files)))
+
+    files = RecoveryWorker().raw_recovery(str(tmp_path / "disk.img"), output_dir, layout=layout)
+
+    assert writes == [MANIFEST_BATCH, 10]
+    manifest = OutputLayout.load_manifest(output_dir)
+    assert [manifest[f['id']]['offset'] for f in files] == offsets
+    assert all(manifest[f['id']]['path'] == f['path'] for f in files)
+
+
+def test_verify_target_groups_and_records_from_the_catalog(tmp_path):
+    _disk_image(tmp_path / "disk.img", [_jpeg(0), _jpeg(1), _jpeg(0)])
+    output_dir = str(tmp_path / "out")
+    layout = OutputLayout(output_dir)
+    worker = RecoveryWorker(verify_workers=1)
+    files = worker.raw_recovery(str(tmp_path / "disk.img"), output_dir, layout=layout)
+
+    count = worker._verify_target("Raw Recovery", str(tmp_path / "disk.img"), files, output_dir, layout)
+
+    assert count == 3
+    with RecoveryCatalog(os.path.join(output_dir, CATALOG_NAME)) as catalog:
+        catalogued = list(catalog.iter_files())
+    assert [(f['width'], f['height']) for f in catalogued] == [(16, 16)] * 3
+    assert all('phash' in f for f in catalogued)
+    assert [f.get('duplicate_group') for f in catalogued] == [1, None, 1]
+    manifest = OutputLayout.load_manifest(output_dir)
+    assert [manifest[f['id']].get('duplicate_group') for f in catalogued] == [1, None, 1]
+
+
+def test_batch_catalogs_every_job_and_groups_across_them(tmp_path):
+    _disk_image(tmp_path / "a.img", [_jpeg(0), _jpeg(1)])
+    _disk_image(tmp_path / "b.img", [_jpeg(0)])
+    worker = RecoveryWorker(verify_workers=2)
+    completed = []
+    worker.recovery_complete.connect(lambda *args: completed.append(args))
+    worker.error_occurred.connect(pytest.fail)
+    output_dir = str(tmp_path / "out")
+
+    worker.run_batch([("Raw Recovery", str(tmp_path / "a.img"), 'a'),
+                      ("Raw Recovery", str(tmp_path / "b.img"), 'b')], output_dir)
+
+    assert completed == [(3, output_dir, os.path.join(output_dir, "recovery_report.html"))]
+    with RecoveryCatalog(os.path.join(output_dir, CATALOG_NAME)) as catalog:
+        catalogued = [(f['id'].split('_', 1)[0], f.get('duplicate_group')) for f in catalog.iter_files()]
+    assert catalogued == [('1', 1), ('1', None), ('2', 1)]
+
+
+class _Slots:
+    """Write-slot stand-in recording how often it was taken and whether it is held"""
+
+    def __init__(self):
+        self.taken = 0
+        self.held = False
+
+    def __enter__(self):
+        self.taken += 1
+        self.held = True
+
+    def __exit__(self, *exc_info):
+        self.held = False
+
+
+def test_raw_carves_hold_a_write_slot_only_while_writing(tmp_path, monkeypatch):
+    _disk_image(tmp_path / "disk.img", [_jpeg(0), _jpeg(1)])
+    worker = RecoveryWorker()
+    worker.write_slots = slots = _Slots()
+    reads = []
+
+    class CheckedFile(io.FileIO):
+        def read(self, size=-1):
+            reads.append(slots.held)
+            return super().read(size)
+
+    disk = str(tmp_path / "disk.img")
+    monkeypatch.setattr('recovery.main.open', lambda name, mode='r': CheckedFile(name, 'r')
+                        if name == disk else open(name, mode), raising=False)
+    files = worker.raw_recovery(disk, str(tmp_path / "out"))
+
+    assert len(files) == 2 and slots.taken == 2
+    assert reads and not any(reads)
+
+
+def test_copies_and_container_carves_take_write_slots(tmp_path):
+    src = tmp_path / "src"
+    src.mkdir()
+    for n in range(3):
+        (src / f"{n}.jpg").write_bytes(_jpeg(n))
+    (src / "dump.bin").write_bytes(b'\x00' * 100 + _jpeg(5) + b'\x00' * 100 + _jpeg(6))
+    slots = _Slots()
+
+    ExistingImageExtractor(write_slots=slots).extract_images(str(src), str(tmp_path / "copies"))
+    assert slots.taken == 3
+
+    carved = carve_container(str(src / "dump.bin"), OutputLayout(str(tmp_path / "carves")), "carved_1",
+                             1 << 20, write_slots=slots)
+    assert len(carved) == 2 and slots.taken == 5
+
+
+def test_batch_write_slots_reach_container_carving_workers(tmp_path):
+    src = tmp_path / "src"
+    src.mkdir()
+    (src / "photo.jpg").write_bytes(_jpeg(0))
+    (src / "dump.bin").write_bytes(b'\x00' * 100 + _jpeg(1))
+    worker = RecoveryWorker(verify_workers=2)
+    completed = []
+    worker.recovery_complete.connect(lambda *args: completed.append(args[0]))
+    worker.error_occurred.connect(pytest.fail)
+
+    worker.run_batch([("Existing Images", str(src), 'a'), ("Container Scan", str(src), 'b')], str(tmp_path / "out"))
+
+    assert completed == [2]
+
+
+def test_rerun_manifest_lists_only_the_latest_run_once(tmp_path):
+    output_dir = str(tmp_path / "out")
+    worker = RecoveryWorker(verify_workers=1)
+    for images in ([_jpeg(0), _jpeg(1), _jpeg(2)], [_jpeg(3)]):
+        _disk_image(tmp_path / "disk.img", images)
+        layout = OutputLayout(output_dir)
+        files = worker.raw_recovery(str(tmp_path / "disk.img"), output_dir, layout=layout)
+        worker._verify_target("Raw Recovery", str(tmp_path / "disk.img"), files, output_dir, layout)
+
+    lines = (tmp_path / "out" / MANIFEST_NAME).read_text().splitlines()
+    assert len(lines) == 1
+    assert OutputLayout.load_manifest(output_dir)['recovered_0']['status'] == 'OK'
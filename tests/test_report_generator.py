@@ -0,0 +1,52 @@
+import json
+import re
+
+from recovery.report_generator import ReportGenerator
+
+
+def test_partial_files_are_listed_best_first(tmp_path):
+    files = [{'path': str(tmp_path / f"{name}.jpg"), 'type': 'jpg', 'size': 10, 'status': status, 'score': score,
+              'reason': "Only some decodable"}
+             for name, status, score in (('low', 'Partial', 0.2), ('ok', 'OK', 1.0), ('high', 'Partial', 0.9))]
+    report = tmp_path / "report.html"
+
+    ReportGenerator(thumbnails=False).generate_report(files, str(report), "Raw Recovery", "/dev/test")
+
+    partial = (tmp_path / "report_pages" / "partial.html").read_text()
+    assert partial.index("high.jpg") < partial.index("low.jpg") and "ok.jpg" not in partial
+    assert 'report_pages/partial.html">2</a>' in report.read_text()
+    assert json.loads((tmp_path / "report.json").read_text())['summary']['partial'] == 2
+
+
+def _listing(n, tmp_path):
+    for i in range(1, n + 1):
+        yield {'path': str(tmp_path / f"file_{i}.jpg"), 'type': 'jpg', 'size': 100, 'status': 'OK'}
+
+
+def _page_rows(page):
+    return [int(row) for row in re.findall(r'<tr>\s*<td>(\d+)</td>', page.read_text())]
+
+
+def test_files_are_paged_from_a_single_pass_over_an_iterator(tmp_path):
+    report = tmp_path / "report.html"
+
+    ReportGenerator(rows_per_page=3, thumbnails=False).generate_report(_listing(7, tmp_path), str(report),
+                                                                       "Raw Recovery", "/dev/test")
+
+    pages = sorted((tmp_path / "report_pages").glob("page_*.html"))
+    assert [_page_rows(page) for page in pages] == [[1, 2, 3], [4, 5, 6], [7]]
+    assert 'Next' in pages[0].read_text() and 'Previous' not in pages[0].read_text()
+    assert 'Previous' in pages[2].read_text() and 'Next' not in pages[2].read_text()
+    assert re.findall(r'<td>(\d+)&ndash;(\d+)</td>', report.read_text()) == [('1', '3'), ('4', '6'), ('7', '7')]
+
+
+def test_full_last_page_has_no_next_link_and_stale_pages_are_removed(tmp_path):
+    report = tmp_path / "report.html"
+    generator = ReportGenerator(rows_per_page=3, thumbnails=False)
+    generator.generate_report(_listing(10, tmp_path), str(report), "Raw Recovery", "/dev/test")
+
+    generator.generate_report(_listing(6, tmp_path), str(report), "Raw Recovery", "/dev/test")
+
+    pages = sorted(page.name for page in (tmp_path / "report_pages").glob("*.html"))
+    assert pages == ["page_00001.html", "page_00002.html"]
+    assert 'Next' not in (tmp_path / "report_pages" / pages[-1]).read_text()
@@ -0,0 +1,30 @@
+import hashlib
+
+from PIL import Image
+
+from recovery.thumbnails import ThumbnailGenerator
+
+
+def _image(path, size, file_format='JPEG'):
+    Image.new('RGB', size, (30, 60, 90)).save(path, file_format)
+    return {'path': str(path), 'hash': hashlib.sha256(path.read_bytes()).hexdigest()}
+
+
+def test_thumbnails_are_rendered_once_and_reused_by_hash(tmp_path):
+    files = [_image(tmp_path / "a.jpg", (640, 480)), _image(tmp_path / "b.png", (100, 300), 'PNG')]
+    unhashed = {'path': files[0]['path']}
+    broken = tmp_path / "broken.jpg"
+    broken.write_bytes(b'\xff\xd8\xff\xe0 not really')
+    cache_dir = str(tmp_path / "thumbnails")
+
+    with ThumbnailGenerator(cache_dir, size=64, max_workers=2, chunk_size=1) as generator:
+        first = generator.thumbnails(files + [{'path': str(broken)}, {'path': str(tmp_path / "missing.jpg")}])
+    assert first[2:] == [None, None]
+    assert [Image.open(path).size for path in first[:2]] == [(64, 48), (21, 64)]
+    assert generator.rendered_count == 2
+
+    with ThumbnailGenerator(cache_dir, size=64, max_workers=1) as generator:
+        again = generator.thumbnails(files + [unhashed])
+    # Hashed files are looked up without being read; the unhashed copy is hashed and finds the same thumbnail
+    assert again == first[:2] + [first[0]]
+    assert (generator.cached_count, generator.rendered_count) == (2, 1)
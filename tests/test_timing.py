@@ -0,0 +1,55 @@
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from recovery.report_generator import ReportGenerator
+from recovery.timing import StageTimer
+
+
+def test_stage_records_what_its_body_filled_in_even_on_error():
+    timer = StageTimer()
+    with timer.stage("scan", "/dev/test") as stage:
+        time.sleep(0.02)
+        stage.update(bytes_read=4096, items=3)
+    with pytest.raises(ValueError), timer.stage("verify"):
+        raise ValueError
+
+    scan, verify = timer.stages
+    assert (scan['stage'], scan['target'], scan['bytes_read'], scan['bytes_written'], scan['items']) == \
+        ("scan", "/dev/test", 4096, 0, 3)
+    assert scan['wall_seconds'] >= 0.02 and scan['cpu_seconds'] >= 0
+    assert verify['stage'] == "verify"
+
+
+def test_report_lists_every_stage_including_its_own(tmp_path):
+    timer = StageTimer()
+    with timer.stage("scan", "/dev/test") as stage:
+        stage['items'] = 1
+    files = [{'path': str(tmp_path / "a.jpg"), 'type': 'jpg', 'size': 10, 'status': 'OK'}]
+
+    ReportGenerator(thumbnails=False).generate_report(files, str(tmp_path / "report.html"), "Raw Recovery",
+                                                      "/dev/test", timer=timer)
+
+    performance = json.loads((tmp_path / "report.json").read_text())['performance']
+    assert [(stage['stage'], stage['items']) for stage in performance] == [("scan", 1), ("report", 1)]
+    assert performance[1]['bytes_written'] > 0
+    assert "<h2>Performance</h2>" in (tmp_path / "report.html").read_text()
+
+
+def _spin(seconds):
+    started = time.process_time()
+    while time.process_time() - started < seconds:
+        pass
+    return time.process_time() - started
+
+
+def test_cpu_time_of_a_running_pool_is_counted():
+    timer = StageTimer()
+    with ProcessPoolExecutor(max_workers=2) as pool:
+        list(pool.map(_spin, [0.0, 0.0]))  # Workers start before the stage, like a run-wide pool
+        with timer.stage("verify"):
+            worker_seconds = sum(pool.map(_spin, [0.3, 0.3]))
+
+    assert timer.stages[0]['cpu_seconds'] >= 0.8 * worker_seconds
@@ -0,0 +1,256 @@
+import hashlib
+import io
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+
+from recovery.verifier import FileIntegrityVerifier, _check_file
+
+
+def _jpeg(width=256, height=192, seed=0, **options):
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    base = np.stack([x * 255 // width, y * 255 // height, (x + y) * 255 // (width + height)], axis=-1)
+    pixels = np.clip(base + rng.normal(0, 12, base.shape), 0, 255).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, 'JPEG', quality=90, **options)
+    return buffer.getvalue()
+
+
+def _png(width=64, height=48):
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), (20, 140, 60)).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def test_check_file_hashes_and_validates_from_one_mapping(tmp_path):
+    path = tmp_path / "a.jpg"
+    data = _jpeg()
+    path.write_bytes(data)
+
+    file_hash, valid, size, _, reason, dimensions, _ = _check_file(FileIntegrityVerifier(workers=1), (str(path), 'jpg'))
+
+    assert (file_hash, valid, size, reason) == (hashlib.sha256(data).hexdigest(), True, len(data), None)
+    assert dimensions == (256, 192)
+
+
+def test_check_file_reports_empty_and_missing_files(tmp_path):
+    verifier = FileIntegrityVerifier(workers=1)
+    (tmp_path / "empty.png").write_bytes(b'')
+
+    assert _check_file(verifier, (str(tmp_path / "empty.png"), 'png'))[4] == "Empty file"
+    assert _check_file(verifier, (str(tmp_path / "missing.png"), 'png')) is None
+
+
+def test_footerless_png_carve_is_rejected_without_decoding(tmp_path):
+    # A carve that ran past the image keeps going to the end of the device
+    path = tmp_path / "carve.png"
+    path.write_bytes(_png() + b'\x00' * (8 * 1024 * 1024))
+
+    _, valid, size, _, reason, _, _ = _check_file(FileIntegrityVerifier(workers=1), (str(path), 'png'))
+
+    assert not valid and size > 8 * 1024 * 1024
+    assert reason == "Missing header or end marker"
+
+
+def _inspect(level, data, file_type='jpg'):
+    return FileIntegrityVerifier(workers=1, level=level)._inspect("test", file_type, data)
+
+
+def test_each_tier_catches_what_the_previous_one_misses():
+    data = _jpeg()
+    # A stray marker in the scan: the header and EOI are still in place
+    scan = data.index(b'\xff\xda') + 20
+    bad_marker = data[:scan] + b'\xff\xc0' + data[scan + 2:]
+
+    assert _inspect('magic', bad_marker) == (None, None)
+    assert _inspect('structure', bad_marker)[0] == "Broken jpg structure"
+    assert _inspect('magic', data[:-2])[0] == "Missing header or end marker"
+    assert _inspect('structure', _png()[:-30] + _png()[-12:], 'png')[0] == "Broken png structure"
+
+
+def test_score_is_only_computed_by_decoding_tiers():
+    data = _jpeg()
+    for level in ('magic', 'structure', 'verify'):
+        assert _inspect(level, data) == (None, None)
+    for level in ('draft', 'full'):
+        assert _inspect(level, data) == (None, 1.0)
+
+
+def test_broken_jpeg_is_scored_from_the_decode_up_to_the_break():
+    data = _jpeg(seed=3)
+    middle = data.index(b'\xff\xda') + (len(data) - data.index(b'\xff\xda')) // 2
+    reason, score = _inspect('draft', data[:middle] + b'\xff\xc0' + data[middle + 2:])
+
+    assert reason == "Broken jpg structure"
+    assert 0.2 < score < 0.8
+
+
+def _scan_data(data):
+    """Offsets of the first and one past the last entropy-coded byte of a baseline JPEG"""
+    sos = data.index(b'\xff\xda')
+    return sos + 2 + int.from_bytes(data[sos + 2:sos + 4], 'big'), len(data) - 2
+
+
+def _byte_boundary(data, pos):
+    """First offset from pos that does not split a stuffed 0xFF00 pair"""
+    while data[pos - 1] == 0xFF or data[pos] == 0x00:
+        pos += 1
+    return pos
+
+
+def test_spliced_scan_is_scored_but_not_downgraded_without_a_break():
+    # A carve that ran into another file's entropy data: markers and EOI are intact
+    data, other = _jpeg(640, 480, seed=1), _jpeg(640, 480, seed=11)
+    start, end = _scan_data(data)
+    splice = _byte_boundary(data, start + (end - start) * 3 // 5)
+    source = _byte_boundary(other, sum(_scan_data(other)) // 2 - (end - start) // 2)
+    spliced = data[:splice] + other[source:source + end - splice] + data[end:]
+
+    reason, score = _inspect('draft', spliced)
+
+    # The decode is clean, so the score is only information for the report
+    assert reason is None and 0.5 < score < 0.7
+
+
+def test_random_interval_with_restart_markers_scores_only_that_interval():
+    data = _jpeg(640, 480, seed=2, restart_marker_rows=1)
+    markers = [m.end() for m in re.finditer(b'\xff[\xd0-\xd7]', data)]
+    start, end = markers[14], markers[15] - 2
+    noise = np.random.default_rng(2).integers(0, 0xFF, end - start, dtype=np.uint8).tobytes()
+    damaged = data[:start] + noise + data[end:]
+
+    for level in ('draft', 'full'):
+        reason, score = _inspect(level, damaged)
+        assert reason is None and 0.9 <= score < 1.0
+
+
+def test_letterboxed_image_is_fully_decodable():
+    pixels = np.asarray(Image.open(io.BytesIO(_jpeg(640, 480, seed=4)))).copy()
+    for bar, color in ((44, 0), (82, 255), (130, 30)):
+        boxed = pixels.copy()
+        boxed[:bar] = color
+        boxed[-bar:] = color
+        buffer = io.BytesIO()
+        Image.fromarray(boxed).save(buffer, 'JPEG', quality=85)
+
+        assert _inspect('draft', buffer.getvalue()) == (None, 1.0)
+
+
+def _synthetic(draw):
+    img = Image.new('RGB', (800, 600), (255, 255, 255))
+    draw(ImageDraw.Draw(img))
+    buffer = io.BytesIO()
+    img.save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def _stripes(height):
+    colors = [(200, 30, 30), (30, 160, 40), (20, 40, 210), (240, 220, 0)]
+    return lambda draw: [draw.rectangle((0, y, 799, y + height - 1), fill=colors[y // height % 4])
+                         for y in range(0, 600, height)]
+
+
+def _bar_chart(draw):
+    draw.line((60, 20, 60, 560, 780, 560), fill=(0, 0, 0), width=3)
+    for n, value in enumerate((420, 180, 510, 260, 330, 90)):
+        draw.rectangle((100 + 110 * n, 560 - value, 170 + 110 * n, 558), fill=(40, 90, 200))
+
+
+def _flat_corner(draw):
+    draw.rectangle((0, 0, 799, 599), fill=(120, 150, 90))
+    draw.rectangle((0, 0, 399, 299), fill=(240, 240, 240))
+    for x in range(400, 800, 8):
+        draw.line((x, 0, x - 400, 599), fill=(30, 60, 20), width=2)
+
+
+@pytest.mark.parametrize('draw', [_stripes(16), _stripes(24), _bar_chart, _flat_corner],
+                         ids=['stripes16', 'stripes24', 'bar_chart', 'flat_corner'])
+def test_intact_synthetic_images_stay_ok_whatever_their_score(tmp_path, draw):
+    (tmp_path / "image.jpg").write_bytes(_synthetic(draw))
+
+    verified = FileIntegrityVerifier(workers=1, level='full').verify_files(
+        [{'path': str(tmp_path / "image.jpg"), 'type': 'jpg'}], str(tmp_path / "corrupted"))
+
+    assert verified[0]['status'] == 'OK' and 'reason' not in verified[0]
+    assert verified[0]['path'] == str(tmp_path / "image.jpg") and (tmp_path / "image.jpg").exists()
+    assert 0.0 <= verified[0]['score'] <= 1.0
+
+
+def test_partly_decodable_files_stay_in_place_ranked_by_score(tmp_path):
+    data = _jpeg(640, 480, seed=5)
+    start, end = _scan_data(data)
+    cut = _byte_boundary(data, start + (end - start) // 2)
+    files = {'whole.jpg': data, 'half.jpg': data[:cut] + b'\xff\xc0' + data[cut + 2:],
+             'unreadable.jpg': data[:start] + b'\xff\xc0' + data[start + 2:]}
+    file_list = []
+    for name, content in files.items():
+        (tmp_path / name).write_bytes(content)
+        file_list.append({'path': str(tmp_path / name), 'type': 'jpg'})
+
+    verified = FileIntegrityVerifier(workers=1, level='draft').verify_files(file_list, str(tmp_path / "corrupted"))
+    status = {os.path.basename(f['path']): (f['status'], f.get('score')) for f in verified}
+
+    assert status['whole.jpg'] == ('OK', 1.0)
+    assert status['half.jpg'][0] == 'Partial' and 0.3 < status['half.jpg'][1] < 0.7
+    assert (tmp_path / "half.jpg").exists()
+    assert status['corrupted_1_unreadable.jpg'][0] == 'Corrupted'
+
+
+def test_pixel_limit_is_the_verifiers_own_not_pils_global(monkeypatch):
+    # PIL's bomb check would reject this image under the lowered global limit
+    monkeypatch.setattr(Image, 'MAX_IMAGE_PIXELS', 1000)
+    data = _jpeg()
+
+    for level in ('verify', 'draft', 'full'):
+        assert FileIntegrityVerifier(workers=1, level=level, max_pixels=10 ** 9)._inspect("t", 'jpg', data)[0] is None
+    assert FileIntegrityVerifier(workers=1, level='verify', max_pixels=10 ** 4)._inspect("t", 'png', _png(200, 100))[0] \
+        == "Invalid image dimensions 200x100"
+    assert Image.MAX_IMAGE_PIXELS == 1000
+
+
+def test_decode_budget_counts_four_bytes_per_pixel():
+    verifier = FileIntegrityVerifier(workers=1, memory_budget=4 * 1000 * 1000)
+
+    assert verifier._decode_allowed((1000, 1000, 3))
+    assert not verifier._decode_allowed((1000, 1001, 3))
+    assert verifier._decode_allowed((8000, 8000, 3), scale=8)
+
+
+def test_rerun_replaces_quarantine_index_entries(tmp_path):
+    corrupted_dir = tmp_path / "corrupted"
+    verifier = FileIntegrityVerifier(workers=1, level='structure')
+    for run in range(2):
+        (tmp_path / "carved_1.jpg").write_bytes(_jpeg()[:-2])
+        (tmp_path / "carved_2.png").write_bytes(_png()[:-12])
+        verifier.verify_files([{'path': str(tmp_path / "carved_1.jpg"), 'type': 'jpg', 'offset': 4096},
+                               {'path': str(tmp_path / "carved_2.png"), 'type': 'png', 'offset': 65536}],
+                              str(corrupted_dir))
+    os.remove(corrupted_dir / "corrupted_2_carved_2.png")
+    (tmp_path / "carved_1.jpg").write_bytes(_jpeg()[:-2])
+    verifier.verify_files([{'path': str(tmp_path / "carved_1.jpg"), 'type': 'jpg', 'offset': 4096}], str(corrupted_dir))
+
+    with open(corrupted_dir / "index.jsonl", encoding='utf-8') as f:
+        entries = [json.loads(line) for line in f]
+    assert [(e['file'], e['offset']) for e in entries] == [("corrupted_1_carved_1.jpg", 4096)]
+
+
+def test_verification_runs_on_a_shared_pool_and_leaves_it_running(tmp_path, monkeypatch):
+    import recovery.verifier
+    monkeypatch.setattr(recovery.verifier, 'ProcessPoolExecutor', lambda **kwargs: pytest.fail("started own pool"))
+    file_list = []
+    for n in range(4):
+        (tmp_path / f"{n}.jpg").write_bytes(_jpeg(seed=n))
+        file_list.append({'path': str(tmp_path / f"{n}.jpg"), 'type': 'jpg'})
+
+    with ProcessPoolExecutor(max_workers=2) as pool:
+        verifier = FileIntegrityVerifier(workers=2, parallel_threshold=1, level='draft', pool=pool)
+        verified = verifier.verify_files(file_list, str(tmp_path / "corrupted"))
+        assert pool.submit(abs, -1).result() == 1
+
+    assert [f['status'] for f in verified] == ['OK'] * 4 and verifier.stats['workers'] == 2
@@ -0,0 +1,53 @@
+import os
+
+from recovery.walker import scan_tree
+
+
+def _tree(root, width=3, depth=3):
+    """Directories `width` wide and `depth` deep, each with one image and one text file"""
+    expected = set()
+    directories = [root]
+    for _ in range(depth):
+        directories = [d / f"d{i}" for d in directories for i in range(width)]
+        for directory in directories:
+            directory.mkdir()
+            (directory / "photo.JPG").write_bytes(b'x' * len(str(directory)))
+            (directory / "notes.txt").write_text("")
+            expected.add(str(directory / "photo.JPG"))
+    return expected
+
+
+def _is_image(name):
+    return name.lower().endswith('.jpg')
+
+
+def test_finds_the_same_files_as_os_walk_with_their_stat(tmp_path):
+    expected = _tree(tmp_path)
+
+    found = dict(scan_tree(str(tmp_path), _is_image, max_workers=4))
+
+    assert set(found) == expected
+    assert all(found[path].st_size == os.path.getsize(path) for path in found)
+
+
+def test_skipped_directories_and_directory_symlinks_are_not_entered(tmp_path):
+    expected = _tree(tmp_path, width=2, depth=2)
+    os.symlink(tmp_path / "d0", tmp_path / "d1" / "loop")
+
+    found = {path for path, _ in scan_tree(str(tmp_path), _is_image, skip_dirs=[str(tmp_path / "d0")])}
+
+    assert found == {path for path in expected if not path.startswith(str(tmp_path / "d0") + os.sep)}
+
+
+def test_closing_the_generator_early_stops_the_walk(tmp_path):
+    _tree(tmp_path, width=4, depth=3)
+
+    walk = scan_tree(str(tmp_path), _is_image, max_workers=4, max_pending=1)
+    first = next(walk)
+    walk.close()
+
+    assert _is_image(first[0])
+
+
+def test_missing_root_yields_nothing(tmp_path):
+    assert list(scan_tree(str(tmp_path / "missing"), _is_image)) == []
@@ -210,7 +210,7 @@ class UnifiedLauncher(QMainWindow):
         self.hide()
         drives = list_drives()
         worker = RecoveryWorker()
-        self.file_recovery_window = MainWindow(drives, worker.run_recovery)
+        self.file_recovery_window = MainWindow(drives, worker.run_recovery, worker.run_batch)
         
         worker.progress_updated.connect(self.file_recovery_window.set_progress_value)
         worker.status_updated.connect(self.file_recovery_window.update_status)